@@ -0,0 +1,151 @@
+# address_index.py
+import bisect
+import re
+from array import array
+import map_cache
+from geo import Point
+
+ADDRESS_MAGIC = b"OSMADDRS"
+ADDRESS_VERSION = 1
+ADDRESS_EXTENSION = ".addresses"
+
+# Words that are written in several ways in addresses, normalized to one of them
+ABBREVIATIONS = {
+    "street": "st", "avenue": "ave", "av": "ave", "road": "rd", "boulevard": "blvd", "place": "pl",
+    "drive": "dr", "lane": "ln", "court": "ct", "parkway": "pkwy", "highway": "hwy", "square": "sq",
+    "terrace": "ter", "plaza": "plz", "north": "n", "south": "s", "east": "e", "west": "w",
+    "first": "1st", "second": "2nd", "third": "3rd", "fourth": "4th", "fifth": "5th", "sixth": "6th",
+    "seventh": "7th", "eighth": "8th", "ninth": "9th", "tenth": "10th",
+}
+
+# Fewest words of an address that are matched, a house number and a street name
+MIN_ADDRESS_WORDS = 2
+
+
+class AddressIndex:
+    '''Normalized "housenumber street" addresses of a map and their coordinates, kept sorted for
+    exact and prefix lookups without a geocoding service.'''
+    def __init__(self):
+        # normalized address -> (lat, lon), the first element with an address wins
+        self.addresses = dict()
+        # Sorted normalized addresses, rebuilt lazily after an add
+        self._keys = None
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def add(self, address: str, lat: float, lon: float) -> None:
+        '''adds an address at the given coordinates'''
+        key = normalize_address(address)
+        if key and key not in self.addresses:
+            self.addresses[key] = (lat, lon)
+            self._keys = None
+
+    def add_tags(self, tags: dict, lat: float, lon: float) -> None:
+        '''adds the address of an OSM element with the given tags if it has one'''
+        address = address_from_tags(tags)
+        if address is not None:
+            self.add(address, lat, lon)
+
+    def keys(self) -> list:
+        '''returns the normalized addresses in sorted order'''
+        if self._keys is None:
+            self._keys = sorted(self.addresses)
+        return self._keys
+
+    def lookup(self, address: str) -> Point:
+        '''Returns the coordinates of an address, None if it is not in the index.
+        Words after the street (city, state, postcode...) are ignored if the full address is not found.'''
+        words = normalize_address(address).split()
+        while len(words) >= MIN_ADDRESS_WORDS:
+            key = " ".join(words)
+            if key in self.addresses:
+                return Point(*self.addresses[key])
+            words.pop()
+        return None
+
+    def complete(self, prefix: str, limit: int = 10) -> list:
+        '''returns up to limit (normalized address, Point) pairs whose address starts with the prefix'''
+        keys = self.keys()
+        prefix = normalize_address(prefix)
+        found = []
+        i = bisect.bisect_left(keys, prefix)
+        while i < len(keys) and len(found) < limit and keys[i].startswith(prefix):
+            found.append((keys[i], Point(*self.addresses[keys[i]])))
+            i += 1
+        return found
+
+def normalize_address(address: str) -> str:
+    '''lower cases the address, drops its punctuation and abbreviates common words'''
+    words = re.sub(r"[^\w\s]", " ", address.lower()).split()
+    return " ".join(ABBREVIATIONS.get(word, word) for word in words)
+
+def address_from_tags(tags: dict) -> str:
+    '''returns "housenumber street" from the addr:* tags of an OSM element, None if it has no full address'''
+    housenumber = tags.get("addr:housenumber")
+    street = tags.get("addr:street")
+    if not housenumber or not street:
+        return None
+    return f"{housenumber} {street}"
+
+def address_index_from_map_dict(map_dict: dict) -> AddressIndex:
+    '''Builds the AddressIndex of a json map (see search.create_node_dict for its format).
+    Addressed ways are placed at the average of their nodes.'''
+    address_index = AddressIndex()
+    coordinates = dict()
+    for item in map_dict["osm"]["node"]:
+        lat, lon = float(item['@lat']), float(item['@lon'])
+        coordinates[int(item['@id'])] = (lat, lon)
+        address_index.add_tags(_json_tags(item), lat, lon)
+
+    for item in map_dict["osm"]["way"]:
+        tags = _json_tags(item)
+        if address_from_tags(tags) is None:
+            continue
+        refs = item["nd"] if type(item["nd"]) == list else [item["nd"]]
+        center = way_center([int(n['@ref']) for n in refs], coordinates.get)
+        if center is not None:
+            address_index.add_tags(tags, *center)
+    return address_index
+
+def _json_tags(item: dict) -> dict:
+    # "tag" is a dict for a single tag, a list for several
+    tags = item.get("tag", [])
+    if type(tags) == dict:
+        tags = [tags]
+    return {tag["@k"]: tag["@v"] for tag in tags}
+
+def way_center(node_refs: list, coordinate_of) -> tuple:
+    '''returns the average (lat, lon) of the nodes of a way, coordinate_of(id) gives (lat, lon) or None'''
+    coordinates = [c for c in map(coordinate_of, node_refs) if c is not None]
+    if not coordinates:
+        return None
+    return (sum(lat for lat, _ in coordinates) / len(coordinates),
+            sum(lon for _, lon in coordinates) / len(coordinates))
+
+def address_index_file_name(map_file: str) -> str:
+    '''returns the name of the address index file kept next to the map file'''
+    return map_file + ADDRESS_EXTENSION
+
+def write_address_index(file_name: str, map_file: str, address_index: AddressIndex) -> None:
+    '''Writes the address index of map_file to file_name'''
+    keys = address_index.keys()
+    lats = array('d', (address_index.addresses[key][0] for key in keys))
+    lons = array('d', (address_index.addresses[key][1] for key in keys))
+    map_cache.write_array_file(file_name, map_file, ADDRESS_MAGIC, ADDRESS_VERSION,
+                               [('B', "\n".join(keys).encode()), ('d', lats), ('d', lons)])
+
+def read_address_index(file_name: str, map_file: str) -> AddressIndex:
+    '''Reads the address index of map_file, None if there is none or it is stale'''
+    arrays = map_cache.read_array_file(file_name, map_file, ADDRESS_MAGIC, ADDRESS_VERSION, ['B', 'd', 'd'])
+    if arrays is None:
+        return None
+    text, lats, lons = arrays
+    keys = bytes(text).decode().split("\n") if len(text) else []
+    if len(keys) != len(lats):
+        return None
+
+    address_index = AddressIndex()
+    address_index.addresses = {key: (lat, lon) for key, lat, lon in zip(keys, lats, lons)}
+    address_index._keys = keys
+    return address_index
@@ -0,0 +1,178 @@
+# batch_route.py
+import argparse
+import contextlib
+import itertools
+import json
+import multiprocessing
+import sys
+import time
+import search
+import route_cache
+import route_render
+
+# Queries handed to the pool at a time per worker, bounds the memory used on large query files
+QUERIES_PER_WORKER = 64
+
+# Map the pool workers route on, set once per worker process
+_worker_map = None
+_worker_options = None
+
+
+def load_routing_map(map_file, simplify=False):
+    '''Loads the map and its address index, with its contraction hierarchy and landmarks if it was preprocessed
+    (with the same simplify). Returns (Map, mode, heuristic) where mode and heuristic are the best ones the map supports'''
+    node_dict, way_dict, bbox, graph = search.load_map(map_file, simplify=simplify)
+    hierarchy = search.load_hierarchy(map_file, graph)
+    map_landmarks = search.load_landmarks(map_file, graph)
+    map_problem = search.Map(node_dict, way_dict, bbox, graph, hierarchy, map_landmarks)
+    map_problem.address_index = search.load_address_index(map_file)
+    mode = "ch" if hierarchy is not None else "astar"
+    heuristic = "landmarks" if map_landmarks is not None else "haversine"
+    return map_problem, mode, heuristic
+
+def parse_query(line: str, line_number: int) -> dict:
+    '''Parses a JSONL query line: {"id": ..., "start": ..., "goal": ...} where start and goal are
+    OSM node ids, [lat, lon] coordinates or addresses of the map. The id is optional and defaults to the line number.'''
+    query = json.loads(line)
+    if type(query) is not dict or "start" not in query or "goal" not in query:
+        raise Exception("Error: a query needs a start and a goal")
+    query.setdefault("id", line_number)
+    return query
+
+def route_query(map_problem, query: dict, mode: str, heuristic: str) -> dict:
+    '''Answers one query, returns its result: the id, the path as OSM ids, its length (in km) and search stats.
+    The path and length are None if there is no route, an error is reported instead of raised.'''
+    try:
+        return answer_query(map_problem, query, mode, heuristic)
+    except Exception as e:
+        return {"id": query.get("id"), "error": str(e)}
+
+def answer_query(map_problem, query: dict, mode: str, heuristic: str) -> dict:
+    '''Like route_query, with the errors raised'''
+    start_time = time.perf_counter()
+    # Coordinates and addresses snap to nodes in one component, where a route can exist
+    start, goal = map_problem.route_ends(query["start"], query["goal"])
+    path = map_problem.search(start, goal, mode=mode, heuristic=heuristic)
+    seconds = time.perf_counter() - start_time
+
+    result = {"id": query.get("id")}
+    result["path"] = None if path is None else [n.id for n in path]
+    result["length"] = None if path is None else search.path_length(path)
+    result["stats"] = {"mode": mode, "expanded": map_problem.expanded_count, "seconds": seconds,
+                       "cached": map_problem.cache_hit}
+    # The detailed stats of the search if the map collects them
+    if map_problem.stats is not None:
+        result["stats"]["search"] = map_problem.stats.to_dict()
+    return result
+
+def iter_queries(lines):
+    '''Yields the query of each non empty line, or an error result for lines that are not a valid query'''
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield parse_query(line, line_number)
+        except Exception as e:
+            yield {"id": line_number, "error": str(e)}
+
+def run_batch(map_problem, lines, output, mode: str, heuristic: str, processes: int = 1, renderer=None) -> int:
+    '''Routes every query line and writes one JSONL result per query to output as soon as it is answered,
+    so results may come out of order. Queries run on a pool of processes if processes > 1 (None uses every core).
+    The routes found are also added to renderer (a route_render.RouteRenderer) if one is given.
+    Returns the number of queries answered.'''
+    def emit(result: dict) -> None:
+        _write_result(output, result)
+        if renderer is not None and result.get("path"):
+            renderer.add([map_problem.node_dict[i].coordinate for i in result["path"]], result["id"])
+    
+    queries = iter_queries(lines)
+    count = 0
+    if processes == 1:
+        for query in queries:
+            emit(_answer(map_problem, query, mode, heuristic))
+            count += 1
+        return count
+    
+    workers = processes or multiprocessing.cpu_count()
+    with _pool(map_problem, mode, heuristic, workers) as pool:
+        # Pool.imap reads its whole input up front, so hand it the queries a slice at a time
+        while True:
+            chunk = list(itertools.islice(queries, workers * QUERIES_PER_WORKER))
+            if not chunk:
+                break
+            for result in pool.imap_unordered(_worker_answer, chunk, chunksize=max(1, QUERIES_PER_WORKER // 4)):
+                emit(result)
+            count += len(chunk)
+    return count
+
+def _answer(map_problem, query: dict, mode: str, heuristic: str) -> dict:
+    # Lines that failed to parse already are their result
+    if "error" in query:
+        return query
+    # The search prints progress, keep it out of the results
+    with contextlib.redirect_stdout(sys.stderr):
+        return route_query(map_problem, query, mode, heuristic)
+
+def _write_result(output, result: dict) -> None:
+    output.write(json.dumps(result) + "\n")
+    output.flush()
+
+def _pool(map_problem, mode: str, heuristic: str, processes: int):
+    '''Returns a process pool whose workers share the map'''
+    global _worker_map, _worker_options
+    # Forked workers inherit the loaded map without copying it
+    if "fork" in multiprocessing.get_all_start_methods():
+        _worker_map, _worker_options = map_problem, (mode, heuristic)
+        return multiprocessing.get_context("fork").Pool(processes)
+    # Otherwise each worker gets a pickled copy once
+    return multiprocessing.Pool(processes, initializer=_init_worker, initargs=(map_problem, mode, heuristic))
+
+def _init_worker(map_problem, mode: str, heuristic: str) -> None:
+    global _worker_map, _worker_options
+    _worker_map, _worker_options = map_problem, (mode, heuristic)
+
+def _worker_answer(query: dict) -> dict:
+    return _answer(_worker_map, query, *_worker_options)
+    
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Routes every query of a JSONL file on one map")
+    parser.add_argument("map_file")
+    parser.add_argument("queries", nargs="?", default="-", help="JSONL query file, - (default) reads stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL result file, - (default) writes stdout")
+    parser.add_argument("-p", "--processes", type=int, default=1, help="worker processes, 0 uses every core")
+    parser.add_argument("--mode", choices=search.SEARCH_MODES, help="search mode, the best one the map supports by default")
+    parser.add_argument("--heuristic", choices=search.HEURISTICS, help="A* heuristic, the best one the map supports by default")
+    parser.add_argument("--render", help="also save every route found into one map file")
+    parser.add_argument("--render-format", choices=route_render.RENDER_FORMATS, default="html")
+    parser.add_argument("--tolerance", type=float, default=route_render.DEFAULT_TOLERANCE,
+                        help="km a rendered route may be simplified by")
+    parser.add_argument("--cost-model", choices=list(search.COST_MODELS), default="distance",
+                        help="cost the routes minimize, the shortest distance by default")
+    parser.add_argument("--stats", action="store_true", help="add detailed search stats to every result")
+    parser.add_argument("--simplify", action="store_true", help="search a graph with degree-2 chains contracted")
+    parser.add_argument("--route-cache", action="store_true", help="cache routes in a file next to the map, reused by later runs")
+    args = parser.parse_args()
+    
+    # Loading messages go to stderr so stdout only has results
+    with contextlib.redirect_stdout(sys.stderr):
+        map_problem, mode, heuristic = load_routing_map(args.map_file, args.simplify)
+    if args.route_cache:
+        map_problem.route_cache = route_cache.open_route_cache(args.map_file, persistent=True)
+    map_problem.collect_stats = args.stats
+    map_problem.cost_model = args.cost_model
+    # The contraction hierarchy only answers the distance cost model
+    if mode == "ch" and args.cost_model != "distance":
+        mode = "astar"
+    mode = args.mode or mode
+    heuristic = args.heuristic or heuristic
+    
+    with contextlib.ExitStack() as stack:
+        lines = sys.stdin if args.queries == "-" else stack.enter_context(open(args.queries))
+        output = sys.stdout if args.output == "-" else stack.enter_context(open(args.output, "w"))
+        start_time = time.perf_counter()
+        renderer = route_render.RouteRenderer(args.tolerance) if args.render else None
+        count = run_batch(map_problem, lines, output, mode, heuristic, args.processes or None, renderer)
+        print(f"Routed {count} queries in {time.perf_counter() - start_time:.1f}s", file=sys.stderr)
+    if renderer is not None and len(renderer):
+        renderer.save(args.render, args.render_format)
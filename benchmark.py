@@ -0,0 +1,201 @@
+# benchmark.py
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import search
+from geo import Point, KM_PER_DEGREE
+from routing_graph import compile_graph
+
+BUNDLED_MAPS = ["json_maps/nymap2_data.json", "json_maps/nymap3_data.json"]
+
+# Sides of the synthetic square grid maps benchmarked by default
+DEFAULT_GRID_SIZES = [50, 200]
+
+# Distance (in km) between neighboring grid nodes
+GRID_SPACING = 0.1
+
+# Coordinates snapped and routes searched per map
+DEFAULT_POINTS = 50
+DEFAULT_SEARCHES = 20
+
+# A stage this much slower than in the compared run is reported as a regression
+REGRESSION_RATIO = 1.2
+
+
+def grid_map_dict(size: int, seed: int = 0) -> dict:
+    '''Returns a synthetic size x size street grid in the json map format (see search.create_node_dict).
+    Every row and column of nodes is a residential way, the nodes are jittered so routes are not ties.'''
+    rnd = random.Random(seed)
+    origin = Point(40.0, -74.0)
+    lat_step = GRID_SPACING / KM_PER_DEGREE
+    lon_step = lat_step / math.cos(math.radians(origin.lat))
+
+    def node_id(row: int, col: int) -> int:
+        return row * size + col + 1
+
+    nodes = []
+    for row in range(size):
+        for col in range(size):
+            lat = origin.lat + (row + rnd.uniform(-0.2, 0.2)) * lat_step
+            lon = origin.lon + (col + rnd.uniform(-0.2, 0.2)) * lon_step
+            nodes.append({"@id": str(node_id(row, col)), "@lat": str(lat), "@lon": str(lon)})
+
+    ways = []
+    lines = [[node_id(row, col) for col in range(size)] for row in range(size)]
+    lines += [[node_id(row, col) for row in range(size)] for col in range(size)]
+    for i, refs in enumerate(lines, 1):
+        ways.append({"@id": str(i), "nd": [{"@ref": str(ref)} for ref in refs],
+                     "tag": {"@k": "highway", "@v": "residential"}})
+
+    bounds = {"@minlat": str(origin.lat - lat_step), "@minlon": str(origin.lon - lon_step),
+              "@maxlat": str(origin.lat + size * lat_step), "@maxlon": str(origin.lon + size * lon_step)}
+    return {"osm": {"bounds": bounds, "node": nodes, "way": ways}}
+
+def measure(stage, setup=None, memory: bool = True) -> dict:
+    '''Runs stage(*setup()) and returns its {"seconds", "peak_kb"}, along with the stage's result under "result".
+    setup is not measured. The peak memory comes from a second run under tracemalloc, which slows it down.'''
+    args = setup() if setup is not None else ()
+    start_time = time.perf_counter()
+    result = stage(*args)
+    measurement = {"seconds": time.perf_counter() - start_time, "result": result}
+
+    if memory:
+        args = setup() if setup is not None else ()
+        tracemalloc.start()
+        try:
+            stage(*args)
+            measurement["peak_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+    return measurement
+
+def benchmark_map(map_file: str, points: int = DEFAULT_POINTS, searches: int = DEFAULT_SEARCHES,
+                  memory: bool = True, seed: int = 0) -> dict:
+    '''Times every stage of loading and routing on a json map, returns {stage: measurement}'''
+    stages = dict()
+
+    def run(name, stage, setup=None):
+        measurement = measure(stage, setup, memory)
+        stages[name] = {key: value for key, value in measurement.items() if key != "result"}
+        return measurement["result"]
+
+    map_dict = run("load_json_to_dict", lambda: search.load_json_to_dict(map_file))
+    node_dict = run("create_node_dict", lambda: search.create_node_dict(map_dict))
+    way_dict = run("create_way_dict", lambda: search.create_way_dict(map_dict))
+    # add_all_ways_to_nodes fills the nodes in place, give each run fresh nodes
+    run("add_all_ways_to_nodes", search.add_all_ways_to_nodes, lambda: (way_dict, search.create_node_dict(map_dict)))
+    search.add_all_ways_to_nodes(way_dict, node_dict)
+    bbox = search.get_bounding_box(map_dict)
+    graph = run("compile_graph", lambda: compile_graph(node_dict, way_dict))
+
+    # Snap random points around routable nodes, as addresses would be
+    rnd = random.Random(seed)
+    routable = [node_dict[i] for i in graph.ids if any(way_dict[w].highway_value for w in node_dict[i].ways)]
+    sample = [rnd.choice(routable).coordinate for _ in range(points)]
+    sample = [Point(p.lat + rnd.uniform(-0.0003, 0.0003), p.lon + rnd.uniform(-0.0003, 0.0003)) for p in sample]
+    node_index = run("node_index", lambda: search.NodeIndex(node_dict, way_dict))
+
+    def snap_all():
+        snapped = 0
+        for point in sample:
+            with contextlib.suppress(Exception):
+                snapped += bool(search.coordinates_to_nodes(point, node_dict, way_dict, bbox, node_index))
+        return snapped
+    snapped = run("coordinates_to_nodes", snap_all)
+    stages["coordinates_to_nodes"].update({"points": points, "snapped": snapped})
+
+    pairs = [(rnd.choice(routable), rnd.choice(routable)) for _ in range(searches)]
+    map_problem = search.Map(node_dict, way_dict, bbox, graph)
+
+    def search_all(mode: str):
+        expanded = 0
+        found = 0
+        # Map.search prints when there is no route
+        with contextlib.redirect_stdout(io.StringIO()):
+            for start, goal in pairs:
+                found += map_problem.search(start, goal, mode=mode) is not None
+                expanded += map_problem.expanded_count
+        return expanded, found
+    # The bidirectional mode is timed next to astar so the two can be compared, nodes_expanded counts both
+    #   searches of the bidirectional mode
+    for mode, stage in [("astar", "search"), ("bidirectional", "search_bidirectional")]:
+        expanded, found = run(stage, lambda: search_all(mode))
+        stages[stage].update({"searches": searches, "found": found, "nodes_expanded": expanded})
+    stages["map"] = {"nodes": len(node_dict), "ways": len(way_dict), "graph_nodes": len(graph),
+                     "graph_edges": graph.edge_count()}
+    return stages
+
+def run_benchmarks(map_files: list, grid_sizes: list, points: int = DEFAULT_POINTS,
+                   searches: int = DEFAULT_SEARCHES, memory: bool = True) -> dict:
+    '''Benchmarks the map files and synthetic grids of the given sizes, returns the JSON-able results'''
+    results = {"meta": {"date": datetime.datetime.now().isoformat(timespec="seconds"),
+                        "python": platform.python_version(), "platform": platform.platform(),
+                        "points": points, "searches": searches, "memory": memory},
+               "maps": dict()}
+    for map_file in map_files:
+        print(f"Benchmarking {map_file}", file=sys.stderr)
+        results["maps"][os.path.basename(map_file)] = benchmark_map(map_file, points, searches, memory)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in grid_sizes:
+            print(f"Benchmarking a {size}x{size} grid", file=sys.stderr)
+            grid_file = os.path.join(directory, f"grid{size}.json")
+            with open(grid_file, "w") as file:
+                json.dump(grid_map_dict(size), file)
+            results["maps"][f"grid{size}"] = benchmark_map(grid_file, points, searches, memory)
+    return results
+
+def compare(results: dict, baseline: dict) -> list:
+    '''returns (map, stage, ratio) of every stage timed in both runs, ratio is new seconds / baseline seconds'''
+    ratios = []
+    for map_name, stages in results["maps"].items():
+        for stage, measurement in stages.items():
+            old = baseline["maps"].get(map_name, dict()).get(stage, dict())
+            if "seconds" in measurement and old.get("seconds"):
+                ratios.append((map_name, stage, measurement["seconds"] / old["seconds"]))
+    return ratios
+
+def print_results(results: dict) -> None:
+    for map_name, stages in results["maps"].items():
+        print(map_name, stages["map"])
+        for stage, measurement in stages.items():
+            if "seconds" not in measurement:
+                continue
+            memory = f"  peak {measurement['peak_kb']:.0f} KB" if "peak_kb" in measurement else ""
+            expanded = f"  expanded {measurement['nodes_expanded']}" if "nodes_expanded" in measurement else ""
+            print(f"    {stage:24}{measurement['seconds'] * 1000:10.2f} ms{memory}{expanded}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Times loading, graph building, snapping and search")
+    parser.add_argument("maps", nargs="*", default=BUNDLED_MAPS, help="json maps, the bundled ones by default")
+    parser.add_argument("--grid", type=int, action="append", help="side of a synthetic grid map, can be repeated")
+    parser.add_argument("--points", type=int, default=DEFAULT_POINTS, help="coordinates snapped per map")
+    parser.add_argument("--searches", type=int, default=DEFAULT_SEARCHES, help="routes searched per map")
+    parser.add_argument("--no-memory", action="store_true", help="skip the (slower) peak memory runs")
+    parser.add_argument("-o", "--output", help="save the results as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.maps, DEFAULT_GRID_SIZES if args.grid is None else args.grid,
+                             args.points, args.searches, not args.no_memory)
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        for map_name, stage, ratio in compare(results, baseline):
+            flag = "  <- slower" if ratio > REGRESSION_RATIO else ""
+            print(f"{map_name:24}{stage:24}{ratio:6.2f}x{flag}")
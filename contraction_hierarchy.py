@@ -0,0 +1,259 @@
+# contraction_hierarchy.py
+import heapq
+import math
+from array import array
+import map_cache
+from routing_graph import SIMPLIFIED_SUFFIX, RoutingGraph
+
+CH_MAGIC = b"OSMCHIER"
+CH_VERSION = 1
+CH_EXTENSION = ".ch"
+
+# Middle node of an upward edge that is an original edge and not a shortcut
+NO_MIDDLE = -1
+
+# Nodes a witness search may settle before giving up and adding the shortcut
+WITNESS_SETTLE_LIMIT = 200
+
+
+class ContractionHierarchy:
+    '''Upward graph of a contraction hierarchy over the nodes of a RoutingGraph.
+
+    Node u's upward edges, to nodes contracted after it, are targets[offsets[u]:offsets[u + 1]] with their
+    weights in weights. A shortcut skips over the node in middles, original edges have NO_MIDDLE.
+    The routing graph is undirected so the same upward graph serves the forward and backward searches.
+    '''
+    def __init__(self, ranks, offsets, targets, weights, middles):
+        if len(offsets) != len(ranks) + 1:
+            raise Exception("Error: offsets must have one more entry than ranks")
+        if not len(targets) == len(weights) == len(middles):
+            raise Exception("Error: targets, weights and middles are not the same size")
+
+        self.ranks = ranks
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.middles = middles
+
+    def __len__(self):
+        return len(self.ranks)
+
+    def shortcut_count(self) -> int:
+        '''returns the number of upward edges that are shortcuts'''
+        return sum(1 for m in self.middles if m != NO_MIDDLE)
+
+    def upward(self, u: int):
+        '''returns (target, weight, middle) of the upward edges of node u'''
+        start = self.offsets[u]
+        end = self.offsets[u + 1]
+        return zip(self.targets[start:end], self.weights[start:end], self.middles[start:end])
+
+    def query(self, source: int, target: int) -> tuple:
+        '''Returns (cost, path of graph indices, nodes settled) of the shortest path between two graph indices,
+        the cost is math.inf and the path None if there is none.'''
+        if source == target:
+            return 0.0, [source], 0
+        return self.query_many({source: 0.0}, {target: 0.0})
+
+    def query_many(self, sources: dict, targets: dict) -> tuple:
+        '''Like query, for the best path from any of the sources to any of the targets.
+        Both are dicts of graph index -> offset, an extra cost of starting or ending at that node.'''
+        # Index 0 searches upward from the sources, index 1 upward from the targets
+        costs = (dict(sources), dict(targets))
+        parents = ({u: None for u in sources}, {u: None for u in targets})
+        heaps = ([(cost, u) for u, cost in sources.items()], [(cost, u) for u, cost in targets.items()])
+        for heap in heaps:
+            heapq.heapify(heap)
+        settled = (set(), set())
+        best_cost = math.inf
+        meeting = None
+
+        while heaps[0] or heaps[1]:
+            # Alternate between the sides, a side is done once it cannot improve the best path
+            for side in (0, 1):
+                heap = heaps[side]
+                if not heap:
+                    continue
+                if heap[0][0] >= best_cost:
+                    heap.clear()
+                    continue
+
+                cost, u = heapq.heappop(heap)
+                if u in settled[side]:
+                    continue
+                settled[side].add(u)
+
+                other_cost = costs[1 - side].get(u)
+                if other_cost is not None and cost + other_cost < best_cost:
+                    best_cost = cost + other_cost
+                    meeting = u
+
+                for v, weight, _ in self.upward(u):
+                    new_cost = cost + weight
+                    if new_cost < costs[side].get(v, math.inf):
+                        costs[side][v] = new_cost
+                        parents[side][v] = u
+                        heapq.heappush(heap, (new_cost, v))
+
+        settled_count = len(settled[0]) + len(settled[1])
+        if meeting is None:
+            return math.inf, None, settled_count
+
+        # Nodes of the hierarchy path from the source up to the meeting node and down to the target
+        up = []
+        u = meeting
+        while u is not None:
+            up.append(u)
+            u = parents[0][u]
+        up.reverse()
+        down = []
+        u = parents[1][meeting]
+        while u is not None:
+            down.append(u)
+            u = parents[1][u]
+
+        hierarchy_path = up + down
+        path = [hierarchy_path[0]]
+        for u, v in zip(hierarchy_path, hierarchy_path[1:]):
+            path.extend(self.unpack(u, v))
+        return best_cost, path, settled_count
+
+    def middle(self, u: int, v: int) -> int:
+        '''returns the middle node of the upward edge between u and v'''
+        # The edge is stored with the node that was contracted first
+        low, high = (u, v) if self.ranks[u] < self.ranks[v] else (v, u)
+        for target, _, middle in self.upward(low):
+            if target == high:
+                return middle
+        raise Exception(f"Error: no hierarchy edge between {u} and {v}")
+
+    def unpack(self, u: int, v: int) -> list:
+        '''returns the original graph nodes of the hierarchy edge from u to v, excluding u'''
+        path = []
+        # Stack of edges still to unpack, the next edge of the path on top
+        stack = [(u, v)]
+        while stack:
+            a, b = stack.pop()
+            middle = self.middle(a, b)
+            if middle == NO_MIDDLE:
+                path.append(b)
+            else:
+                stack.append((middle, b))
+                stack.append((a, middle))
+        return path
+
+def build_contraction_hierarchy(graph: RoutingGraph, settle_limit: int = WITNESS_SETTLE_LIMIT) -> ContractionHierarchy:
+    '''Contracts every node of the graph in order of importance (edge difference plus the number of
+    contracted neighbors). A shortcut is added between two neighbors of the contracted node unless a
+    witness search finds a path between them that is at least as short without it.'''
+    n = len(graph)
+    # Remaining graph: node -> {neighbor: (weight, middle)}
+    adjacency = [dict() for _ in range(n)]
+    for u in range(n):
+        for v, length in graph.neighbors(u):
+            if v not in adjacency[u] or length < adjacency[u][v][0]:
+                adjacency[u][v] = (length, NO_MIDDLE)
+
+    contracted = [False] * n
+    contracted_neighbors = [0] * n
+    ranks = array('q', bytes(8 * n))
+    upward = [None] * n
+
+    def shortcuts(v: int) -> list:
+        '''returns the (u, w, weight) shortcuts contracting v would need'''
+        needed = []
+        neighbors = list(adjacency[v].items())
+        for i, (u, (weight_u, _)) in enumerate(neighbors):
+            others = neighbors[i + 1:]
+            if not others:
+                continue
+            limit = weight_u + max(weight_w for _, (weight_w, _) in others)
+            distances = witness_search(adjacency, u, v, limit, settle_limit)
+            for w, (weight_w, _) in others:
+                if distances.get(w, math.inf) > weight_u + weight_w:
+                    needed.append((u, w, weight_u + weight_w))
+        return needed
+
+    def priority(v: int) -> int:
+        return len(shortcuts(v)) - len(adjacency[v]) + contracted_neighbors[v]
+
+    heap = [(priority(v), v) for v in range(n)]
+    heapq.heapify(heap)
+    rank = 0
+    while heap:
+        _, v = heapq.heappop(heap)
+        if contracted[v]:
+            continue
+        # Lazy update: the priority may be out of date, only contract v if it is still the smallest
+        current = priority(v)
+        if heap and current > heap[0][0]:
+            heapq.heappush(heap, (current, v))
+            continue
+
+        for u, w, weight in shortcuts(v):
+            if w not in adjacency[u] or weight < adjacency[u][w][0]:
+                adjacency[u][w] = (weight, v)
+                adjacency[w][u] = (weight, v)
+
+        # Every remaining edge of v goes up the hierarchy
+        upward[v] = adjacency[v]
+        for u in adjacency[v]:
+            del adjacency[u][v]
+            contracted_neighbors[u] += 1
+        adjacency[v] = dict()
+        contracted[v] = True
+        ranks[v] = rank
+        rank += 1
+
+    offsets = array('q', [0])
+    targets = array('q')
+    weights = array('d')
+    middles = array('q')
+    for edges in upward:
+        for u, (weight, middle) in edges.items():
+            targets.append(u)
+            weights.append(weight)
+            middles.append(middle)
+        offsets.append(len(targets))
+
+    return ContractionHierarchy(ranks, offsets, targets, weights, middles)
+
+def witness_search(adjacency: list, source: int, skip: int, limit: float, settle_limit: int) -> dict:
+    '''Dijkstra from source in the remaining graph without the node skip, stopping at distance limit
+    or after settle_limit nodes. Returns the distances found.'''
+    distances = {source: 0.0}
+    heap = [(0.0, source)]
+    settled = 0
+    while heap and settled < settle_limit:
+        distance, u = heapq.heappop(heap)
+        if distance > limit:
+            break
+        if distance > distances[u]:
+            continue
+        settled += 1
+        for v, (weight, _) in adjacency[u].items():
+            if v == skip:
+                continue
+            new_distance = distance + weight
+            if new_distance < distances.get(v, math.inf):
+                distances[v] = new_distance
+                heapq.heappush(heap, (new_distance, v))
+    return distances
+
+def hierarchy_file_name(map_file: str, simplified: bool = False) -> str:
+    '''returns the name of the contraction hierarchy file kept next to the map file, 
+    for the simplified graph of the map if simplified'''
+    return map_file + (SIMPLIFIED_SUFFIX if simplified else "") + CH_EXTENSION
+
+def write_contraction_hierarchy(file_name: str, map_file: str, hierarchy: ContractionHierarchy) -> None:
+    '''Writes the hierarchy built from map_file to file_name'''
+    map_cache.write_array_file(file_name, map_file, CH_MAGIC, CH_VERSION, [
+        ('q', hierarchy.ranks), ('q', hierarchy.offsets), ('q', hierarchy.targets),
+        ('d', hierarchy.weights), ('q', hierarchy.middles)])
+
+def read_contraction_hierarchy(file_name: str, map_file: str) -> ContractionHierarchy:
+    '''Opens the hierarchy of map_file with mmap, None if there is none or it is stale'''
+    arrays = map_cache.read_array_file(file_name, map_file, CH_MAGIC, CH_VERSION, ['q', 'q', 'q', 'd', 'q'])
+    if arrays is None:
+        return None
+    return ContractionHierarchy(*arrays)
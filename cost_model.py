@@ -0,0 +1,121 @@
+# cost_model.py
+import re
+from abc import ABC, abstractmethod
+from array import array
+import numpy as np
+from routing_graph import HIGHWAY_VALUES, RoutingGraph
+
+# Speed (in km/h) of each highway value, used for ways without a maxspeed tag
+DEFAULT_SPEEDS = {
+    "motorway": 100, "trunk": 80, "primary": 65, "secondary": 55, "tertiary": 45, "unclassified": 35,
+    "residential": 30, "motorway_link": 60, "trunk_link": 50, "primary_link": 45, "secondary_link": 40,
+    "tertiary_link": 35, "living_street": 10, "service": 20, "road": 30,
+}
+
+# Speed (in km/h) the distance between an address and the node it was snapped to is covered at
+ACCESS_SPEED = 5.0
+
+SECONDS_PER_HOUR = 3600
+KMH_PER_MPH = 1.609344
+KMH_PER_KNOT = 1.852
+
+# A number with an optional unit, e.g. "50", "25 mph", "30 km/h"
+MAXSPEED_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(mph|knots|km/h|kmh|kph)?\s*$")
+
+
+class CostModel(ABC):
+    '''Turns the edges of a RoutingGraph into the costs a search minimizes.
+    The weights and heuristic scale of a graph are computed once and kept in its weights and heuristic_scales
+    dicts, next to the adjacency.'''
+    name = None
+
+    def edge_weights(self, graph: RoutingGraph):
+        '''returns the cost of every edge of the graph, at the same positions as graph.targets'''
+        if self.name not in graph.weights:
+            graph.weights[self.name] = self.compute_weights(graph)
+        return graph.weights[self.name]
+
+    def heuristic_scale(self, graph: RoutingGraph) -> float:
+        '''returns the factor that turns a lower bound of the distance (in km) into a lower bound of the cost'''
+        if self.name not in graph.heuristic_scales:
+            graph.heuristic_scales[self.name] = self.compute_heuristic_scale(graph)
+        return graph.heuristic_scales[self.name]
+
+    @abstractmethod
+    def compute_weights(self, graph: RoutingGraph):
+        pass
+
+    @abstractmethod
+    def compute_heuristic_scale(self, graph: RoutingGraph) -> float:
+        pass
+
+    @abstractmethod
+    def offset_cost(self, distance: float) -> float:
+        '''returns the cost of the distance (in km) between an address and the node it was snapped to'''
+
+class DistanceCost(CostModel):
+    '''Shortest routes, the cost of an edge is its length in km'''
+    name = "distance"
+
+    def compute_weights(self, graph: RoutingGraph):
+        return graph.lengths
+
+    def compute_heuristic_scale(self, graph: RoutingGraph) -> float:
+        return 1.0
+
+    def offset_cost(self, distance: float) -> float:
+        return distance
+
+class TravelTimeCost(CostModel):
+    '''Fastest routes, the cost of an edge is the seconds it takes at its maxspeed, or at the speed of its
+    highway value if it has none'''
+    name = "time"
+
+    def __init__(self, speeds: dict = DEFAULT_SPEEDS):
+        if any(speeds.get(value, 0) <= 0 for value in HIGHWAY_VALUES):
+            raise Exception("Error: every highway value needs a positive speed")
+        self.speeds = speeds
+
+    def edge_speeds(self, graph: RoutingGraph) -> np.ndarray:
+        '''returns the speed (in km/h) of every edge of the graph'''
+        class_speeds = np.array([self.speeds[value] for value in HIGHWAY_VALUES], dtype=np.float64)
+        speeds = class_speeds[np.frombuffer(graph.highway_classes, dtype=np.uint8)]
+        maxspeeds = np.frombuffer(graph.maxspeeds, dtype=np.float32).astype(np.float64)
+        return np.where(maxspeeds > 0, maxspeeds, speeds)
+
+    def compute_weights(self, graph: RoutingGraph):
+        lengths = np.frombuffer(graph.lengths, dtype=np.float64)
+        return array('d', (lengths / self.edge_speeds(graph) * SECONDS_PER_HOUR).tobytes())
+
+    def compute_heuristic_scale(self, graph: RoutingGraph) -> float:
+        # No edge is faster than the fastest one, so the straight line at its speed is never slower than a route
+        speeds = self.edge_speeds(graph)
+        top_speed = speeds.max() if len(speeds) else max(self.speeds.values())
+        return SECONDS_PER_HOUR / top_speed
+
+    def offset_cost(self, distance: float) -> float:
+        return distance / ACCESS_SPEED * SECONDS_PER_HOUR
+
+# Cost models Map.search can minimize, by Map.cost_model
+COST_MODELS = {model.name: model for model in [DistanceCost(), TravelTimeCost()]}
+
+
+def get_cost_model(name: str) -> CostModel:
+    if name not in COST_MODELS:
+        raise Exception(f"Error: unknown cost model {name}")
+    return COST_MODELS[name]
+
+def parse_maxspeed(value) -> float:
+    '''returns the speed (in km/h) of an OSM maxspeed tag, None if it has no numeric speed (e.g. "none", "walk").
+    Of several speeds ("50;30") the first is used.'''
+    if value is None:
+        return None
+    match = MAXSPEED_PATTERN.match(value.split(";")[0])
+    if match is None:
+        return None
+    speed = float(match.group(1))
+    if match.group(2) == "mph":
+        speed *= KMH_PER_MPH
+    elif match.group(2) == "knots":
+        speed *= KMH_PER_KNOT
+    return speed if speed > 0 else None
@@ -0,0 +1,75 @@
+# distance_matrix.py
+import math
+import multiprocessing
+from routing_graph import RoutingGraph, dijkstra
+
+# Graph and edge weights the pool workers route on, set once per worker process
+_worker_graph = None
+_worker_weights = None
+
+
+def distance_matrix(graph: RoutingGraph, sources: list, targets: list, with_paths: bool = False, processes: int = 1,
+                    weights=None) -> tuple:
+    '''Shortest distances (in km) from every source to every target, all given as graph indices.
+    A source or target can also be a dict of candidate indices -> offset (a distance to start or end there),
+    its distance is then the shortest over its candidates, offsets included.
+    If weights of a cost model are given, the cheapest costs under those weights instead.
+    Each row is one one-to-many Dijkstra from a source, stopping once every target is settled.
+    Rows are spread over a pool of processes if processes > 1 (None uses every core).
+    
+    Returns (matrix, paths): matrix[i][j] is the distance from sources[i] to targets[j], math.inf if there
+    is no path. If with_paths, paths[i][j] is the list of graph indices of that path (None if there is none),
+    otherwise paths is None.'''
+    rows = [(source, targets, with_paths) for source in sources]
+    if processes == 1 or len(sources) <= 1:
+        results = [_distance_row(graph, weights, *row) for row in rows]
+    else:
+        workers = processes or multiprocessing.cpu_count()
+        with _pool(graph, weights, workers) as pool:
+            results = pool.map(_worker_distance_row, rows, chunksize=max(1, len(rows) // (4 * workers)))
+
+    matrix = [distances for distances, _ in results]
+    paths = [row_paths for _, row_paths in results] if with_paths else None
+    return matrix, paths
+
+def _pool(graph: RoutingGraph, weights, processes: int):
+    '''Returns a process pool whose workers share the graph and weights'''
+    global _worker_graph, _worker_weights
+    # Forked workers inherit the graph without copying it (and an mmapped graph stays shared)
+    if "fork" in multiprocessing.get_all_start_methods():
+        _worker_graph, _worker_weights = graph, weights
+        return multiprocessing.get_context("fork").Pool(processes)
+    # Otherwise each worker gets a pickled copy once
+    return multiprocessing.Pool(processes, initializer=_init_worker, initargs=(graph, weights))
+
+def _init_worker(graph: RoutingGraph, weights) -> None:
+    global _worker_graph, _worker_weights
+    _worker_graph, _worker_weights = graph, weights
+
+def _worker_distance_row(row: tuple) -> tuple:
+    return _distance_row(_worker_graph, _worker_weights, *row)
+
+def _distance_row(graph: RoutingGraph, weights, source: int, targets: list, with_paths: bool) -> tuple:
+    '''Returns (distances, paths) from the source to each of the targets'''
+    targets = [target if type(target) is dict else {target: 0.0} for target in targets]
+    distances, parents = dijkstra(graph, source if type(source) is dict else [source],
+                                  {i for target in targets for i in target}, weights)
+    # The candidate each target is reached through, None for a target without candidates
+    ends = [min(target, key=lambda i: distances[i] + target[i], default=None) for target in targets]
+    row = [math.inf if end is None else distances[end] + target[end] for end, target in zip(ends, targets)]
+    if not with_paths:
+        return row, None
+
+    row_paths = []
+    for end, distance in zip(ends, row):
+        if distance == math.inf:
+            row_paths.append(None)
+            continue
+        path = []
+        node = end
+        while node is not None:
+            path.append(node)
+            node = parents[node]
+        path.reverse()
+        row_paths.append(path)
+    return row, row_paths
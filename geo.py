@@ -0,0 +1,63 @@
+# geo.py
+import math
+import numpy as np
+from collections import namedtuple
+
+Point = namedtuple('Point', ['lat', 'lon'])
+
+# Radius of earth in km
+EARTH_RADIUS = 6371
+
+# Length in km of one degree of latitude
+KM_PER_DEGREE = EARTH_RADIUS * math.pi / 180
+
+def haversine(p1: Point, p2: Point)->float:
+    '''Calculates the haversine formula between 2 points and returns the distance in kilometers'''
+    # https://en.wikipedia.org/wiki/Haversine_formula
+    # https://community.esri.com/t5/coordinate-reference-systems-blog/distance-on-a-sphere-the-haversine-formula/ba-p/902128
+    
+    lat1 = p1.lat
+    lon1 = p1.lon
+    lat2 = p2.lat
+    lon2 = p2.lon
+    
+    # radian conversion
+    lat1_r = math.radians(lat1)
+    lat2_r = math.radians(lat2)
+    
+    # deltas
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lon = math.radians(lon2 - lon1)
+    
+    a = math.sin(delta_lat / 2.0) ** 2 + math.cos(lat1_r) * math.cos(lat2_r) * math.sin(delta_lon / 2.0) ** 2
+    
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    
+    km = c * EARTH_RADIUS
+    return km
+
+def haversine_pairwise(lats1, lons1, lats2, lons2):
+    '''Vectorized haversine between aligned arrays of coordinates, returns a numpy array of distances in kilometers.
+    Any of the arguments can also be a single value, which is broadcast against the others.'''
+    lats1 = np.asarray(lats1, dtype=np.float64)
+    lons1 = np.asarray(lons1, dtype=np.float64)
+    lats2 = np.asarray(lats2, dtype=np.float64)
+    lons2 = np.asarray(lons2, dtype=np.float64)
+    
+    # radian conversion
+    lat1_r = np.radians(lats1)
+    lat2_r = np.radians(lats2)
+    
+    # deltas
+    delta_lat = np.radians(lats2 - lats1)
+    delta_lon = np.radians(lons2 - lons1)
+    
+    a = np.sin(delta_lat / 2.0) ** 2 + np.cos(lat1_r) * np.cos(lat2_r) * np.sin(delta_lon / 2.0) ** 2
+    
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+    
+    return c * EARTH_RADIUS
+
+def haversine_to_many(point: Point, lats, lons):
+    '''Vectorized haversine from one point to many points given as arrays of lats and lons'''
+    return haversine_pairwise(point.lat, point.lon, lats, lons)
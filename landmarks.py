@@ -0,0 +1,113 @@
+# landmarks.py
+import math
+from array import array
+import numpy as np
+import map_cache
+from routing_graph import SIMPLIFIED_SUFFIX, RoutingGraph, dijkstra
+
+LANDMARKS_MAGIC = b"OSMLANDM"
+LANDMARKS_VERSION = 1
+LANDMARKS_EXTENSION = ".landmarks"
+
+AMOUNT_OF_LANDMARKS = 8
+
+# Distances are stored as float32, each can be off by this much relative to its size
+FLOAT32_EPSILON = 2.0 ** -24
+
+
+class Landmarks:
+    '''Distances from a few landmark nodes to every node of a RoutingGraph, for the ALT heuristic.
+
+    By the triangle inequality, |d(L, v) - d(L, t)| is a lower bound of d(v, t) for every landmark L.
+    distances holds one row of float32 distances per landmark (landmark major), unreachable nodes are inf.
+    '''
+    def __init__(self, nodes, distances):
+        if len(nodes) == 0 or len(distances) % len(nodes):
+            raise Exception("Error: distances do not have a row per landmark")
+
+        self.nodes = nodes
+        self.distances = distances
+        self.matrix = np.frombuffer(distances, dtype=np.float32).reshape(len(nodes), -1)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def lower_bounds(self, target: int):
+        '''returns a numpy array of the lower bound of the distance from every node to the target'''
+        to_target = self.matrix[:, target][:, None]
+        with np.errstate(invalid="ignore"):
+            bounds = np.abs(self.matrix - to_target)
+            # Undo the float32 rounding of both distances so the bound stays admissible
+            bounds -= FLOAT32_EPSILON * (self.matrix + to_target)
+        # inf - inf (neither node reachable from the landmark) gives no information
+        bounds[np.isnan(bounds)] = 0.0
+        return np.maximum(bounds.max(axis=0, initial=0.0), 0.0)
+
+    def to_node(self, node: int) -> list:
+        '''returns the distance from every landmark to the node'''
+        return self.matrix[:, node].tolist()
+
+    def lower_bound(self, node: int, target: int) -> float:
+        '''returns the lower bound of the distance from the node to the target, as lower_bounds does for every node'''
+        return bound_between(self.to_node(node), self.to_node(target))
+
+def bound_between(from_node: list, to_target: list) -> float:
+    '''Lower bound of the distance between two nodes given the distance from every landmark to each (Landmarks.to_node)'''
+    bound = 0.0
+    for d_node, d_target in zip(from_node, to_target):
+        # A landmark that cannot reach either node gives no information
+        if d_node == math.inf or d_target == math.inf:
+            continue
+        # Undo the float32 rounding of both distances so the bound stays admissible
+        bound = max(bound, abs(d_node - d_target) - FLOAT32_EPSILON * (d_node + d_target))
+    return bound
+
+def select_landmarks(graph: RoutingGraph, amount: int = AMOUNT_OF_LANDMARKS) -> Landmarks:
+    '''Picks landmarks by farthest selection: each landmark is the node farthest from the ones picked so far.
+    Returns the Landmarks with their one-to-all distances.'''
+    # Start from the best connected node
+    degrees = [graph.offsets[i + 1] - graph.offsets[i] for i in range(len(graph))]
+    if not degrees or max(degrees) == 0:
+        raise Exception("Error: graph has no edges to pick landmarks from")
+    start = degrees.index(max(degrees))
+
+    nodes = array('q')
+    rows = []
+    # Distance of every node to the closest landmark so far
+    closest = dijkstra(graph, [start])[0]
+    while len(nodes) < amount:
+        # Farthest reachable node that is not a landmark yet
+        reachable = [(d, i) for i, d in enumerate(closest) if d != math.inf and d > 0]
+        if not reachable:
+            break
+        _, landmark = max(reachable)
+
+        distances = dijkstra(graph, [landmark])[0]
+        # The start node is not a landmark, so the first landmark replaces its distances
+        if rows:
+            closest = [min(a, b) for a, b in zip(closest, distances)]
+        else:
+            closest = distances
+        nodes.append(landmark)
+        rows.append(distances)
+
+    distances = array('f')
+    for row in rows:
+        distances.extend(row)
+    return Landmarks(nodes, distances)
+
+def landmarks_file_name(map_file: str, simplified: bool = False) -> str:
+    '''returns the name of the landmarks file kept next to the map file, for the simplified graph of the map if simplified'''
+    return map_file + (SIMPLIFIED_SUFFIX if simplified else "") + LANDMARKS_EXTENSION
+
+def write_landmarks(file_name: str, map_file: str, landmarks: Landmarks) -> None:
+    '''Writes the landmarks picked for map_file to file_name'''
+    map_cache.write_array_file(file_name, map_file, LANDMARKS_MAGIC, LANDMARKS_VERSION,
+                               [('q', landmarks.nodes), ('f', landmarks.distances)])
+
+def read_landmarks(file_name: str, map_file: str) -> Landmarks:
+    '''Opens the landmarks of map_file with mmap, None if there are none or they are stale'''
+    arrays = map_cache.read_array_file(file_name, map_file, LANDMARKS_MAGIC, LANDMARKS_VERSION, ['q', 'f'])
+    if arrays is None:
+        return None
+    return Landmarks(*arrays)
@@ -0,0 +1,234 @@
+# map_cache.py
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from routing_graph import HIGHWAY_CLASS, RoutingGraph, connected_components
+
+# Binary layout of a cache file (little-endian):
+#   header: magic, version, payload crc32, source size, source mtime (ns), node count, edge count,
+#           way count, way node count, node way count, bbox (minlat, minlon, maxlat, maxlon)
+#   payload: fixed-width arrays in the order of CACHE_ARRAYS. The 8 byte arrays come first,
+#           then the 4 byte ones, so every array stays aligned.
+# The crc32 is only checked when asked for: checking it reads the whole file, which opening it with mmap avoids.
+CACHE_MAGIC = b"OSMGRAPH"
+CACHE_VERSION = 3
+CACHE_EXTENSION = ".mapcache"
+HEADER = struct.Struct("<8sIIqqqqqqq4d")
+
+# Way highway class for ways without a highway value
+NO_HIGHWAY_CLASS = 255
+
+# (name, typecode, count key) where the count key gives the length of the array
+CACHE_ARRAYS = [
+    ("ids", "q", "nodes"),
+    ("lats", "d", "nodes"),
+    ("lons", "d", "nodes"),
+    ("offsets", "q", "nodes + 1"),
+    ("targets", "q", "edges"),
+    ("lengths", "d", "edges"),
+    ("way_ids", "q", "ways"),
+    ("way_offsets", "q", "ways + 1"),
+    ("way_nodes", "q", "way nodes"),
+    ("node_way_offsets", "q", "nodes + 1"),
+    ("node_ways", "q", "node ways"),
+    ("maxspeeds", "f", "edges"),
+    ("way_maxspeeds", "f", "ways"),
+    ("components", "i", "nodes"),
+    ("highway_classes", "B", "edges"),
+    ("way_highway_classes", "B", "ways"),
+]
+
+
+class MapCache:
+    '''A compiled map opened from a cache file. The arrays are read only views into the mmapped file.'''
+    def __init__(self, graph: RoutingGraph, bbox: tuple, way_ids, way_offsets, way_nodes, way_highway_classes,
+                 way_maxspeeds, node_way_offsets, node_ways):
+        self.graph = graph
+        # (minlat, minlon, maxlat, maxlon)
+        self.bbox = bbox
+        # The nodes of way i are way_nodes[way_offsets[i]:way_offsets[i + 1]] (OSM ids)
+        self.way_ids = way_ids
+        self.way_offsets = way_offsets
+        self.way_nodes = way_nodes
+        self.way_highway_classes = way_highway_classes
+        # Maxspeed (in km/h) of each way, 0 if it has none
+        self.way_maxspeeds = way_maxspeeds
+        # The ways of graph node i are node_ways[node_way_offsets[i]:node_way_offsets[i + 1]] (positions in way_ids)
+        self.node_way_offsets = node_way_offsets
+        self.node_ways = node_ways
+
+    def __getstate__(self):
+        '''Pickles mmapped (memoryview) arrays as array copies, like RoutingGraph'''
+        return {name: array(value.format, value) if type(value) is memoryview else value
+                for name, value in self.__dict__.items()}
+
+def cache_file_name(map_file: str) -> str:
+    '''returns the name of the cache file kept next to the map file. The map's extension is kept,
+    so maps that only differ by it (foo.osm and foo.json) get their own cache.'''
+    return map_file + CACHE_EXTENSION
+
+def source_fingerprint(map_file: str) -> tuple:
+    '''returns (size, mtime in ns) of the map file, a change in either makes its cache stale'''
+    stat = os.stat(map_file)
+    return stat.st_size, stat.st_mtime_ns
+
+def write_map_cache(cache_file: str, map_file: str, graph: RoutingGraph, way_dict: dict, bbox: tuple) -> None:
+    '''Writes the compiled graph, ways and bounding box (minlat, minlon, maxlat, maxlon) of map_file to cache_file,
+    with the ways of every node and the connected components of the graph'''
+    way_ids = array('q', way_dict.keys())
+    way_offsets = array('q', [0])
+    way_nodes = array('q')
+    way_highway_classes = array('B')
+    way_maxspeeds = array('f')
+    # The ways of each node in way order, as search.add_all_ways_to_nodes adds them
+    node_way_counts = array('q', bytes(8 * len(graph)))
+    for way in way_dict.values():
+        way_nodes.extend(way.nodes)
+        way_offsets.append(len(way_nodes))
+        way_highway_classes.append(HIGHWAY_CLASS.get(way.highway_value, NO_HIGHWAY_CLASS))
+        way_maxspeeds.append(way.maxspeed or 0.0)
+        for i in _way_node_indices(graph, way.nodes):
+            node_way_counts[i] += 1
+    
+    node_way_offsets = array('q', [0])
+    for count in node_way_counts:
+        node_way_offsets.append(node_way_offsets[-1] + count)
+    node_ways = array('q', bytes(8 * node_way_offsets[-1]))
+    filled = array('q', node_way_offsets[:-1])
+    for w, way in enumerate(way_dict.values()):
+        for i in _way_node_indices(graph, way.nodes):
+            node_ways[filled[i]] = w
+            filled[i] += 1
+
+    arrays = {
+        "ids": graph.ids, "lats": graph.lats, "lons": graph.lons, "offsets": graph.offsets,
+        "targets": graph.targets, "lengths": graph.lengths, "highway_classes": graph.highway_classes,
+        "way_ids": way_ids, "way_offsets": way_offsets, "way_nodes": way_nodes,
+        "way_highway_classes": way_highway_classes, "maxspeeds": graph.maxspeeds, "way_maxspeeds": way_maxspeeds,
+        "node_way_offsets": node_way_offsets, "node_ways": node_ways, "components": connected_components(graph),
+    }
+    payload = b"".join(array(typecode, arrays[name]).tobytes() for name, typecode, _ in CACHE_ARRAYS)
+
+    size, mtime_ns = source_fingerprint(map_file)
+    header = HEADER.pack(CACHE_MAGIC, CACHE_VERSION, zlib.crc32(payload), size, mtime_ns,
+                         len(graph), graph.edge_count(), len(way_ids), len(way_nodes), len(node_ways), *bbox)
+
+    # Write to a temporary file first so a reader never sees a half written cache
+    tmp_file = cache_file + ".tmp"
+    with open(tmp_file, "wb") as file:
+        file.write(header)
+        file.write(payload)
+    os.replace(tmp_file, cache_file)
+
+def _way_node_indices(graph: RoutingGraph, way_nodes: list):
+    '''yields the graph index of every distinct node of a way that is in the graph'''
+    for node_id in dict.fromkeys(way_nodes):
+        i = graph.index.get(node_id)
+        if i is not None:
+            yield i
+
+def read_map_cache(cache_file: str, map_file: str, verify: bool = False) -> MapCache:
+    '''Opens cache_file with mmap. Returns None if there is no cache or it is stale (other version or
+    map_file changed since it was written). If verify, the payload must also match its checksum.'''
+    if not os.path.exists(cache_file):
+        return None
+
+    with open(cache_file, "rb") as file:
+        if os.fstat(file.fileno()).st_size < HEADER.size:
+            return None
+        # The mapping stays valid after the file is closed
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, crc, size, mtime_ns, nodes, edges, ways, way_node_count, node_way_count, *bbox = \
+        HEADER.unpack_from(buffer)
+    if magic != CACHE_MAGIC or version != CACHE_VERSION:
+        return None
+    if (size, mtime_ns) != source_fingerprint(map_file):
+        return None
+
+    payload = memoryview(buffer)[HEADER.size:]
+    if verify and zlib.crc32(payload) != crc:
+        return None
+
+    counts = {"nodes": nodes, "nodes + 1": nodes + 1, "edges": edges, "ways": ways, "ways + 1": ways + 1,
+              "way nodes": way_node_count, "node ways": node_way_count}
+    # Without the checksum, a truncated file is caught by its size
+    if sum(counts[count_key] * struct.calcsize(typecode) for _, typecode, count_key in CACHE_ARRAYS) != len(payload):
+        return None
+    arrays = dict()
+    position = 0
+    for name, typecode, count_key in CACHE_ARRAYS:
+        nbytes = counts[count_key] * struct.calcsize(typecode)
+        arrays[name] = payload[position:position + nbytes].cast(typecode)
+        position += nbytes
+
+    graph = RoutingGraph(arrays["ids"], arrays["lats"], arrays["lons"], arrays["offsets"],
+                         arrays["targets"], arrays["lengths"], arrays["highway_classes"], arrays["maxspeeds"])
+    graph.components = arrays["components"]
+    return MapCache(graph, tuple(bbox), arrays["way_ids"], arrays["way_offsets"], arrays["way_nodes"],
+                    arrays["way_highway_classes"], arrays["way_maxspeeds"], arrays["node_way_offsets"], arrays["node_ways"])
+
+# Generic layout used for data derived from a map (contraction hierarchies, landmarks...):
+#   header: magic, version, payload crc32, source size, source mtime (ns), array count
+#   then the length of each array, then the arrays, each padded to 8 bytes
+ARRAY_FILE_HEADER = struct.Struct("<8sIIqqq")
+
+def _padding(nbytes: int) -> int:
+    '''returns the number of bytes needed to pad nbytes to a multiple of 8'''
+    return -nbytes % 8
+
+def write_array_file(file_name: str, map_file: str, magic: bytes, version: int, arrays: list) -> None:
+    '''Writes a list of (typecode, values) arrays derived from map_file to file_name'''
+    lengths = array('q', (len(values) for _, values in arrays))
+    chunks = [lengths.tobytes()]
+    for typecode, values in arrays:
+        data = array(typecode, values).tobytes()
+        chunks.append(data)
+        chunks.append(bytes(_padding(len(data))))
+    payload = b"".join(chunks)
+
+    size, mtime_ns = source_fingerprint(map_file)
+    header = ARRAY_FILE_HEADER.pack(magic, version, zlib.crc32(payload), size, mtime_ns, len(arrays))
+
+    tmp_file = file_name + ".tmp"
+    with open(tmp_file, "wb") as file:
+        file.write(header)
+        file.write(payload)
+    os.replace(tmp_file, file_name)
+
+def read_array_file(file_name: str, map_file: str, magic: bytes, version: int, typecodes: list,
+                    verify: bool = False) -> list:
+    '''Opens an array file with mmap and returns its arrays as memoryviews cast to typecodes.
+    Returns None if there is no file or it is stale, in the same way as read_map_cache (with the same verify).'''
+    if not os.path.exists(file_name):
+        return None
+
+    with open(file_name, "rb") as file:
+        if os.fstat(file.fileno()).st_size < ARRAY_FILE_HEADER.size:
+            return None
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    file_magic, file_version, crc, size, mtime_ns, count = ARRAY_FILE_HEADER.unpack_from(buffer)
+    if file_magic != magic or file_version != version or count != len(typecodes):
+        return None
+    if (size, mtime_ns) != source_fingerprint(map_file):
+        return None
+
+    payload = memoryview(buffer)[ARRAY_FILE_HEADER.size:]
+    if len(payload) < 8 * count or (verify and zlib.crc32(payload) != crc):
+        return None
+
+    lengths = payload[:8 * count].cast("q")
+    arrays = []
+    position = 8 * count
+    for typecode, length in zip(typecodes, lengths):
+        nbytes = length * struct.calcsize(typecode)
+        if length < 0 or position + nbytes > len(payload):
+            return None
+        arrays.append(payload[position:position + nbytes].cast(typecode))
+        position += nbytes + _padding(nbytes)
+    if position != len(payload):
+        return None
+    return arrays
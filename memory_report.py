@@ -0,0 +1,103 @@
+# memory_report.py
+import argparse
+import gc
+import json
+import os
+import tracemalloc
+from collections import namedtuple
+import search
+from benchmark import grid_map_dict
+
+# The node and way classes as they were before they had __slots__, to report what the compact ones save
+LegacyPoint = namedtuple('LegacyPoint', ['lat', 'lon'])
+
+class LegacyOSMNode:
+    def __init__(self, osm_id: int, lat: float, lon: float):
+        self.id = osm_id
+        self.coordinate = LegacyPoint(lat, lon)
+        self.ways = set()
+
+    def add_way(self, way: int):
+        self.ways.add(way)
+
+class LegacyWay:
+    def __init__(self, osm_id: int):
+        self.id = osm_id
+        self.nodes = []
+        self.highway_value = None
+
+# name -> (node class, way class). A* keeps no object per node, its Frontier works on graph indices
+LAYOUTS = {
+    "legacy": (LegacyOSMNode, LegacyWay),
+    "compact": (search.OSMNode, search.Way),
+}
+
+
+def traced_bytes(build) -> tuple:
+    '''returns (bytes still allocated once build() returns, its result)'''
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return after - before, result
+
+def memory_report(map_dict: dict) -> dict:
+    '''Returns the bytes per node (with its coordinates, ways and dict entry) and per way (with its node list)
+    of every layout in LAYOUTS for a json map'''
+    # (node id, way id) memberships, read before measuring
+    memberships = [(int(n['@ref']), int(item['@id'])) for item in map_dict["osm"]["way"] for n in item["nd"]]
+
+    report = dict()
+    for name, (node_class, way_class) in LAYOUTS.items():
+        def build_nodes():
+            node_dict = {int(item['@id']): node_class(int(item['@id']), float(item['@lat']), float(item['@lon']))
+                         for item in map_dict["osm"]["node"]}
+            for node_id, way_id in memberships:
+                if node_id in node_dict:
+                    node_dict[node_id].add_way(way_id)
+            return node_dict
+
+        def build_ways():
+            way_dict = dict()
+            for item in map_dict["osm"]["way"]:
+                way = way_class(int(item['@id']))
+                way.nodes = [int(n['@ref']) for n in item["nd"]]
+                way_dict[way.id] = way
+            return way_dict
+
+        node_bytes, node_dict = traced_bytes(build_nodes)
+        way_bytes, way_dict = traced_bytes(build_ways)
+        report[name] = {"nodes": len(node_dict), "ways": len(way_dict),
+                        "bytes_per_node": node_bytes / len(node_dict),
+                        "bytes_per_way": way_bytes / len(way_dict)}
+    return report
+
+def print_report(map_name: str, report: dict) -> None:
+    print(f"{map_name}: {report['compact']['nodes']} nodes, {report['compact']['ways']} ways")
+    for key in ["bytes_per_node", "bytes_per_way"]:
+        legacy = report["legacy"][key]
+        compact = report["compact"][key]
+        print(f"    {key:24}{legacy:10.0f} -> {compact:8.0f}  ({compact / legacy:.0%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reports the memory used per node and way before and after __slots__")
+    parser.add_argument("maps", nargs="*", default=["json_maps/nymap3_data.json"], help="json maps")
+    parser.add_argument("--grid", type=int, action="append", default=[], help="side of a synthetic grid map")
+    parser.add_argument("-o", "--output", help="save the report as JSON")
+    args = parser.parse_args()
+
+    reports = dict()
+    for map_file in args.maps:
+        reports[os.path.basename(map_file)] = memory_report(search.load_json_to_dict(map_file))
+    for size in args.grid:
+        reports[f"grid{size}"] = memory_report(grid_map_dict(size))
+    for map_name, report in reports.items():
+        print_report(map_name, report)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(reports, file, indent=2)
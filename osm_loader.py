@@ -0,0 +1,38 @@
+# osm_loader.py
+import xml.etree.ElementTree as ET
+
+
+def iter_osm_elements(file_name):
+    '''Incrementally parses an OSM xml file and yields its elements one at a time as tuples:
+        ("bounds", minlat, minlon, maxlat, maxlon)
+        ("node", osm_id, lat, lon, tags)
+        ("way", osm_id, node_refs, tags)
+    Each element is cleared once yielded, so memory does not grow with the size of the file.
+    Relations are skipped.
+    '''
+    root = None
+    for event, elem in ET.iterparse(file_name, events=("start", "end")):
+        # Keep the root so its finished children can be dropped
+        if event == "start":
+            if root is None:
+                root = elem
+            continue
+
+        if elem.tag == "node":
+            yield ("node", int(elem.get("id")), float(elem.get("lat")), float(elem.get("lon")), _tags(elem))
+        elif elem.tag == "way":
+            node_refs = [int(nd.get("ref")) for nd in elem.iter("nd")]
+            yield ("way", int(elem.get("id")), node_refs, _tags(elem))
+        elif elem.tag == "bounds":
+            yield ("bounds", float(elem.get("minlat")), float(elem.get("minlon")),
+                   float(elem.get("maxlat")), float(elem.get("maxlon")))
+        elif elem.tag != "relation":
+            # Children of a node, way or relation are handled with their parent
+            continue
+
+        elem.clear()
+        root.clear()
+
+def _tags(elem) -> dict:
+    '''returns the k/v tags of an element as a dict'''
+    return {tag.get("k"): tag.get("v") for tag in elem.iter("tag")}
@@ -0,0 +1,393 @@
+# pbf_loader.py
+import itertools
+import multiprocessing
+import os
+import struct
+import sys
+import zlib
+import osm_loader
+
+# Features of the OSM PBF format this reader decodes, files that require others are refused
+SUPPORTED_FEATURES = {"OsmSchema-V0.6", "DenseNodes"}
+
+# Elements per data block written by write_pbf, as other OSM tools do
+BLOCK_SIZE = 8000
+
+# Largest blob header and blob the format allows
+MAX_HEADER_SIZE = 64 * 1024
+MAX_BLOB_SIZE = 32 * 1024 * 1024
+
+# Coordinates are stored as integers in units of granularity nanodegrees
+NANODEGREES = 1000000000
+DEFAULT_GRANULARITY = 100
+
+# Data blocks handed to each worker at a time, so only a few blocks are read ahead of the decoding
+BLOCKS_PER_WORKER = 4
+
+# Protobuf wire types
+VARINT = 0
+FIXED64 = 1
+LENGTH_DELIMITED = 2
+FIXED32 = 5
+
+
+def iter_pbf_elements(file_name, processes=None):
+    '''Reads an OSM PBF file one block at a time and yields its elements as the same tuples as
+    osm_loader.iter_osm_elements:
+        ("bounds", minlat, minlon, maxlat, maxlon)
+        ("node", osm_id, lat, lon, tags)
+        ("way", osm_id, node_refs, tags)
+    Data blocks do not depend on each other, so they are decompressed and decoded in a pool of processes
+    (one per cpu if processes is None) and still yielded in file order. Relations are skipped.
+    '''
+    if processes is None:
+        processes = os.cpu_count() or 1
+    blobs = iter_blobs(file_name)
+
+    blob_type, blob = next(blobs, (None, None))
+    if blob_type != "OSMHeader":
+        raise Exception(f"Error: {file_name} does not start with an OSMHeader block")
+    bounds = decode_header_block(decompress_blob(blob))
+    if bounds is not None:
+        yield bounds
+
+    data_blobs = (blob for blob_type, blob in blobs if blob_type == "OSMData")
+    pool = None
+    try:
+        while True:
+            batch = list(itertools.islice(data_blobs, processes * BLOCKS_PER_WORKER))
+            if not batch:
+                break
+            # A small file is decoded in this process rather than paying for a pool
+            if pool is None and processes > 1 and len(batch) > 1:
+                pool = _pool(processes)
+            blocks = pool.map(decode_data_blob, batch) if pool is not None else map(decode_data_blob, batch)
+            for elements in blocks:
+                yield from elements
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+def _pool(processes: int):
+    '''Returns a process pool, workers only need the functions of this module'''
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork").Pool(processes)
+    return multiprocessing.Pool(processes)
+
+def iter_blobs(file_name):
+    '''yields the (type, blob) of each block of a PBF file, the blobs still compressed'''
+    with open(file_name, "rb") as file:
+        while True:
+            size_bytes = file.read(4)
+            if not size_bytes:
+                return
+            if len(size_bytes) < 4:
+                raise Exception(f"Error: {file_name} is truncated")
+            header_size = struct.unpack(">I", size_bytes)[0]
+            if header_size > MAX_HEADER_SIZE:
+                raise Exception(f"Error: blob header of {header_size} bytes in {file_name} is too large")
+
+            blob_type, data_size = None, None
+            for field, _, value in _fields(file.read(header_size)):
+                if field == 1:
+                    blob_type = bytes(value).decode("utf-8")
+                elif field == 3:
+                    data_size = value
+            if blob_type is None or data_size is None or data_size > MAX_BLOB_SIZE:
+                raise Exception(f"Error: bad blob header in {file_name}")
+
+            blob = file.read(data_size)
+            if len(blob) < data_size:
+                raise Exception(f"Error: {file_name} is truncated")
+            yield blob_type, blob
+
+def decompress_blob(blob: bytes) -> bytes:
+    '''returns the contents of a Blob message, which is stored raw or zlib compressed'''
+    raw_size = None
+    for field, _, value in _fields(blob):
+        if field == 1:
+            return bytes(value)
+        if field == 2:
+            raw_size = value
+        elif field == 3:
+            data = zlib.decompress(value)
+            if raw_size is not None and len(data) != raw_size:
+                raise Exception("Error: blob does not decompress to its raw_size")
+            return data
+        elif field in (4, 5, 6, 7):
+            raise Exception("Error: only raw and zlib compressed PBF blocks are supported")
+    raise Exception("Error: blob has no data")
+
+def decode_header_block(data: bytes) -> tuple:
+    '''Checks the required features of a HeaderBlock, returns its ("bounds", ...) element or None'''
+    bounds = None
+    for field, _, value in _fields(data):
+        if field == 1:
+            # HeaderBBox, in nanodegrees
+            box = {f: _zigzag(v) for f, _, v in _fields(value)}
+            left, right, top, bottom = (box.get(f, 0) / NANODEGREES for f in (1, 2, 3, 4))
+            bounds = ("bounds", bottom, left, top, right)
+        elif field == 4:
+            feature = bytes(value).decode("utf-8")
+            if feature not in SUPPORTED_FEATURES:
+                raise Exception(f"Error: PBF feature {feature} is not supported")
+    return bounds
+
+def decode_data_blob(blob: bytes) -> list:
+    return decode_primitive_block(decompress_blob(blob))
+
+def decode_primitive_block(data: bytes) -> list:
+    '''returns the node and way elements of a PrimitiveBlock in order'''
+    strings = []
+    groups = []
+    granularity = DEFAULT_GRANULARITY
+    lat_offset = 0
+    lon_offset = 0
+    for field, _, value in _fields(data):
+        if field == 1:
+            strings = [bytes(s).decode("utf-8") for f, _, s in _fields(value) if f == 1]
+        elif field == 2:
+            groups.append(value)
+        elif field == 17:
+            granularity = value
+        elif field == 19:
+            lat_offset = _int64(value)
+        elif field == 20:
+            lon_offset = _int64(value)
+
+    def coordinate(lat: int, lon: int) -> tuple:
+        # Dividing (rather than multiplying by 1e-9) gives the same floats as parsing the decimal degrees
+        return (lat_offset + granularity * lat) / NANODEGREES, (lon_offset + granularity * lon) / NANODEGREES
+
+    elements = []
+    for group in groups:
+        for field, _, value in _fields(group):
+            if field == 1:
+                elements.append(_decode_node(value, strings, coordinate))
+            elif field == 2:
+                elements.extend(_decode_dense_nodes(value, strings, coordinate))
+            elif field == 3:
+                elements.append(_decode_way(value, strings))
+    return elements
+
+def _decode_node(data, strings: list, coordinate) -> tuple:
+    osm_id, lat, lon = 0, 0, 0
+    keys, values = [], []
+    for field, _, value in _fields(data):
+        if field == 1:
+            osm_id = _zigzag(value)
+        elif field == 2:
+            keys = _packed_varints(value)
+        elif field == 3:
+            values = _packed_varints(value)
+        elif field == 8:
+            lat = _zigzag(value)
+        elif field == 9:
+            lon = _zigzag(value)
+    return ("node", osm_id, *coordinate(lat, lon), {strings[k]: strings[v] for k, v in zip(keys, values)})
+
+def _decode_dense_nodes(data, strings: list, coordinate) -> list:
+    ids, lats, lons, keys_vals = [], [], [], []
+    for field, _, value in _fields(data):
+        if field == 1:
+            ids = _packed_varints(value)
+        elif field == 8:
+            lats = _packed_varints(value)
+        elif field == 9:
+            lons = _packed_varints(value)
+        elif field == 10:
+            keys_vals = _packed_varints(value)
+
+    nodes = []
+    # Ids and coordinates are delta coded, tags are key, value pairs with a 0 after each node's tags
+    osm_id, lat, lon = 0, 0, 0
+    position = 0
+    for id_delta, lat_delta, lon_delta in zip(ids, lats, lons):
+        osm_id += _zigzag(id_delta)
+        lat += _zigzag(lat_delta)
+        lon += _zigzag(lon_delta)
+        tags = dict()
+        while position < len(keys_vals) and keys_vals[position] != 0:
+            tags[strings[keys_vals[position]]] = strings[keys_vals[position + 1]]
+            position += 2
+        position += 1
+        nodes.append(("node", osm_id, *coordinate(lat, lon), tags))
+    return nodes
+
+def _decode_way(data, strings: list) -> tuple:
+    osm_id = 0
+    keys, values, refs = [], [], []
+    for field, _, value in _fields(data):
+        if field == 1:
+            osm_id = _int64(value)
+        elif field == 2:
+            keys = _packed_varints(value)
+        elif field == 3:
+            values = _packed_varints(value)
+        elif field == 8:
+            refs = list(itertools.accumulate(_zigzag(ref) for ref in _packed_varints(value)))
+    return ("way", osm_id, refs, {strings[k]: strings[v] for k, v in zip(keys, values)})
+
+def _fields(data):
+    '''yields (field number, wire type, value) of a protobuf message, length delimited values as memoryviews'''
+    data = memoryview(data)
+    position = 0
+    while position < len(data):
+        key, position = _varint(data, position)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == VARINT:
+            value, position = _varint(data, position)
+        elif wire_type == LENGTH_DELIMITED:
+            length, position = _varint(data, position)
+            value = data[position:position + length]
+            position += length
+        elif wire_type == FIXED64:
+            value = struct.unpack_from("<q", data, position)[0]
+            position += 8
+        elif wire_type == FIXED32:
+            value = struct.unpack_from("<i", data, position)[0]
+            position += 4
+        else:
+            raise Exception(f"Error: unsupported protobuf wire type {wire_type}")
+        yield field, wire_type, value
+
+def _varint(data, position: int) -> tuple:
+    '''returns (value, position after it) of the varint at position'''
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+def _packed_varints(data) -> list:
+    values = []
+    position = 0
+    while position < len(data):
+        value, position = _varint(data, position)
+        values.append(value)
+    return values
+
+def _int64(value: int) -> int:
+    '''decodes an int64, negative values are stored as 64 bit two's complement'''
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def _zigzag(value: int) -> int:
+    '''decodes a sint64, which is stored with its sign in the lowest bit'''
+    return (value >> 1) ^ -(value & 1)
+
+
+def write_pbf(file_name, elements, block_size=BLOCK_SIZE) -> None:
+    '''Writes osm_loader element tuples to a zlib compressed PBF file, nodes as DenseNodes.
+    A ("bounds", ...) element must come first to be written in the header.'''
+    elements = iter(elements)
+    first = next(elements, None)
+    bounds = None
+    if first is not None and first[0] == "bounds":
+        bounds = first
+    elif first is not None:
+        elements = itertools.chain([first], elements)
+
+    with open(file_name + ".tmp", "wb") as file:
+        _write_blob(file, "OSMHeader", encode_header_block(["OsmSchema-V0.6", "DenseNodes"], bounds))
+        # Each block holds elements of one kind
+        for kind, group in itertools.groupby(elements, key=lambda element: element[0]):
+            if kind not in ("node", "way"):
+                continue
+            while True:
+                block = list(itertools.islice(group, block_size))
+                if not block:
+                    break
+                _write_blob(file, "OSMData", _encode_primitive_block(kind, block))
+    os.replace(file_name + ".tmp", file_name)
+
+def encode_header_block(features: list, bounds: tuple = None) -> bytes:
+    '''returns a HeaderBlock requiring the given features, with the bounds of a ("bounds", ...) element'''
+    header = b""
+    if bounds is not None:
+        _, minlat, minlon, maxlat, maxlon = bounds
+        box = b"".join(_encode_varint_field(f, _encode_zigzag(round(v * NANODEGREES)))
+                       for f, v in zip((1, 2, 3, 4), (minlon, maxlon, maxlat, minlat)))
+        header += _encode_field(1, box)
+    header += b"".join(_encode_field(4, feature.encode("utf-8")) for feature in features)
+    return header + _encode_field(16, b"pbf_loader.py")
+
+def _write_blob(file, blob_type: str, data: bytes) -> None:
+    blob = _encode_varint_field(2, len(data)) + _encode_field(3, zlib.compress(data))
+    header = _encode_field(1, blob_type.encode("utf-8")) + _encode_varint_field(3, len(blob))
+    file.write(struct.pack(">I", len(header)))
+    file.write(header)
+    file.write(blob)
+
+def _encode_primitive_block(kind: str, block: list) -> bytes:
+    # String 0 is reserved as the end of a dense node's tags
+    strings = {"": 0}
+    def string_id(s: str) -> int:
+        return strings.setdefault(s, len(strings))
+
+    if kind == "node":
+        ids, lats, lons, keys_vals = [], [], [], []
+        previous = (0, 0, 0)
+        for _, osm_id, lat, lon, tags in block:
+            current = (osm_id, round(lat * NANODEGREES / DEFAULT_GRANULARITY), round(lon * NANODEGREES / DEFAULT_GRANULARITY))
+            for values, value, old in zip((ids, lats, lons), current, previous):
+                values.append(_encode_zigzag(value - old))
+            previous = current
+            for k, v in tags.items():
+                keys_vals += [string_id(k), string_id(v)]
+            keys_vals.append(0)
+        dense = (_encode_packed(1, ids) + _encode_packed(8, lats) + _encode_packed(9, lons) +
+                 _encode_packed(10, keys_vals))
+        group = _encode_field(2, dense)
+    else:
+        ways = []
+        for _, osm_id, node_refs, tags in block:
+            deltas = [_encode_zigzag(ref - old) for ref, old in zip(node_refs, [0] + node_refs[:-1])]
+            ways.append(_encode_field(3, _encode_varint_field(1, osm_id) +
+                                      _encode_packed(2, [string_id(k) for k in tags]) +
+                                      _encode_packed(3, [string_id(v) for v in tags.values()]) +
+                                      _encode_packed(8, deltas)))
+        group = b"".join(ways)
+
+    table = b"".join(_encode_field(1, s.encode("utf-8")) for s in strings)
+    return _encode_field(1, table) + _encode_field(2, group)
+
+def _encode_varint(value: int) -> bytes:
+    chunks = bytearray()
+    while value >= 0x80:
+        chunks.append((value & 0x7f) | 0x80)
+        value >>= 7
+    chunks.append(value)
+    return bytes(chunks)
+
+def _encode_varint_field(field: int, value: int) -> bytes:
+    return _encode_varint(field << 3 | VARINT) + _encode_varint(value)
+
+def _encode_field(field: int, data: bytes) -> bytes:
+    return _encode_varint(field << 3 | LENGTH_DELIMITED) + _encode_varint(len(data)) + data
+
+def _encode_packed(field: int, values: list) -> bytes:
+    return _encode_field(field, b"".join(_encode_varint(value) for value in values)) if values else b""
+
+def _encode_zigzag(value: int) -> int:
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+
+def convert(file_name) -> str:
+    '''Creates a PBF file next to an OSM xml file and returns its name'''
+    pbf_file_name = os.path.splitext(file_name)[0] + ".osm.pbf"
+    print(f"Creating PBF file at: {pbf_file_name}")
+    write_pbf(pbf_file_name, osm_loader.iter_osm_elements(file_name))
+    return pbf_file_name
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2:
+        print(f"Converting {sys.argv[1]}")
+        convert(sys.argv[1])
+        print("Done")
+    else:
+        print("No conversion done")
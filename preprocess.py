@@ -0,0 +1,38 @@
+# preprocess.py
+import sys
+import time
+import search
+import contraction_hierarchy
+import landmarks
+
+
+def preprocess(map_file, simplify=False):
+    '''Compiles the map (writing its cache) and builds its contraction hierarchy and landmarks next to it,
+    for the simplified graph if simplify. Returns the names of the hierarchy and landmarks files'''
+    node_dict, way_dict, bbox, graph = search.load_map(map_file, simplify=simplify)
+    
+    print(f"Contracting {len(graph)} nodes")
+    start_time = time.perf_counter()
+    hierarchy = contraction_hierarchy.build_contraction_hierarchy(graph)
+    print(f"Added {hierarchy.shortcut_count()} shortcuts in {time.perf_counter() - start_time:.1f}s")
+    
+    hierarchy_file = contraction_hierarchy.hierarchy_file_name(map_file, simplify)
+    print(f"Creating contraction hierarchy file at: {hierarchy_file}")
+    contraction_hierarchy.write_contraction_hierarchy(hierarchy_file, map_file, hierarchy)
+    
+    print(f"Picking {landmarks.AMOUNT_OF_LANDMARKS} landmarks")
+    map_landmarks = landmarks.select_landmarks(graph)
+    landmarks_file = landmarks.landmarks_file_name(map_file, simplify)
+    print(f"Creating landmarks file at: {landmarks_file}")
+    landmarks.write_landmarks(landmarks_file, map_file, map_landmarks)
+    return hierarchy_file, landmarks_file
+    
+
+if __name__ == "__main__":
+    # --simplify builds them for the simplified graph, as loaded by batch_route.py --simplify
+    if len(sys.argv) == 2 or (len(sys.argv) == 3 and sys.argv[2] == "--simplify"):
+        print(f"Preprocessing {sys.argv[1]}")
+        preprocess(sys.argv[1], simplify=len(sys.argv) == 3)
+        print("Done")
+    else:
+        print("No preprocessing done")
@@ -0,0 +1,135 @@
+# route_cache.py
+import hashlib
+import json
+import math
+import os
+import sqlite3
+from collections import OrderedDict
+
+ROUTE_CACHE_EXTENSION = ".routes"
+
+# Stored as the user_version of the sqlite file, a disk tier of another version is dropped when it is opened
+ROUTE_CACHE_VERSION = 2
+
+# Routes kept in memory before the least recently used one is evicted
+DEFAULT_CAPACITY = 10000
+
+# Bytes read at a time when hashing a map file
+HASH_CHUNK_SIZE = 1 << 20
+
+
+class RouteCache:
+    '''Cache of answered routes in front of Map.search, keyed by (map hash, start id, goal id, cost model).
+
+    A bounded LRU tier is kept in memory and, if a file name is given, a persistent tier in an sqlite file.
+    Routes are stored as (cost, list of OSM ids), (inf, []) for a route that does not exist.
+    Since every key holds the hash of the map content, routes of an older version of the map are never
+    returned, and the disk tier drops them when it is opened.
+    '''
+    def __init__(self, map_hash: str, capacity: int = DEFAULT_CAPACITY, file_name: str = None):
+        if capacity < 1:
+            raise Exception("Error: capacity must be positive")
+
+        self.map_hash = map_hash
+        self.capacity = capacity
+        self.file_name = file_name
+        self.routes = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        # sqlite connections can not be shared with forked processes, each process opens its own
+        self._connection = None
+        self._connection_pid = None
+
+    def __len__(self):
+        return len(self.routes)
+
+    def connection(self):
+        '''returns the connection to the disk tier of this process, None if there is no disk tier'''
+        if self.file_name is None:
+            return None
+        if self._connection is None or self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.file_name, timeout=30)
+            self._connection_pid = os.getpid()
+            with self._connection:
+                # Routes of older versions have no cost
+                if self._connection.execute("PRAGMA user_version").fetchone()[0] != ROUTE_CACHE_VERSION:
+                    self._connection.execute("DROP TABLE IF EXISTS routes")
+                    self._connection.execute(f"PRAGMA user_version = {ROUTE_CACHE_VERSION}")
+                self._connection.execute("CREATE TABLE IF NOT EXISTS routes (map_hash TEXT, start INTEGER, "
+                                         "goal INTEGER, cost_model TEXT, cost REAL, path TEXT, "
+                                         "PRIMARY KEY (map_hash, start, goal, cost_model))")
+                self._connection.execute("DELETE FROM routes WHERE map_hash != ?", (self.map_hash,))
+        return self._connection
+
+    def get(self, start: int, goal: int, cost_model: str) -> tuple:
+        '''returns the cached route from start to goal as (cost, list of OSM ids), (inf, []) if there is no route,
+        None if it is not cached'''
+        key = (start, goal, cost_model)
+        if key in self.routes:
+            self.routes.move_to_end(key)
+            self.hits += 1
+            return self.routes[key]
+
+        connection = self.connection()
+        if connection is not None:
+            row = connection.execute("SELECT cost, path FROM routes WHERE map_hash = ? AND start = ? AND goal = ? "
+                                     "AND cost_model = ?", (self.map_hash, *key)).fetchone()
+            if row is not None:
+                self.disk_hits += 1
+                # A route that does not exist is stored with a NULL cost
+                route = (math.inf if row[0] is None else row[0], json.loads(row[1]))
+                self._remember(key, route)
+                return route
+
+        self.misses += 1
+        return None
+
+    def put(self, start: int, goal: int, cost_model: str, path: list, cost: float) -> None:
+        '''caches the route from start to goal given as a list of OSM ids and its cost, [] and inf if there is no route'''
+        key = (start, goal, cost_model)
+        self._remember(key, (cost, path))
+        connection = self.connection()
+        if connection is not None:
+            with connection:
+                connection.execute("INSERT OR REPLACE INTO routes VALUES (?, ?, ?, ?, ?, ?)",
+                                   (self.map_hash, *key, None if cost == math.inf else cost, json.dumps(path)))
+
+    def _remember(self, key: tuple, route: tuple) -> None:
+        self.routes[key] = route
+        self.routes.move_to_end(key)
+        if len(self.routes) > self.capacity:
+            self.routes.popitem(last=False)
+
+    def stats(self) -> dict:
+        '''returns the hit and miss counters, disk hits are lookups missed in memory but found on disk'''
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses, "size": len(self.routes)}
+
+    def close(self) -> None:
+        if self._connection is not None and self._connection_pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+
+    def __getstate__(self):
+        # A worker started by pickling opens its own connection
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        state["_connection_pid"] = None
+        return state
+
+def map_content_hash(map_file: str) -> str:
+    '''returns the sha256 of the map file content'''
+    digest = hashlib.sha256()
+    with open(map_file, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def route_cache_file_name(map_file: str) -> str:
+    '''returns the name of the route cache file kept next to the map file'''
+    return map_file + ROUTE_CACHE_EXTENSION
+
+def open_route_cache(map_file: str, capacity: int = DEFAULT_CAPACITY, persistent: bool = False) -> RouteCache:
+    '''Returns a RouteCache for the current content of map_file, with a disk tier next to it if persistent'''
+    file_name = route_cache_file_name(map_file) if persistent else None
+    return RouteCache(map_content_hash(map_file), capacity, file_name)
@@ -0,0 +1,158 @@
+# route_render.py
+import json
+import math
+import numpy as np
+import folium
+from geo import KM_PER_DEGREE
+
+# Largest distance (in km) a simplified route may stray from the original path
+DEFAULT_TOLERANCE = 0.005
+
+HTML_FILE = "osm_path.html"
+
+# Formats a RouteRenderer can save to
+RENDER_FORMATS = ["html", "geojson", "polyline"]
+
+# Colors the routes of one map cycle through
+ROUTE_COLORS = ["blue", "red", "green", "purple", "orange", "darkblue", "darkred", "cadetblue"]
+
+
+class RouteRenderer:
+    '''Collects routes, simplified as they are added, and saves them all at once as one map.
+    A route is a list of (lat, lon).'''
+    def __init__(self, tolerance: float = DEFAULT_TOLERANCE):
+        self.tolerance = tolerance
+        # (name, simplified route)
+        self.routes = []
+
+    def __len__(self):
+        return len(self.routes)
+
+    def add(self, route: list, name=None) -> None:
+        if len(route) == 0:
+            raise Exception("Error: a route needs at least one point")
+        self.routes.append((name, simplify(route, self.tolerance)))
+
+    def save(self, file_name: str, output_format: str = "html") -> None:
+        '''Writes the routes to file_name as one of RENDER_FORMATS'''
+        if output_format not in RENDER_FORMATS:
+            raise Exception(f"Error: unknown format {output_format}")
+        if output_format == "html":
+            self.folium_map().save(file_name)
+            return
+
+        with open(file_name, "w") as file:
+            if output_format == "geojson":
+                json.dump(self.geojson(), file)
+            else:
+                # One encoded polyline per line
+                for _, route in self.routes:
+                    file.write(encode_polyline(route) + "\n")
+
+    def folium_map(self):
+        '''returns a folium Map with every route as a line and markers at its start and end only'''
+        if not self.routes:
+            raise Exception("Error: there are no routes to render")
+        first = self.routes[0][1][0]
+        folium_map = folium.Map(location=[first[0], first[1]], zoom_start=14)
+        for i, (name, route) in enumerate(self.routes):
+            color = ROUTE_COLORS[i % len(ROUTE_COLORS)]
+            folium.PolyLine(route, color=color, weight=2.5, opacity=1, tooltip=name).add_to(folium_map)
+            folium.Marker(route[0], tooltip="start", icon=folium.Icon(color="green")).add_to(folium_map)
+            folium.Marker(route[-1], tooltip="end", icon=folium.Icon(color="red")).add_to(folium_map)
+
+        # Show every route
+        lats = [lat for _, route in self.routes for lat, _ in route]
+        lons = [lon for _, route in self.routes for _, lon in route]
+        folium_map.fit_bounds([[min(lats), min(lons)], [max(lats), max(lons)]])
+        return folium_map
+
+    def geojson(self) -> dict:
+        '''returns the routes as a GeoJSON FeatureCollection of LineStrings'''
+        features = []
+        for name, route in self.routes:
+            features.append({"type": "Feature", "properties": {"name": name},
+                             "geometry": {"type": "LineString", "coordinates": [[lon, lat] for lat, lon in route]}})
+        return {"type": "FeatureCollection", "features": features}
+
+def make_map(routes: list, file_name: str = HTML_FILE, tolerance: float = DEFAULT_TOLERANCE) -> None:
+    '''Saves one HTML map of every route (lists of (lat, lon)) with simplified lines and start and end markers'''
+    renderer = RouteRenderer(tolerance)
+    for route in routes:
+        renderer.add(route)
+    renderer.save(file_name)
+    print("Done")
+
+def simplify(route: list, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    '''Douglas-Peucker simplification of a route of (lat, lon): keeps the fewest points so that no point
+    of the route is further than tolerance (in km) from the simplified line. The ends are always kept.'''
+    if len(route) < 3 or tolerance <= 0:
+        return [tuple(point) for point in route]
+
+    # Distances are measured on a plane around the route, fine over the size of a map
+    points = np.array(route, dtype=np.float64)
+    y = points[:, 0] * KM_PER_DEGREE
+    x = points[:, 1] * KM_PER_DEGREE * math.cos(math.radians(points[:, 0].mean()))
+
+    keep = np.zeros(len(route), dtype=bool)
+    keep[0] = keep[-1] = True
+    # Stack of (first, last) spans still to simplify
+    stack = [(0, len(route) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        px, py = x[first + 1:last] - x[first], y[first + 1:last] - y[first]
+        length = math.hypot(dx, dy)
+        if length == 0:
+            distances = np.hypot(px, py)
+        else:
+            # Distance to the segment, points past its ends are measured to the end
+            t = np.clip((px * dx + py * dy) / (length * length), 0.0, 1.0)
+            distances = np.hypot(px - t * dx, py - t * dy)
+        farthest = int(distances.argmax())
+        if distances[farthest] > tolerance:
+            middle = first + 1 + farthest
+            keep[middle] = True
+            stack.append((first, middle))
+            stack.append((middle, last))
+
+    return [tuple(route[i]) for i in np.flatnonzero(keep)]
+
+def encode_polyline(route: list, precision: int = 5) -> str:
+    '''returns the route of (lat, lon) in the encoded polyline format'''
+    factor = 10 ** precision
+    chunks = []
+    previous_lat, previous_lon = 0, 0
+    for lat, lon in route:
+        lat, lon = round(lat * factor), round(lon * factor)
+        for delta in (lat - previous_lat, lon - previous_lon):
+            # Sign in the lowest bit, then 5 bits at a time, lowest first
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        previous_lat, previous_lon = lat, lon
+    return "".join(chunks)
+
+def decode_polyline(encoded: str, precision: int = 5) -> list:
+    '''returns the (lat, lon) of an encoded polyline'''
+    factor = 10 ** precision
+    route = []
+    coordinates = [0, 0]
+    i = 0
+    while i < len(encoded):
+        for axis in (0, 1):
+            shift, value = 0, 0
+            while True:
+                byte = ord(encoded[i]) - 63
+                i += 1
+                value |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            coordinates[axis] += ~(value >> 1) if value & 1 else value >> 1
+        route.append((coordinates[0] / factor, coordinates[1] / factor))
+    return route
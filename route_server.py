@@ -0,0 +1,248 @@
+# route_server.py
+import argparse
+import asyncio
+import bisect
+import concurrent.futures
+import contextlib
+import json
+import math
+import multiprocessing
+import sys
+import time
+import urllib.parse
+import batch_route
+import search
+import search_geocoder
+from geo import Point
+
+# Upper bounds (in ms) of the latency histogram buckets, the last bucket has no bound
+LATENCY_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+# Nodes returned by a nearest request when it does not ask for an amount
+DEFAULT_NEAREST = 5
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                500: "Internal Server Error"}
+
+# Map the pool workers route on, set once per worker process
+_worker_map = None
+_worker_options = None
+
+
+class BadRequest(Exception):
+    '''A request that cannot be answered because of the request itself, answered with 400'''
+
+class LatencyHistogram:
+    '''Counts of request latencies in the buckets of LATENCY_BUCKETS'''
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def __len__(self):
+        return sum(self.counts)
+
+    def record(self, milliseconds: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, milliseconds)] += 1
+        self.total += milliseconds
+        self.max = max(self.max, milliseconds)
+
+    def to_dict(self) -> dict:
+        '''returns the histogram as {"count", "mean_ms", "max_ms", "buckets": {"<=1": n, ..., ">5000": n}}'''
+        labels = [f"<={bound}" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}"]
+        count = len(self)
+        return {"count": count, "mean_ms": self.total / count if count else 0.0, "max_ms": self.max,
+                "buckets": dict(zip(labels, self.counts))}
+
+class RouteServer:
+    '''Serves route, nearest node and distance matrix requests on a map loaded once, over HTTP/JSON:
+        POST /route   {"start": ..., "goal": ...}                       -> like a batch_route.py result
+        GET  /nearest ?lat=..&lon=..&k=..                               -> {"nodes": [{"id", "lat", "lon", "distance"}]}
+        POST /matrix  {"origins": [...], "destinations": [...], "paths": false} -> {"matrix": ..., "paths": ...}
+        GET  /stats                                                     -> latency histograms of every endpoint
+    Nodes are given as OSM ids, [lat, lon] or addresses of the map. Searches run on a pool of processes
+    so the event loop keeps answering other requests meanwhile.
+    '''
+    def __init__(self, map_problem, mode: str, heuristic: str, processes: int = 1):
+        self.map_problem = map_problem
+        self.mode = mode
+        self.heuristic = heuristic
+        # Build the node index now instead of in the first request
+        if map_problem.node_index is None:
+            map_problem.node_index = search.NodeIndex(map_problem.node_dict, map_problem.way_dict)
+
+        # Forked workers inherit the loaded map, otherwise each worker gets a pickled copy once
+        context = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+        self.executor = concurrent.futures.ProcessPoolExecutor(processes, mp_context=context, initializer=_init_worker,
+                                                               initargs=(map_problem, mode, heuristic))
+        self.histograms = {"/route": LatencyHistogram(), "/nearest": LatencyHistogram(),
+                           "/matrix": LatencyHistogram(), "/stats": LatencyHistogram()}
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8000):
+        '''Starts listening, returns the asyncio Server'''
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
+
+    async def handle_connection(self, reader, writer) -> None:
+        '''Answers the requests of one connection, kept open between requests unless the client closes it'''
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = dict()
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                # Without a valid length the body cannot be skipped, so the connection is closed after answering
+                content_length = headers.get("content-length", "0")
+                body = await reader.readexactly(int(content_length)) if content_length.isascii() and content_length.isdigit() else None
+
+                start_time = time.perf_counter()
+                parts = request_line.decode("latin-1").split()
+                path = urllib.parse.urlsplit(parts[1]).path if len(parts) == 3 else None
+                try:
+                    if body is None:
+                        raise BadRequest("Error: malformed content-length")
+                    if path is None:
+                        raise BadRequest("Error: malformed request line")
+                    status, payload = await self.dispatch(parts[0], parts[1], body)
+                except Exception as e:
+                    status, payload = (400 if is_client_error(e) else 500), {"error": str(e)}
+                if path in self.histograms:
+                    self.histograms[path].record((time.perf_counter() - start_time) * 1000)
+
+                data = json.dumps(payload).encode()
+                keep_alive = body is not None and headers.get("connection", "").lower() != "close"
+                writer.write(f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> tuple:
+        '''Answers one request, returns (HTTP status, JSON payload)'''
+        url = urllib.parse.urlsplit(target)
+        if url.path not in self.histograms:
+            return 404, {"error": f"Error: unknown path {url.path}"}
+        if url.path == "/stats":
+            return 200, self.stats()
+        if url.path == "/nearest":
+            query = {key: values[0] for key, values in urllib.parse.parse_qs(url.query).items()}
+            if method == "POST":
+                query = parse_body(body)
+            if "lat" not in query or "lon" not in query:
+                raise BadRequest("Error: a nearest request needs a lat and a lon")
+            k = parse_number(int, query.get("k", DEFAULT_NEAREST), "k")
+            if k < 1:
+                raise BadRequest("Error: k must be at least 1")
+            return 200, self.nearest(Point(parse_number(float, query["lat"], "lat"), 
+                                           parse_number(float, query["lon"], "lon")), k)
+
+        if method != "POST":
+            return 405, {"error": f"Error: {url.path} takes POST requests"}
+        query = parse_body(body)
+        loop = asyncio.get_running_loop()
+        if url.path == "/route":
+            if "start" not in query or "goal" not in query:
+                raise BadRequest("Error: a query needs a start and a goal")
+            return await loop.run_in_executor(self.executor, _worker_route, query)
+
+        if "origins" not in query or "destinations" not in query:
+            raise BadRequest("Error: a matrix request needs origins and destinations")
+        return await loop.run_in_executor(self.executor, _worker_matrix, query["origins"], query["destinations"],
+                                          bool(query.get("paths", False)))
+
+    def nearest(self, point: Point, k: int) -> dict:
+        '''returns the k routable nodes closest to the point, within the distance nodes are snapped over'''
+        found = sorted(self.map_problem.node_index.within(point, search.MAX_DISTANCE_BETWEEN_NODES), key=lambda x: x[1])
+        return {"nodes": [{"id": node.id, "lat": node.coordinate.lat, "lon": node.coordinate.lon, "distance": distance}
+                          for node, distance in found[:k]]}
+
+    def stats(self) -> dict:
+        return {path: histogram.to_dict() for path, histogram in self.histograms.items()}
+
+def parse_body(body: bytes) -> dict:
+    '''returns the JSON object of a request body'''
+    try:
+        query = json.loads(body)
+    except ValueError:
+        raise BadRequest("Error: the request body is not valid JSON")
+    if type(query) is not dict:
+        raise BadRequest("Error: the request body must be a JSON object")
+    return query
+
+def parse_number(kind, value, name: str):
+    '''returns the value of a request parameter as an int or float'''
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        raise BadRequest(f"Error: {name} must be a number")
+
+def is_client_error(e: Exception) -> bool:
+    '''Whether an error comes from the request (bad input, unknown nodes or addresses) rather than the server'''
+    return isinstance(e, (BadRequest, search.NodeNotFound, search_geocoder.AddressNotFound))
+
+def _init_worker(map_problem, mode: str, heuristic: str) -> None:
+    global _worker_map, _worker_options
+    _worker_map, _worker_options = map_problem, (mode, heuristic)
+
+# The workers return (HTTP status, JSON payload) for errors of the request, other errors are raised
+#   into the event loop and answered with 500
+
+def _worker_route(query: dict) -> tuple:
+    # The search prints progress, keep it out of the server's output
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            return 200, batch_route.answer_query(_worker_map, query, *_worker_options)
+        except Exception as e:
+            if not is_client_error(e):
+                raise
+            return 400, {"id": query.get("id"), "error": str(e)}
+
+def _worker_matrix(origins: list, destinations: list, with_paths: bool) -> tuple:
+    start_time = time.perf_counter()
+    try:
+        matrix, paths = _worker_map.distance_matrix(origins, destinations, with_paths)
+    except Exception as e:
+        if not is_client_error(e):
+            raise
+        return 400, {"error": str(e)}
+    # JSON has no infinity, unreachable destinations are null
+    matrix = [[None if d == math.inf else d for d in row] for row in matrix]
+    return 200, {"matrix": matrix, "paths": paths, "stats": {"seconds": time.perf_counter() - start_time}}
+
+async def serve(map_file: str, host: str, port: int, processes: int) -> None:
+    map_problem, mode, heuristic = batch_route.load_routing_map(map_file)
+    server = RouteServer(map_problem, mode, heuristic, processes)
+    listener = await server.start(host, port)
+    print(f"Serving {map_file} on http://{host}:{port}")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serves routes on one map over a local HTTP/JSON API")
+    parser.add_argument("map_file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("-p", "--processes", type=int, default=1, help="worker processes, 0 uses every core")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.map_file, args.host, args.port, args.processes or None))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,358 @@
+# routing_graph.py
+import bisect
+import heapq
+import math
+from array import array
+import numpy as np
+from geo import Point, haversine_pairwise
+
+HIGHWAY_VALUES = ["motorway", "trunk", "primary", "secondary", "tertiary", "unclassified", "residential",
+                  "motorway_link", "trunk_link", "primary_link", "secondary_link", "tertiary_link",
+                  "living_street", "service", "road"]
+
+# Highway classes are stored per edge as their position in HIGHWAY_VALUES
+HIGHWAY_CLASS = {value: i for i, value in enumerate(HIGHWAY_VALUES)}
+
+# Added before the extension of files built for the simplified graph of a map, so they do not replace the full graph's
+SIMPLIFIED_SUFFIX = ".simplified"
+
+
+class RoutingGraph:
+    '''Compressed sparse row (CSR) adjacency graph over dense integer node indices.
+
+    The neighbors of node i are targets[offsets[i]:offsets[i + 1]], with the length (in km), highway class
+    and maxspeed (in km/h, 0 if the way has none) of each edge stored at the same position in lengths,
+    highway_classes and maxspeeds.
+    The arrays can be any sequence supporting len, indexing and slicing (array, memoryview).
+    '''
+    def __init__(self, ids, lats, lons, offsets, targets, lengths, highway_classes=None, maxspeeds=None):
+        if len(offsets) != len(ids) + 1:
+            raise Exception("Error: offsets must have one more entry than ids")
+        if len(targets) != len(lengths):
+            raise Exception("Error: targets and lengths are not the same size")
+        if highway_classes is None:
+            highway_classes = array('B', bytes(len(targets)))
+        if len(highway_classes) != len(targets):
+            raise Exception("Error: targets and highway_classes are not the same size")
+        if maxspeeds is None:
+            maxspeeds = array('f', bytes(4 * len(targets)))
+        if len(maxspeeds) != len(targets):
+            raise Exception("Error: targets and maxspeeds are not the same size")
+
+        self.ids = ids
+        self.lats = lats
+        self.lons = lons
+        self.offsets = offsets
+        self.targets = targets
+        self.lengths = lengths
+        self.highway_classes = highway_classes
+        self.maxspeeds = maxspeeds
+        # OSM id -> dense index
+        self.index = {osm_id: i for i, osm_id in enumerate(ids)}
+        # Cost model name -> cost of every edge, and the factor that scales its heuristics, filled in by cost_model
+        self.weights = dict()
+        self.heuristic_scales = dict()
+        # Connected component of every node, filled in by connected_components (or from the map cache)
+        self.components = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getstate__(self):
+        '''Pickles mmapped (memoryview) arrays as array copies, the index and cost model data are rebuilt when unpickled'''
+        state = dict()
+        for name, value in self.__dict__.items():
+            if name in ("index", "weights", "heuristic_scales"):
+                continue
+            state[name] = array(value.format, value) if type(value) is memoryview else value
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.index = {osm_id: i for i, osm_id in enumerate(self.ids)}
+        self.weights = dict()
+        self.heuristic_scales = dict()
+
+    def edge_count(self) -> int:
+        '''returns the number of directed edges in the graph'''
+        return len(self.targets)
+
+    def coordinate(self, i: int) -> Point:
+        '''returns the coordinate of the node at index i'''
+        return Point(self.lats[i], self.lons[i])
+
+    def neighbors(self, i: int):
+        '''returns (target index, edge length) pairs of the node at index i'''
+        start = self.offsets[i]
+        end = self.offsets[i + 1]
+        return zip(self.targets[start:end], self.lengths[start:end])
+
+    def weighted_neighbors(self, i: int, weights):
+        '''returns (target index, edge weight) pairs of the node at index i, weights as given by a cost model'''
+        start = self.offsets[i]
+        end = self.offsets[i + 1]
+        return zip(self.targets[start:end], weights[start:end])
+
+class SimplifiedGraph(RoutingGraph):
+    '''A RoutingGraph where chains of degree-2 nodes were contracted into single edges (see simplify_graph).
+
+    The nodes inside the chain of edge e (OSM ids, from its source to its target) are
+    via_nodes[via_offsets[e]:via_offsets[e + 1]], with their distance (in km) from the source of the edge
+    at the same positions in via_lengths.
+    '''
+    def __init__(self, ids, lats, lons, offsets, targets, lengths, highway_classes, maxspeeds,
+                 via_offsets, via_nodes, via_lengths):
+        super().__init__(ids, lats, lons, offsets, targets, lengths, highway_classes, maxspeeds)
+        if len(via_offsets) != len(targets) + 1:
+            raise Exception("Error: via_offsets must have one more entry than targets")
+        self.via_offsets = via_offsets
+        self.via_nodes = via_nodes
+        self.via_lengths = via_lengths
+        self.interior = self.interior_index()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        del state["interior"]
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.interior = self.interior_index()
+
+    def interior_index(self) -> dict:
+        '''returns OSM id -> (edge, position in via_nodes) of every contracted node, on the edge from the lower index'''
+        interior = dict()
+        for i in range(len(self.ids)):
+            for e in range(self.offsets[i], self.offsets[i + 1]):
+                if i < self.targets[e]:
+                    for k in range(self.via_offsets[e], self.via_offsets[e + 1]):
+                        interior[self.via_nodes[k]] = (e, k)
+        return interior
+
+    def source(self, e: int) -> int:
+        '''returns the index of the node edge e leaves from'''
+        return bisect.bisect_right(self.offsets, e) - 1
+
+    def edge(self, i: int, j: int) -> int:
+        '''returns the edge from index i to index j, simplification leaves at most one'''
+        for e in range(self.offsets[i], self.offsets[i + 1]):
+            if self.targets[e] == j:
+                return e
+        raise Exception(f"Error: there is no edge from {i} to {j}")
+
+    def via(self, e: int) -> list:
+        '''returns the OSM ids of the nodes inside edge e, from its source to its target'''
+        return list(self.via_nodes[self.via_offsets[e]:self.via_offsets[e + 1]])
+
+def compile_graph(node_dict: dict, way_dict: dict) -> RoutingGraph:
+    '''Compiles the node_dict and way_dict into a RoutingGraph.
+    Only ways with a highway value are traversable, and nodes missing from the node_dict are skipped.'''
+    ids = array('q', node_dict.keys())
+    lats = array('d', (node.coordinate.lat for node in node_dict.values()))
+    lons = array('d', (node.coordinate.lon for node in node_dict.values()))
+    index = {osm_id: i for i, osm_id in enumerate(ids)}
+
+    # Collect each node's neighbors, a dict per node removes edges shared by several ways
+    adjacency = [None] * len(ids)
+    for way in way_dict.values():
+        if way.highway_value is None:
+            continue
+
+        # Connect each pair of consecutive nodes in the way in both directions
+        for a, b in zip(way.nodes, way.nodes[1:]):
+            if a == b or a not in index or b not in index:
+                continue
+
+            i = index[a]
+            j = index[b]
+            for u, v in ((i, j), (j, i)):
+                if adjacency[u] is None:
+                    adjacency[u] = dict()
+                adjacency[u][v] = (HIGHWAY_CLASS[way.highway_value], way.maxspeed or 0.0)
+
+    # Flatten the adjacency into the CSR arrays
+    offsets = array('q', [0])
+    sources = array('q')
+    targets = array('q')
+    highway_classes = array('B')
+    maxspeeds = array('f')
+    for i, neighbors in enumerate(adjacency):
+        if neighbors is not None:
+            sources.extend([i] * len(neighbors))
+            targets.extend(neighbors.keys())
+            for highway_class, maxspeed in neighbors.values():
+                highway_classes.append(highway_class)
+                maxspeeds.append(maxspeed)
+        offsets.append(len(targets))
+
+    # Compute every edge length at once, always from the lower to the higher index
+    #   so both directions of an edge get exactly the same length
+    np_lats = np.frombuffer(lats, dtype=np.float64)
+    np_lons = np.frombuffer(lons, dtype=np.float64)
+    np_sources = np.frombuffer(sources, dtype=np.int64)
+    np_targets = np.frombuffer(targets, dtype=np.int64)
+    low = np.minimum(np_sources, np_targets)
+    high = np.maximum(np_sources, np_targets)
+    lengths = array('d', haversine_pairwise(np_lats[low], np_lons[low], np_lats[high], np_lons[high]).tobytes())
+
+    return RoutingGraph(ids, lats, lons, offsets, targets, lengths, highway_classes, maxspeeds)
+
+def simplify_graph(graph: RoutingGraph) -> SimplifiedGraph:
+    '''Returns the graph without the nodes that are on no edge, with every chain of degree-2 nodes contracted
+    into one edge that remembers the nodes inside it.
+
+    Only nodes whose two edges have the same highway class and maxspeed are contracted, so every cost model
+    weights a contracted edge as the sum of its chain. A chain is not contracted into an edge that would
+    duplicate another one between the same nodes (or loop back to its start), its middle node is kept instead.'''
+    offsets, targets = graph.offsets, graph.targets
+
+    def contractible(i: int) -> bool:
+        if offsets[i + 1] - offsets[i] != 2:
+            return False
+        a, b = offsets[i], offsets[i] + 1
+        return (graph.highway_classes[a] == graph.highway_classes[b] and graph.maxspeeds[a] == graph.maxspeeds[b])
+
+    keep = [offsets[i + 1] > offsets[i] and not contractible(i) for i in range(len(graph))]
+
+    def walk(u: int, e: int) -> tuple:
+        '''follows edge e of u through contracted nodes, returns (end, [(via index, length so far)], lengths)'''
+        previous, current = u, targets[e]
+        chain_lengths = [graph.lengths[e]]
+        via = []
+        while not keep[current]:
+            via.append((current, math.fsum(chain_lengths)))
+            first = offsets[current]
+            nxt = first if targets[first] != previous else first + 1
+            chain_lengths.append(graph.lengths[nxt])
+            previous, current = current, targets[nxt]
+        return current, via, chain_lengths
+
+    while True:
+        chains = []
+        visited = [False] * len(graph)
+        for u in range(len(graph)):
+            if keep[u]:
+                for e in range(offsets[u], offsets[u + 1]):
+                    end, via, chain_lengths = walk(u, e)
+                    chains.append((u, e, end, via, chain_lengths))
+                    for i, _ in via:
+                        visited[i] = True
+
+        # Rings of contracted nodes with no kept node on them keep one of their nodes
+        ring = next((i for i in range(len(graph)) if offsets[i + 1] > offsets[i] and not keep[i] and not visited[i]), None)
+        if ring is not None:
+            keep[ring] = True
+            continue
+
+        # Keep the middle node of chains that would loop or duplicate an edge, and start over
+        pairs = dict()
+        for u, _, end, via, _ in chains:
+            pairs[(u, end)] = pairs.get((u, end), 0) + 1
+        conflicts = [via for u, _, end, via, _ in chains if via and (u == end or pairs[(u, end)] > 1)]
+        if not conflicts:
+            break
+        for via in conflicts:
+            keep[via[len(via) // 2][0]] = True
+
+    new_index = dict()
+    for i in range(len(graph)):
+        if keep[i]:
+            new_index[i] = len(new_index)
+    kept = list(new_index)
+
+    new_offsets = array('q', [0])
+    new_targets = array('q')
+    new_lengths = array('d')
+    highway_classes = array('B')
+    maxspeeds = array('f')
+    via_offsets = array('q', [0])
+    via_nodes = array('q')
+    via_lengths = array('d')
+    chains_of = dict()
+    for chain in chains:
+        chains_of.setdefault(chain[0], []).append(chain)
+    for u in kept:
+        for _, e, end, via, chain_lengths in chains_of.get(u, []):
+            new_targets.append(new_index[end])
+            # fsum is exact, so both directions of a chain get the same length
+            new_lengths.append(math.fsum(chain_lengths))
+            highway_classes.append(graph.highway_classes[e])
+            maxspeeds.append(graph.maxspeeds[e])
+            via_nodes.extend(graph.ids[i] for i, _ in via)
+            via_lengths.extend(length for _, length in via)
+            via_offsets.append(len(via_nodes))
+        new_offsets.append(len(new_targets))
+
+    return SimplifiedGraph(array('q', (graph.ids[i] for i in kept)), array('d', (graph.lats[i] for i in kept)),
+                           array('d', (graph.lons[i] for i in kept)), new_offsets, new_targets, new_lengths,
+                           highway_classes, maxspeeds, via_offsets, via_nodes, via_lengths)
+
+def dijkstra(graph: RoutingGraph, sources, targets=None, weights=None) -> tuple:
+    '''One-to-all Dijkstra from one or more source indices, or one-to-many if target indices are given,
+    in which case it stops once every target is settled. The sources can also be a dict of index -> distance
+    the source starts at.
+    Edges cost their length, or their weight of a cost model if weights are given.
+    Returns (distances, parents) lists over every node, unreachable nodes have math.inf and None.'''
+    distances = [math.inf] * len(graph)
+    parents = [None] * len(graph)
+    heap = []
+    if type(sources) is not dict:
+        sources = dict.fromkeys(sources, 0.0)
+    for source, distance in sources.items():
+        distances[source] = min(distances[source], distance)
+        heap.append((distances[source], source))
+    heapq.heapify(heap)
+    remaining = set(targets) if targets is not None else None
+
+    while heap:
+        distance, u = heapq.heappop(heap)
+        # Skip entries that were replaced by a shorter distance
+        if distance > distances[u]:
+            continue
+        if remaining is not None:
+            remaining.discard(u)
+            if not remaining:
+                break
+        edges = graph.neighbors(u) if weights is None else graph.weighted_neighbors(u, weights)
+        for v, length in edges:
+            new_distance = distance + length
+            if new_distance < distances[v]:
+                distances[v] = new_distance
+                parents[v] = u
+                heapq.heappush(heap, (new_distance, v))
+    return distances, parents
+
+def connected_components(graph: RoutingGraph) -> array:
+    '''Labels every node with its connected component, numbered by decreasing size so 0 is the largest.
+    Edges are stored in both directions, so two nodes have a route between them iff they have the same label.
+    The labels are kept in graph.components, later calls return them.'''
+    if graph.components is not None:
+        return graph.components
+    labels = array('i', [-1]) * len(graph)
+    offsets, targets = graph.offsets, graph.targets
+    sizes = []
+    for root in range(len(graph)):
+        if labels[root] != -1:
+            continue
+        label = len(sizes)
+        labels[root] = label
+        stack = [root]
+        size = 0
+        while stack:
+            u = stack.pop()
+            size += 1
+            for v in targets[offsets[u]:offsets[u + 1]]:
+                if labels[v] == -1:
+                    labels[v] = label
+                    stack.append(v)
+        sizes.append(size)
+
+    # Renumber by decreasing size, ties keep the order they were found in
+    order = sorted(range(len(sizes)), key=lambda label: -sizes[label])
+    renumber = array('i', [0]) * len(sizes)
+    for new_label, label in enumerate(order):
+        renumber[label] = new_label
+    for i in range(len(labels)):
+        labels[i] = renumber[labels[i]]
+    graph.components = labels
+    return labels
@@ -6,29 +6,74 @@ import urllib.parse
 import json
 import search_geocoder
 import math
-from collections import namedtuple
-from collections import deque
-import folium_test
+import heapq
+import route_render
+import osm_loader
+import pbf_loader
+import map_cache
+import contraction_hierarchy
+import landmarks
+import address_index
+import distance_matrix
+import tiled_graph
+from array import array
+from collections.abc import Mapping
+from geo import Point, haversine
+from routing_graph import HIGHWAY_VALUES, SimplifiedGraph, compile_graph, connected_components, simplify_graph
+from spatial_index import GridIndex
+from search_stats import SearchStats
+from cost_model import COST_MODELS, get_cost_model, parse_maxspeed
+from landmarks import bound_between
+from address_index import AddressIndex, address_from_tags, address_index_from_map_dict, way_center
 
 # Overpass API is not used since it may exceed limit. 
 #   Instead, map data is downloaded from OSM
 
-HIGHWAY_VALUES = ["motorway", "trunk", "primary", "secondary", "tertiary", "unclassified", "residential",
-                  "motorway_link", "trunk_link", "primary_link", "secondary_link", "tertiary_link",
-                  "living_street", "service", "road"]
-
 AMOUNT_OF_CLOSEST_NODES = 5
 
 # (In km)
 MAX_DISTANCE_BETWEEN_NODES = 0.13
 
-Point = namedtuple('Point', ['lat', 'lon'])
+# Modes Map.search can solve a route with. bidirectional finds the same routes as astar, and expands fewer nodes
+#   when the heuristic is loose, as for the time cost model
+SEARCH_MODES = ["astar", "bidirectional", "ch"]
+
+# Heuristics the astar and bidirectional modes can use
+HEURISTICS = ["haversine", "landmarks"]
+
+# Optional flags of search.py after the map file
+MAIN_FLAGS = ["--remote-geocoder", "--stats", "--fastest"]
+
+# Map files read as OSM elements (xml and PBF) rather than json
+OSM_EXTENSIONS = (".osm", ".pbf")
+
+class NodeNotFound(Exception):
+    '''A route end that is bad input: an unknown node id, coordinates off the map or with no routable node near,
+    or a value that is not a node at all'''
 
 class OSMNode:
+    # Maps have millions of nodes, slots and the compact way storage below keep each one small
+    __slots__ = ("id", "lat", "lon", "_ways")
+    
     def __init__(self, osm_id: int, lat: float, lon: float):
         self.id = osm_id
-        self.coordinate = Point(lat, lon)
-        self.ways = set()
+        self.lat = lat
+        self.lon = lon
+        # Way ids of the node: None for no way, the id itself for a single way (most nodes), else a tuple
+        self._ways = None
+        
+    @property
+    def coordinate(self) -> Point:
+        return Point(self.lat, self.lon)
+    
+    @property
+    def ways(self) -> set:
+        '''The set of ids of the ways the node belongs to. It is a copy, use add_way to add a way.'''
+        if self._ways is None:
+            return set()
+        if type(self._ways) is tuple:
+            return set(self._ways)
+        return {self._ways}
         
     def __eq__(self, other):
         '''Memberwise equality'''
@@ -41,13 +86,23 @@ class OSMNode:
     
     def add_way(self, way: int):
         '''Adds the way id to the set of the node's ways it belongs to'''
-        self.ways.add(way)
+        if self._ways is None or self._ways == way:
+            self._ways = way
+        elif type(self._ways) is tuple:
+            if way not in self._ways:
+                self._ways += (way,)
+        else:
+            self._ways = (self._ways, way)
              
 class Way:
+    __slots__ = ("id", "nodes", "highway_value", "maxspeed")
+    
     def __init__(self, osm_id: int):
         self.id = osm_id
         self.nodes = []
         self.highway_value = None
+        # In km/h, None if the way has no maxspeed tag
+        self.maxspeed = None
     
     def add_node(self, node: int):
         self.nodes.append(node)
@@ -69,177 +124,789 @@ class BoundingBox:
         '''returns true if the coordinates given is inside the bbox, false otherwise.'''
         return self.minlat <= point.lat and self.minlon <= point.lon and self.maxlat >= point.lat and self.maxlon >= point.lon
 
-class AstarNode():
-    def __init__(self, OSM_node: OSMNode, gcost: float, hcost:float, parent: 'Astar_Node or None'):
-        # gcost (cost to reach node)
-        # hcost (estimated cost to goal)
-        self.OSM_node = OSM_node
-        self.gcost = gcost
-        self.hcost = hcost
-        self.pathcost = gcost + hcost
-        self.parent = parent
-
 class Frontier():
-    def __init__(self, initial_node: AstarNode):
-        self.deque = deque([initial_node])
+    def __init__(self, h):
+        '''Binary heap frontier of a search over graph indices, ordered by pathcost (gcost plus h, the heuristic of a node).
+        Decrease-key is lazy: a node reached again for less gets a new entry, and the entries it replaces are skipped
+        once the node is explored. gcosts and parents keep the best cost and parent found for every node reached.'''
+        self.h = h
+        # Binary heap of (pathcost, count, index) entries, the count breaks ties in insertion order
+        self.heap = []
+        self.gcosts = dict()
+        self.parents = dict()
+        self.explored = set()
+        self.counter = 0
+        # Nodes reached but not explored
+        self.size = 0
+        # For SearchStats: most nodes in the frontier at once, entries popped, decrease-keys, replaced entries
+        #   popped, and nodes not added since they were explored or already reached for no more
+        self.peak_size = 0
+        self.popped = 0
+        self.replace_count = 0
+        self.stale_count = 0
+        self.duplicate_count = 0
+        
+    def __len__(self):
+        return self.size
         
     def is_empty(self):
         '''returns if frontier is empty'''
-        return not bool(len(self.deque))
+        return self.size == 0
+    
+    def add(self, i: int, gcost: float, parent) -> bool:
+        '''adds node i reached for gcost from parent (None for a start), or lowers its gcost if it was reached for more.
+        Returns False if it was not added since it was explored or already reached for no more.'''
+        if i in self.explored or gcost >= self.gcosts.get(i, math.inf):
+            self.duplicate_count += 1
+            return False
+        if i in self.gcosts:
+            self.replace_count += 1
+        else:
+            self.size += 1
+            if self.size > self.peak_size:
+                self.peak_size = self.size
+        self.gcosts[i] = gcost
+        self.parents[i] = parent
+        heapq.heappush(self.heap, (gcost + self.h(i), self.counter, i))
+        self.counter += 1
+        return True
+    
+    def remove(self) -> tuple:
+        '''removes the least pathcost node that is not explored yet, returns (pathcost, index)'''
+        # Skip over entries of nodes that were explored through a cheaper entry (lazy deletion)
+        while self.heap:
+            pathcost, _, i = heapq.heappop(self.heap)
+            self.popped += 1
+            if i in self.explored:
+                self.stale_count += 1
+                continue
+            return pathcost, i
+        raise IndexError("remove from an empty frontier")
     
-    def remove(self):
-        '''removes and returns left most (least pathcost) node in frontier'''
-        return self.deque.popleft()
+    def min_pathcost(self, removed: int = None) -> float:
+        '''returns the least pathcost in the frontier without removing it, math.inf if it is empty.
+        Entries of the node just removed are not counted.'''
+        # Drop entries of explored nodes (and of the removed one) from the top of the heap
+        while self.heap and (self.heap[0][2] in self.explored or self.heap[0][2] == removed):
+            heapq.heappop(self.heap)
+            self.popped += 1
+            self.stale_count += 1
+        if not self.heap:
+            return math.inf
+        return self.heap[0][0]
+    
+    def close(self, i: int) -> None:
+        '''marks node i explored, it is never added again'''
+        self.explored.add(i)
+        self.size -= 1
 
-    def add(self, anode):
-        '''adds an anode given its pathcost'''
+class NodeIndex():
+    def __init__(self, node_dict, way_dict):
+        '''Spatial index over the routable nodes (nodes on a way with a highway value) of a map'''
+        # Kept in node_dict order so lookups visit nodes in the same order as a full scan
+        self.nodes = [node for node in node_dict.values() 
+                      if any(way_dict[w_id].highway_value is not None for w_id in node.ways)]
+        self.grid = GridIndex([node.coordinate for node in self.nodes], MAX_DISTANCE_BETWEEN_NODES)
         
-        # search for its position, add the anode at that position
-        low = 0
-        high = len(self.deque) - 1
-        mid = 0
+    def __len__(self):
+        return len(self.nodes)
         
-        while low <= high:
-            mid = (low + high) // 2
-            if anode.pathcost == self.deque[mid].pathcost:
-                self.deque.insert(mid, anode)
-                break
-            
-            if anode.pathcost > self.deque[mid].pathcost:
-                low = mid + 1
-            
-            if anode.pathcost < self.deque[mid].pathcost:
-                high = mid - 1
-                
-        if low > high:
-            self.deque.insert(low, anode)
+    def within(self, point: Point, radius: float) -> list:
+        '''returns (node, distance) of the routable nodes at most radius (in km) away from the point'''
+        return [(self.nodes[i], distance) for i, distance in self.grid.within(point, radius)]
+
+class CachedNodeDict(Mapping):
+    def __init__(self, cache):
+        '''node_dict of a map opened from its map_cache.MapCache. OSMNodes are made from the cached arrays
+        when they are looked up, instead of all of them when the map is opened.'''
+        self.cache = cache
+        
+    def __getitem__(self, osm_id) -> OSMNode:
+        cache = self.cache
+        i = cache.graph.index[osm_id]
+        node = OSMNode(osm_id, cache.graph.lats[i], cache.graph.lons[i])
+        for w in cache.node_ways[cache.node_way_offsets[i]:cache.node_way_offsets[i + 1]]:
+            node.add_way(cache.way_ids[w])
+        return node
+    
+    def __contains__(self, osm_id) -> bool:
+        return osm_id in self.cache.graph.index
+    
+    def __iter__(self):
+        return iter(self.cache.graph.ids)
+    
+    def __len__(self):
+        return len(self.cache.graph)
+
+class CachedWayDict(Mapping):
+    def __init__(self, cache):
+        '''way_dict of a map opened from its map_cache.MapCache, Ways are made when they are looked up'''
+        self.cache = cache
+        # Way id -> position in the cached way arrays, built the first time a way is looked up
+        self.positions = None
+        
+    def __getitem__(self, osm_id) -> Way:
+        if self.positions is None:
+            self.positions = {way_id: i for i, way_id in enumerate(self.cache.way_ids)}
+        i = self.positions[osm_id]
+        cache = self.cache
+        way = Way(osm_id)
+        way.nodes = cache.way_nodes[cache.way_offsets[i]:cache.way_offsets[i + 1]].tolist()
+        highway_class = cache.way_highway_classes[i]
+        if highway_class != map_cache.NO_HIGHWAY_CLASS:
+            way.highway_value = HIGHWAY_VALUES[highway_class]
+        if cache.way_maxspeeds[i] > 0:
+            way.maxspeed = cache.way_maxspeeds[i]
+        return way
+    
+    def __iter__(self):
+        return iter(self.cache.way_ids)
+    
+    def __len__(self):
+        return len(self.cache.way_ids)
+
+class TiledNodeDict(Mapping):
+    def __init__(self, graph):
+        '''node_dict of a map opened from its tiles (see load_tiled_map). OSMNodes are made from the tile of the node
+        when they are looked up, loading it if it is not'''
+        self.graph = graph
+        
+    def __getitem__(self, osm_id) -> OSMNode:
+        tile, j = self.graph.locate(self.graph.index[osm_id])
+        node = OSMNode(osm_id, tile.lats[j], tile.lons[j])
+        for way_id in tile.node_ways[tile.node_way_offsets[j]:tile.node_way_offsets[j + 1]]:
+            node.add_way(way_id)
+        return node
+    
+    def __contains__(self, osm_id) -> bool:
+        return osm_id in self.graph.index
+    
+    def __iter__(self):
+        return iter(self.graph.ids)
+    
+    def __len__(self):
+        return len(self.graph)
+
+class TiledWayDict(Mapping):
+    def __init__(self, graph):
+        '''way_dict of a map opened from its tiles. The tiles only keep the highway value and maxspeed of a way,
+        so the nodes of its Ways are empty'''
+        self.graph = graph
+        self.positions = tiled_graph.SortedIndex(graph.way_ids)
+        
+    def __getitem__(self, osm_id) -> Way:
+        i = self.positions[osm_id]
+        way = Way(osm_id)
+        way.highway_value = HIGHWAY_VALUES[self.graph.way_highway_classes[i]]
+        if self.graph.way_maxspeeds[i] > 0:
+            way.maxspeed = self.graph.way_maxspeeds[i]
+        return way
+    
+    def __iter__(self):
+        return iter(self.graph.way_ids)
+    
+    def __len__(self):
+        return len(self.graph.way_ids)
+
+class TiledNodeIndex():
+    def __init__(self, node_dict, graph):
+        '''NodeIndex of a map opened from its tiles, only the tiles around the point are loaded'''
+        self.node_dict = node_dict
+        self.graph = graph
+        
+    def __len__(self):
+        return len(self.graph)
+        
+    def within(self, point: Point, radius: float) -> list:
+        '''returns (node, distance) of the routable nodes at most radius (in km) away from the point, in OSM id order'''
+        return [(self.node_dict[osm_id], distance) for osm_id, distance in self.graph.within(point, radius)]
 
 class Map():
-    def __init__(self, node_dict, way_dict, bbox):
+    def __init__(self, node_dict, way_dict, bbox, graph=None, hierarchy=None, landmarks=None):
         self.node_dict = node_dict
         self.way_dict = way_dict
         self.bbox = bbox
-        self.osm_goal = None
-        
-    def neighbors(self, anode):
-        '''Returns a list of anodes to be added to the frontier'''
-        node = anode.OSM_node
-        ways = node.ways
-        neighbor_results = []
-        neighbor_ids = []
-        # Append the actual traveled distance between the start node and its neighbors
-        for way_id in ways:
-            way = self.way_dict[way_id]
-            nodes_in_way = len(way.nodes)
-            
-            # If the highway value is None, move on to next way
-            if way.highway_value == None:
-                continue
+        # One of HEURISTICS, the heuristic of the current search
+        self.heuristic = "haversine"
+        # Number of nodes expanded by the last search
+        self.expanded_count = 0
+        # Cost of the path found by the last search, with the offsets of its start and goal
+        self.path_cost = math.inf
+        # The search runs on the compiled adjacency graph (or a tiled_graph.TiledGraph), compile it if none is given
+        if graph is None:
+            graph = compile_graph(node_dict, way_dict)
+        self.graph = graph
+        # Connected component of every graph node (0 is the largest), routes only exist within one
+        self.components = connected_components(graph)
+        # Contraction hierarchy of the graph for the "ch" search mode, built offline by preprocess.py
+        self.hierarchy = hierarchy
+        # Landmark distances for the "landmarks" heuristic, built offline by preprocess.py
+        self.landmarks = landmarks
+        # NodeIndex for snapping coordinates, built the first time it is needed
+        self.node_index = None
+        # address_index.AddressIndex of the map for resolving addresses offline
+        self.address_index = None
+        # One of COST_MODELS, the edge cost the routes minimize, part of the key of cached routes
+        self.cost_model = "distance"
+        # Cost of every graph edge under the cost model of the current search, see edge_weights
+        self.weights = self.edge_weights()
+        # Optional route_cache.RouteCache in front of search
+        self.route_cache = None
+        # Whether the last search was answered from the route cache
+        self.cache_hit = False
+        # If set, search collects a SearchStats of what it did in stats
+        self.collect_stats = False
+        self.stats = None
+        
+    def edge_weights(self):
+        '''Returns the weights graph.weighted_neighbors takes under the map's cost model: the cost of every edge,
+        or the cost_model.CostModel itself for a TiledGraph, which weighs the edges of each tile once it is loaded'''
+        model = get_cost_model(self.cost_model)
+        if isinstance(self.graph, tiled_graph.TiledGraph):
+            return model
+        return model.edge_weights(self.graph)
+        
+    def heuristic_to(self, goals: list):
+        '''Returns h(i), the heuristic of graph node i to the closest of the goals, given as (OSMNode, offset) pairs
+        where the offset is added to the heuristic of that goal. The heuristic of a node is only computed the first
+        time it is asked for, then kept for the rest of the search.'''
+        graph = self.graph
+        landmarks = self.landmarks if self.heuristic == "landmarks" else None
+        # Scaled into a lower bound of the cost, so it stays admissible for other cost models
+        scale = get_cost_model(self.cost_model).heuristic_scale(graph)
+        targets = [(node.coordinate, None if landmarks is None else landmarks.to_node(graph.index[node.id]), offset)
+                   for node, offset in goals]
+        stats = self.stats
+        memo = dict()
+        
+        def h(i: int) -> float:
+            value = memo.get(i)
+            if value is None:
+                point = graph.coordinate(i)
+                from_node = None if landmarks is None else landmarks.to_node(i)
+                value = math.inf
+                for target, to_target, offset in targets:
+                    bound = haversine(point, target)
+                    # Both are lower bounds of the distance, so the larger one is the better heuristic
+                    if landmarks is not None:
+                        bound = max(bound, bound_between(from_node, to_target))
+                    value = min(value, bound * scale + offset)
+                memo[i] = value
+                if stats is not None:
+                    stats.heuristic_evaluations += 1
+            return value
+        return h
+        
+    def search(self, start, goal, mode: str = "astar", heuristic: str = "haversine"):
+        '''Tries to find a path from the start to the goal, if there is one, returns list of node ids if found.
+        mode is one of SEARCH_MODES and heuristic one of HEURISTICS (used by the astar and bidirectional modes).
+        The route minimizes the cost_model of the map.
+        
+        The start and goal can also be several candidate nodes, given as a list of OSMNodes or of (OSMNode, offset)
+        pairs where the offset is an extra distance (in km) of starting or ending there (e.g. the distance the address
+        was snapped over). The astar and ch modes then find the best route over every candidate in one search.'''
+        if mode not in SEARCH_MODES:
+            raise Exception(f"Error: unknown search mode {mode}")
+        if heuristic not in HEURISTICS:
+            raise Exception(f"Error: unknown heuristic {heuristic}")
+        if heuristic == "landmarks" and self.landmarks is None:
+            raise Exception("Error: the map has no landmarks, run preprocess.py on it first")
+        if mode == "ch" and self.cost_model != "distance":
+            raise Exception("Error: the contraction hierarchy is built for the distance cost model")
+        self.heuristic = heuristic
+        self.weights = self.edge_weights()
+        self.stats = SearchStats(mode, heuristic) if self.collect_stats else None
+        
+        # Only routes between single nodes are cached
+        cacheable = self.route_cache is not None and type(start) is OSMNode and type(goal) is OSMNode
+        self.cache_hit = False
+        if cacheable:
+            cached = self.route_cache.get(start.id, goal.id, self.cost_model)
+            if cached is not None:
+                self.cache_hit = True
+                self.expanded_count = 0
+                self.path_cost, cached_path = cached
+                if self.stats is not None:
+                    self.stats.cached = True
+                    self.stats.found = bool(cached_path)
+                    self.stats.path_nodes = len(cached_path)
+                    self.stats.lap("cache")
+                return [self.node_dict[i] for i in cached_path] or None
+        
+        if mode == "bidirectional" and (type(start) is not OSMNode or type(goal) is not OSMNode):
+            raise Exception("Error: the bidirectional mode takes a single start and goal")
+        starts = self.candidate_costs(start)
+        goals = self.candidate_costs(goal)
+        
+        # A simplified graph is searched between the ends of the chains the start and goal are in
+        simplified = isinstance(self.graph, SimplifiedGraph)
+        if simplified:
+            chain_route = self.chain_route(starts, goals)
+            starts, start_leads = self.chain_candidates(starts)
+            goals, goal_leads = self.chain_candidates(goals)
+        
+        # Candidates in a component the other side has none in cannot be part of a route
+        component = lambda node_id: self.components[self.graph.index[node_id]]
+        shared = {component(node_id) for node_id in starts} & {component(node_id) for node_id in goals}
+        starts = {node_id: c for node_id, c in starts.items() if component(node_id) in shared}
+        goals = {node_id: c for node_id, c in goals.items() if component(node_id) in shared}
+        
+        self.path_cost = math.inf
+        if not starts or not goals:
+            # Nodes on no routable way were simplified away, or no start and goal share a component
+            print("Not found!")
+            path = None
+            self.expanded_count = 0
+        elif mode == "bidirectional" and len(starts) == 1 and len(goals) == 1:
+            path = self.bidirectional_search(next(iter(starts.values()))[0], next(iter(goals.values()))[0])
+        elif mode == "ch":
+            path = self.hierarchy_search(starts, goals)
+        else:
+            # Also answers the bidirectional mode between nodes inside contracted chains, which have two candidates
+            path = self.astar_search(starts, goals)
+        
+        if simplified:
+            if path is not None:
+                path = start_leads[path[0].id] + self.full_path(path) + goal_leads[path[-1].id][::-1]
+            # Along the chain is shorter when the start and goal are in the same one
+            if chain_route is not None and chain_route[0] < self.path_cost:
+                self.path_cost, path = chain_route
+        
+        if cacheable:
+            self.route_cache.put(start.id, goal.id, self.cost_model, [] if path is None else [n.id for n in path],
+                                 self.path_cost)
+        if self.stats is not None:
+            self.stats.found = path is not None
+            self.stats.path_nodes = 0 if path is None else len(path)
+        return path
+    
+    def search_with_stats(self, start, goal, mode: str = "astar", heuristic: str = "haversine") -> tuple:
+        '''Like search, with stats collected for this search. Returns (path, SearchStats)'''
+        collect_stats = self.collect_stats
+        self.collect_stats = True
+        try:
+            path = self.search(start, goal, mode, heuristic)
+        finally:
+            self.collect_stats = collect_stats
+        return path, self.stats
+    
+    def astar_search(self, starts: dict, goals: dict):
+        '''A* from the start candidates to the goal candidates (see Map.candidate_costs), 
+        returns the list of nodes of the path if found'''
+        self.expanded_count = 0
+        graph = self.graph
+        
+        # Several goals (or one with an offset) use the smallest heuristic plus offset over the goals
+        h = self.heuristic_to(list(goals.values()))
+        stats = self.stats
+        if stats is not None:
+            stats.lap("heuristics")
+        
+        # The search runs on graph indices, OSMNodes are only looked up for the path found
+        goal_offsets = {graph.index[node_id]: offset for node_id, (_, offset) in goals.items()}
+        frontier = Frontier(h)
+        lookups = 0
+        
+        # Every start is in the frontier from the beginning, its offset is its gcost
+        for node, offset in starts.values():
+            frontier.add(graph.index[node.id], offset, None)
+        
+        # Cheapest goal reached so far, including its offset
+        best = None
+        best_cost = math.inf
+        
+        # If the frontier is empty, the best goal found is the solution or there is none
+        while not frontier.is_empty():
+            # Pop the node at the very front of the frontier
+            pathcost, u = frontier.remove()
+            # Nothing left in the frontier can reach a goal for less than the best one found
+            if pathcost >= best_cost:
+                break
+            gcost = frontier.gcosts[u]
+            # If it is a goal node, we found a solution
+            if u in goal_offsets:
+                cost = gcost + goal_offsets[u]
+                if cost < best_cost:
+                    best = u
+                    best_cost = cost
+                # It is the best solution once nothing left in the frontier can reach a goal for less,
+                #   and going on through this goal cannot either (it can if ending here has an offset)
+                if frontier.min_pathcost(u) >= best_cost and gcost >= best_cost:
+                    break
             
-            # Find the current node in the way
-            position = way.nodes.index(node.id)
+            # since it is not the goal node, continue on by looking at its neighbors
+            frontier.close(u)
+            self.expanded_count += 1
+            for v, weight in graph.weighted_neighbors(u, self.weights):
+                lookups += 1
+                frontier.add(v, gcost + weight, u)
+        
+        if stats is not None:
+            stats.pushed, stats.popped, stats.stale_pops = frontier.counter, frontier.popped, frontier.stale_count
+            stats.decrease_keys, stats.duplicates = frontier.replace_count, frontier.duplicate_count
+            stats.peak_frontier = frontier.peak_size
+            stats.heuristic_lookups = lookups
+            stats.explored = len(frontier.explored)
+            stats.lap("search")
+        
+        # The best goal found is the solution, if there is one
+        self.path_cost = best_cost
+        if best is None:
+            print("Not found!")
+            return None
+        path = self.path_to_index(frontier.parents, best)
+        if stats is not None:
+            stats.lap("path")
+        return path
             
-            to_be_added = []
-            # If the node is at the front, add the next node
-            if position == 0:
-                to_be_added.append(way.nodes[1])
+    def path_to_index(self, parents: dict, i: int) -> list:
+        '''Returns the list of nodes from the start to graph node i, given the parent index of every node reached'''
+        path = []
+        # Go back and add each nodes parents until we reach the starting node
+        while i is not None:
+            path.append(i)
+            i = parents[i]
+        # Reverse this list so that our path is start to goal
+        path.reverse()
+        return [self.node_dict[self.graph.ids[i]] for i in path]
             
-            # If the node is at the back, add the previous node
-            elif position == nodes_in_way - 1:
-                to_be_added.append(way.nodes[-2])
+    def bidirectional_search(self, start: OSMNode, goal: OSMNode):
+        '''Bidirectional A* with the pruning of NBA* (Pijls and Post, "Yet another bidirectional algorithm for
+        shortest paths", 2009). Returns the list of nodes of the path if found.
+        
+        The forward search uses the heuristic to the goal and the backward search the heuristic to the start, each
+        as strong as in astar. A node taken off either frontier is removed from both searches: it is expanded only if
+        a path through it can still be shorter than the best one found, judged by its own heuristic and by the
+        smallest key of the other frontier, else it is pruned. The search ends once either frontier is empty.'''
+        graph = self.graph
+        start_i = graph.index[start.id]
+        goal_i = graph.index[goal.id]
+        self.expanded_count = 0
+        if start_i == goal_i:
+            self.path_cost = 0.0
+            return [start]
+        
+        # Index 0 is the forward search, index 1 the backward search
+        heuristics = (self.heuristic_to([(goal, 0)]), self.heuristic_to([(start, 0)]))
+        stats = self.stats
+        if stats is not None:
+            stats.lap("heuristics")
+        
+        gcosts = ({start_i: 0.0}, {goal_i: 0.0})
+        parents = ({start_i: None}, {goal_i: None})
+        heaps = ([(heuristics[0](start_i), start_i)], [(heuristics[1](goal_i), goal_i)])
+        # Nodes taken off either frontier, expanded or pruned, neither search adds them again
+        removed = set()
+        
+        best_cost = math.inf
+        meeting = None
+        # For SearchStats
+        popped, stale_pops, pushed, decrease_keys, duplicates, pruned, lookups, peak_frontier = 0, 0, 2, 0, 0, 0, 0, 2
+        while heaps[0] and heaps[1]:
+            # Expand the side with the smaller frontier
+            side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+            _, u = heapq.heappop(heaps[side])
+            popped += 1
+            # Skip entries of nodes already removed, by a cheaper entry or by the other side
+            if u in removed:
+                stale_pops += 1
+                continue
+            removed.add(u)
             
-            # else, add both previous and next nodes
-            else:
-                to_be_added.append(way.nodes[position + 1])
-                to_be_added.append(way.nodes[position - 1])
+            gcost = gcosts[side]
+            other_gcost = gcosts[1 - side]
+            h = heuristics[side]
+            g = gcost[u]
+            # No path through u is shorter than the best one found if its own heuristic says so, or if going on to
+            #   any node left in the other frontier costs at least that frontier's smallest key minus the heuristic
+            #   of u toward the other end
+            if best_cost < math.inf:
+                other_heap = heaps[1 - side]
+                while other_heap and other_heap[0][1] in removed:
+                    heapq.heappop(other_heap)
+                    popped += 1
+                    stale_pops += 1
+                if not other_heap:
+                    break
+                if g + h(u) >= best_cost or g + other_heap[0][0] - heuristics[1 - side](u) >= best_cost:
+                    pruned += 1
+                    continue
+            self.expanded_count += 1
             
-            # For each node we could add
-            for node_id in to_be_added:
-                new_node = self.node_dict[node_id]
-                # If the node is already added or if it is the same as the parent, skip it
-                if node_id in neighbor_ids or node_id == node.id:
+            for v, weight in graph.weighted_neighbors(u, self.weights):
+                lookups += 1
+                gc = g + weight
+                if v in removed or gc >= gcost.get(v, math.inf):
+                    duplicates += 1
                     continue
+                if v in gcost:
+                    decrease_keys += 1
+                gcost[v] = gc
+                parents[side][v] = u
+                heapq.heappush(heaps[side], (gc + h(v), v))
+                pushed += 1
                 
-                # gcost (cost to reach node)
-                gc = haversine(node.coordinate, new_node.coordinate) + anode.pathcost
-                # hcost (estimated cost to goal)
-                hc = haversine(self.osm_goal.coordinate, new_node.coordinate)
-                # Add the new anode to the list
-                neighbor_results.append(AstarNode(new_node, gc, hc, anode))
-                neighbor_ids.append(node_id)            
+                # The two searches met, see if this is the shortest path so far
+                if v in other_gcost and gc + other_gcost[v] < best_cost:
+                    best_cost = gc + other_gcost[v]
+                    meeting = v
+            if stats is not None:
+                peak_frontier = max(peak_frontier, len(heaps[0]) + len(heaps[1]))
+        
+        if stats is not None:
+            stats.popped, stats.stale_pops, stats.pushed = popped, stale_pops, pushed
+            stats.decrease_keys, stats.duplicates, stats.peak_frontier = decrease_keys, duplicates, peak_frontier
+            stats.pruned = pruned
+            stats.explored = self.expanded_count
+            stats.heuristic_lookups = lookups
+            stats.lap("search")
+        
+        self.path_cost = best_cost
+        if meeting is None:
+            print("Not found!")
+            return None
+        
+        # Walk back from the meeting node to the start, then forward to the goal
+        path = []
+        i = meeting
+        while i is not None:
+            path.append(i)
+            i = parents[0][i]
+        path.reverse()
+        i = parents[1][meeting]
+        while i is not None:
+            path.append(i)
+            i = parents[1][i]
+        path = [self.node_dict[graph.ids[i]] for i in path]
+        if stats is not None:
+            stats.lap("path")
+        return path
             
-        return neighbor_results 
+
+    def hierarchy_search(self, starts: dict, goals: dict):
+        '''Answers the route with the contraction hierarchy, returns the list of nodes of the path if found.
+        Takes the same start and goal candidates as astar_search'''
+        if self.hierarchy is None:
+            raise Exception("Error: the map has no contraction hierarchy, run preprocess.py on it first")
+        
+        starts = {self.graph.index[node_id]: offset for node_id, (_, offset) in starts.items()}
+        goals = {self.graph.index[node_id]: offset for node_id, (_, offset) in goals.items()}
+        self.path_cost, path, self.expanded_count = self.hierarchy.query_many(starts, goals)
+        # The hierarchy query only reports the nodes it settled
+        if self.stats is not None:
+            self.stats.explored = self.expanded_count
+            self.stats.lap("search")
+        if path is None:
+            print("Not found!")
+            return None
+        return [self.node_dict[self.graph.ids[i]] for i in path]
+
+    def chain_candidates(self, candidates: dict) -> tuple:
+        '''Replaces the candidates inside contracted chains of a simplified graph by the two ends of their chain,
+        with the cost along the chain added to their offset. Returns (candidates, leads) where leads[OSM id] are
+        the nodes from the original candidate up to that end (excluding it). Nodes on no edge are dropped.'''
+        graph = self.graph
+        chain_ends = dict()
+        leads = dict()
+        for node_id, (node, offset) in candidates.items():
+            if node_id in graph.index:
+                ends = [(node_id, offset, [])]
+            elif node_id in graph.interior:
+                e, k = graph.interior[node_id]
+                first, last = graph.via_offsets[e], graph.via_offsets[e + 1]
+                # Cost models are linear along a chain, which has the same highway class and maxspeed throughout
+                fraction = graph.via_lengths[k] / graph.lengths[e]
+                via = [self.node_dict[i] for i in graph.via_nodes[first:last]]
+                ends = [(graph.ids[graph.source(e)], offset + self.weights[e] * fraction, via[k - first::-1]),
+                        (graph.ids[graph.targets[e]], offset + self.weights[e] * (1 - fraction), via[k - first:])]
+            else:
+                continue
+            for end_id, cost, lead in ends:
+                if end_id not in chain_ends or cost < chain_ends[end_id][1]:
+                    chain_ends[end_id] = (self.node_dict[end_id], cost)
+                    leads[end_id] = lead
+        return chain_ends, leads
+    
+    def chain_route(self, starts: dict, goals: dict) -> tuple:
+        '''Returns (cost, path) of the cheapest route along a single contracted chain between a start and a goal
+        inside the same chain, None if no start and goal share one'''
+        graph = self.graph
+        best = None
+        for start_id, (start_node, start_offset) in starts.items():
+            if start_id not in graph.interior:
+                continue
+            e, k = graph.interior[start_id]
+            for goal_id, (goal_node, goal_offset) in goals.items():
+                if goal_id not in graph.interior or graph.interior[goal_id][0] != e:
+                    continue
+                j = graph.interior[goal_id][1]
+                along = abs(graph.via_lengths[j] - graph.via_lengths[k]) / graph.lengths[e] * self.weights[e]
+                cost = start_offset + along + goal_offset
+                if best is None or cost < best[0]:
+                    step = 1 if j >= k else -1
+                    best = (cost, [self.node_dict[graph.via_nodes[i]] for i in range(k, j + step, step)])
+        return best
+    
+    def full_path(self, path: list) -> list:
+        '''Returns the path through a simplified graph with the nodes inside its contracted edges put back'''
+        graph = self.graph
+        nodes = [path[0]]
+        for a, b in zip(path, path[1:]):
+            e = graph.edge(graph.index[a.id], graph.index[b.id])
+            nodes.extend(self.node_dict[i] for i in graph.via(e))
+            nodes.append(b)
+        return nodes
+    
+    def candidate_costs(self, candidates) -> dict:
+        '''Like candidate_costs, with the offsets turned into costs of the map's cost model'''
+        model = get_cost_model(self.cost_model)
+        return {node_id: (node, model.offset_cost(offset)) for node_id, (node, offset) in candidate_costs(candidates).items()}
     
-    def expand(self, frontier, anodes, explored):
-        '''expands the frontier given a list of anodes'''
-        added = False
+    def component(self, node_id: int) -> int:
+        '''Returns the connected component of an OSM node id on the graph (or inside one of its contracted chains),
+        None if it is on neither'''
+        graph = self.graph
+        if node_id in graph.index:
+            return self.components[graph.index[node_id]]
+        if node_id in getattr(graph, "interior", ()):
+            return self.components[graph.source(graph.interior[node_id][0])]
+        return None
+    
+    def osm_node(self, node, component: int = None) -> OSMNode:
+        '''Returns the OSMNode of an OSM node id on the graph (or inside one of its contracted chains), or the
+        routable node closest to (lat, lon) coordinates or to an address of the map's address_index.
+        If a component is given, coordinates and addresses snap to the closest node in that component.'''
+        return self.snap_candidates(node, component)[0]
+    
+    def route_ends(self, start, goal) -> tuple:
+        '''Returns the OSMNodes of the start and goal of a route, each given in any of the ways osm_node takes.
+        Coordinates and addresses snap to a node that has a route to the other end: into the component of the
+        other end if it is a node id, else to the closest pair of candidates in one component, else into the 
+        largest component. If none of these exist, both ends snap to their closest node.'''
+        starts = self.snap_candidates(start)
+        goals = self.snap_candidates(goal)
+        if type(start) is int and type(goal) is int:
+            return starts[0], goals[0]
+        if type(start) is int:
+            return starts[0], self.snap_or_closest(goal, self.component(starts[0].id), goals[0])
+        if type(goal) is int:
+            return self.snap_or_closest(start, self.component(goals[0].id), starts[0]), goals[0]
         
-        # If there are no more anodes, return
-        if len(anodes) == 0:
-            return
+        # Candidates are closest first, take the pair with the smallest sum of their positions
+        pairs = [(i + j, i, j) for i, s in enumerate(starts) for j, g in enumerate(goals)
+                 if self.component(s.id) == self.component(g.id)]
+        if pairs:
+            _, i, j = min(pairs)
+            return starts[i], goals[j]
+        largest = (self.snap_or_closest(start, 0, None), self.snap_or_closest(goal, 0, None))
+        if None not in largest:
+            return largest
+        return starts[0], goals[0]
+    
+    def snap_or_closest(self, node, component: int, closest: OSMNode) -> OSMNode:
+        '''Returns the node osm_node snaps to in the component, closest if there is none near'''
+        try:
+            return self.osm_node(node, component)
+        except Exception:
+            return closest
+    
+    def snap_candidates(self, node, component: int = None) -> list:
+        '''Returns the OSMNodes a node given in any of the ways osm_node takes can snap to, closest first.
+        A node id is its only candidate.'''
+        if type(node) is int:
+            if node not in self.graph.index and node not in getattr(self.graph, "interior", ()):
+                raise NodeNotFound("Error: OSMNode id not found")
+            return [self.node_dict[node]]
         
-        # Get the first anode, add it in the right spot, remove it from the list
-        current_anode = anodes.pop(0)
-        # If the node is not in explored, add it to the frontier if it is the shortest path cost
-        if current_anode.OSM_node.id not in explored:
-            
-            # Since the frontier is ordered by path cost and not id, we have to linearly search
-            for n in range(len(frontier.deque)):
-                # If we found a matching node, take the one with the lesser path cost
-                if frontier.deque[n].OSM_node.id == current_anode.OSM_node.id:
-                    
-                    # Since the current node has a lesser path cost, remove n and add current
-                    if current_anode.pathcost < frontier.deque[n].pathcost:
-                        del frontier.deque[n]
-                        frontier.add(current_anode)
-                        added = True
-                        break
-                    # else, ignore it
-                    else:
-                        added = True
-                        break
-            # Add it if we didnt find the node already
-            if not added:
-                frontier.add(current_anode)
-        
-        
-        self.expand(frontier, anodes, explored)
-        
-    def search(self, start: OSMNode, goal: OSMNode):
-        '''Tries to find a path from the start to the goal, if there is one, returns list of node ids if found'''
-        self.osm_goal = goal
-        beg_anode = AstarNode(start, 0, heuristic(start, goal), None)
-        frontier = Frontier(beg_anode)
-        explored = set()
-        
-        while True:
-            # If frontier is empty, there is no solution
-            if frontier.is_empty():
-                print("Not found!")
-                break
-            # Pop the node at the very front of the frontier
-            current_anode = frontier.remove()
-            # If it is the goal node, we found a solution
-            if current_anode.OSM_node == goal:
-                # Create a list for the path we found
-                path = []
-                # Go back and add each nodes parents until we reach the starting node
-                while current_anode.parent is not None:
-                    path.append(current_anode.OSM_node)
-                    current_anode = current_anode.parent
-                # Add the start node
-                path.append(current_anode.OSM_node)
-                # Reverse this list so that our path is start to goal
-                path.reverse()
-                return path
-            
-            # since it is not the goal node, continue on by looking at its neighbors
-            # Add the current node to the explored set
-            explored.add(current_anode.OSM_node.id)
-            # Now we have to add the next nodes to the frontier using our heuristic.
-            neighbors_to_be_added = self.neighbors(current_anode)
-            self.expand(frontier, neighbors_to_be_added, explored)
-            
+        if type(node) is str:
+            point = None if self.address_index is None else self.address_index.lookup(node)
+            if point is None:
+                raise search_geocoder.AddressNotFound(f"Error: address not found: {node}")
+        else:
+            try:
+                point = Point(*(float(value) for value in node))
+            except (TypeError, ValueError):
+                raise NodeNotFound(f"Error: {node!r} is not a node id, (lat, lon) coordinates or an address")
+        if self.node_index is None and isinstance(self.graph, tiled_graph.TiledGraph):
+            self.node_index = TiledNodeIndex(self.node_dict, self.graph)
+        elif self.node_index is None:
+            self.node_index = NodeIndex(self.node_dict, self.way_dict)
+        in_component = None if component is None else (lambda osm_node: self.component(osm_node.id) == component)
+        closest_nodes = coordinates_to_nodes(point, self.node_dict, self.way_dict, self.bbox, self.node_index,
+                                             in_component)
+        if not closest_nodes:
+            raise NodeNotFound(f"Error: no routable node near ({point.lat}, {point.lon})")
+        return closest_nodes
+    
+    def graph_index(self, node) -> int:
+        '''Returns the graph index of a node given in any of the ways osm_node takes'''
+        osm_node = self.osm_node(node)
+        if osm_node.id not in self.graph.index:
+            raise Exception(f"Error: node {osm_node.id} is inside a contracted edge of the simplified graph")
+        return self.graph.index[osm_node.id]
+    
+    def distance_matrix(self, origins: list, destinations: list, with_paths: bool = False, processes: int = 1) -> tuple:
+        '''Costs under the map's cost_model (distances in km by default) from every origin to every destination,
+        each given as an OSM node id or (lat, lon) coordinates. Runs one one-to-many search per origin, 
+        spread over processes worker processes.
+        Returns (matrix, paths) like distance_matrix.distance_matrix, with the paths as lists of OSM ids.'''
+        graph = self.graph
+        if isinstance(graph, tiled_graph.TiledGraph):
+            raise Exception("Error: distance matrices need the whole graph, not its tiles")
+        self.weights = self.edge_weights()
+        origin_nodes = [self.osm_node(node) for node in origins]
+        destination_nodes = [self.osm_node(node) for node in destinations]
+        
+        # On a simplified graph, nodes inside contracted chains start or end at either end of their chain
+        simplified = isinstance(graph, SimplifiedGraph)
+        if simplified:
+            origin_ends = [self.chain_candidates({node.id: (node, 0.0)}) for node in origin_nodes]
+            destination_ends = [self.chain_candidates({node.id: (node, 0.0)}) for node in destination_nodes]
+            sources = [{graph.index[i]: cost for i, (_, cost) in ends.items()} for ends, _ in origin_ends]
+            targets = [{graph.index[i]: cost for i, (_, cost) in ends.items()} for ends, _ in destination_ends]
+        else:
+            sources = [graph.index[node.id] for node in origin_nodes]
+            targets = [graph.index[node.id] for node in destination_nodes]
+        # The lengths are the distance weights, the graph's own edges are used for them
+        weights = None if self.cost_model == "distance" else self.weights
+        matrix, paths = distance_matrix.distance_matrix(graph, sources, targets, with_paths, processes, weights)
+        
+        if simplified:
+            if paths is not None:
+                paths = [[None if path is None else self.full_path([self.node_dict[graph.ids[i]] for i in path])
+                          for path in row] for row in paths]
+            for i, (origin, (_, start_leads)) in enumerate(zip(origin_nodes, origin_ends)):
+                for j, (destination, (_, goal_leads)) in enumerate(zip(destination_nodes, destination_ends)):
+                    if paths is not None and paths[i][j] is not None:
+                        path = paths[i][j]
+                        paths[i][j] = start_leads[path[0].id] + path + goal_leads[path[-1].id][::-1]
+                    # Along the chain is shorter when the origin and destination are in the same one
+                    chain_route = self.chain_route({origin.id: (origin, 0.0)}, {destination.id: (destination, 0.0)})
+                    if chain_route is not None and chain_route[0] < matrix[i][j]:
+                        matrix[i][j] = chain_route[0]
+                        if paths is not None:
+                            paths[i][j] = chain_route[1]
+            if paths is not None:
+                paths = [[None if path is None else [node.id for node in path] for path in row] for row in paths]
+        elif paths is not None:
+            paths = [[None if path is None else [graph.ids[i] for i in path] for path in row] for row in paths]
+        return matrix, paths
+
+def candidate_costs(candidates) -> dict:
+    '''Turns the start or goal given to Map.search into a dict of OSM id -> (OSMNode, offset)'''
+    if type(candidates) is OSMNode:
+        return {candidates.id: (candidates, 0.0)}
+    
+    costs = dict()
+    for candidate in candidates:
+        node, offset = (candidate, 0.0) if type(candidate) is OSMNode else candidate
+        # A node given twice keeps its smaller offset
+        if node.id not in costs or offset < costs[node.id][1]:
+            costs[node.id] = (node, offset)
+    
+    if costs == dict():
+        raise Exception("Error: no candidate nodes given")
+    return costs
 
 def ask_for_format() -> str:
     '''Gets the format of either nodes or addresses'''
@@ -305,6 +972,8 @@ def create_way_dict(map_dict: dict) -> dict:
                             if unnamed_entry["@v"] == val:
                                 new_way.highway_value = val
                                 break
+                    elif unnamed_entry["@k"] == "maxspeed":
+                        new_way.maxspeed = parse_maxspeed(unnamed_entry["@v"])
                     
             # If tag is a dict
             elif type(item["tag"] == dict):
@@ -315,6 +984,8 @@ def create_way_dict(map_dict: dict) -> dict:
                         if item["tag"]["@v"] == val:
                             new_way.highway_value = val
                             break
+                elif "@k" in item["tag"] and item["tag"]["@k"] == "maxspeed":
+                    new_way.maxspeed = parse_maxspeed(item["tag"]["@v"])
 
         # Put the way into the dict
         way_dict[int(item['@id'])] = new_way
@@ -325,6 +996,12 @@ def create_way_dict(map_dict: dict) -> dict:
     
     return way_dict
 
+def get_highway_value(value) -> str:
+    '''returns the value if it is one of the HIGHWAY_VALUES, None otherwise'''
+    if value in HIGHWAY_VALUES:
+        return value
+    return None
+
 def add_all_ways_to_nodes(way_dict: dict, node_dict: dict) -> None:
     '''Takes in a way_dict and node_dict and assigns a node's way set if it is in a given way'''
     # For each node a part of every way
@@ -351,6 +1028,194 @@ def load_json_to_dict(map_file) -> dict:
         raise Exception('Error: Map file contains nothing')
     return map_dict
 
+def load_map(map_file, use_cache=True, simplify=False) -> tuple:
+    '''Loads a json or OSM xml map file and returns (node_dict, way_dict, bbox, graph).
+    The compiled map is cached next to the map file, later runs open the cache with mmap instead of
+    parsing the map again. A cache that is stale or damaged is rebuilt.
+    If simplify, the graph is a SimplifiedGraph (see routing_graph.simplify_graph).'''
+    node_dict, way_dict, bbox, graph = load_full_map(map_file, use_cache)
+    if simplify:
+        graph = simplify_graph(graph)
+    return node_dict, way_dict, bbox, graph
+
+def load_full_map(map_file, use_cache=True) -> tuple:
+    '''load_map without simplification'''
+    cache_file = map_cache.cache_file_name(map_file)
+    if use_cache:
+        cache = map_cache.read_map_cache(cache_file, map_file)
+        if cache is not None:
+            node_dict, way_dict = dicts_from_map_cache(cache)
+            return node_dict, way_dict, BoundingBox(*cache.bbox), cache.graph
+    
+    # OSM xml and PBF files are streamed straight into the node and way dictionaries
+    if map_file.endswith(OSM_EXTENSIONS):
+        map_addresses = AddressIndex()
+        node_dict, way_dict, bbox = load_osm_file(map_file, address_index=map_addresses)
+    else:
+        # Load data into a dict
+        map_dict = load_json_to_dict(map_file)
+        map_addresses = address_index_from_map_dict(map_dict)
+        
+        # Make a node and way dictionary
+        node_dict = create_node_dict(map_dict)
+        way_dict = create_way_dict(map_dict)
+        
+        # Adds all ways to each node's way set in node_dict
+        add_all_ways_to_nodes(way_dict, node_dict)
+        
+        # Make the bounding box
+        bbox = get_bounding_box(map_dict)
+    
+    graph = compile_graph(node_dict, way_dict)
+    if use_cache:
+        # A map in a read only directory still loads, it is just not cached
+        try:
+            map_cache.write_map_cache(cache_file, map_file, graph, way_dict, 
+                                      (bbox.minlat, bbox.minlon, bbox.maxlat, bbox.maxlon))
+        except OSError:
+            print(f"Could not write the map cache {cache_file}")
+        # Addresses are only in the map file, keep them for when the map is opened from the cache
+        write_address_index(map_file, map_addresses)
+    return node_dict, way_dict, bbox, graph
+
+def dicts_from_map_cache(cache) -> tuple:
+    '''Returns the node_dict and way_dict of a map_cache.MapCache, served from its arrays (see CachedNodeDict)'''
+    return CachedNodeDict(cache), CachedWayDict(cache)
+
+def load_tiled_map(map_file, memory_cap: int = tiled_graph.DEFAULT_MEMORY_CAP) -> tuple:
+    '''Opens a map from the tiles tiled_graph.py built for it and returns (node_dict, way_dict, bbox, graph) like load_map,
+    with a tiled_graph.TiledGraph that keeps at most about memory_cap bytes of tiles loaded'''
+    graph = tiled_graph.TiledGraph(tiled_graph.tile_directory_name(map_file), map_file, memory_cap)
+    return TiledNodeDict(graph), TiledWayDict(graph), BoundingBox(*graph.bbox), graph
+
+def load_hierarchy(map_file, graph):
+    '''Returns the contraction hierarchy preprocess.py built for the map (or its simplified graph if the graph is one),
+    None if there is none or it is stale'''
+    hierarchy_file = contraction_hierarchy.hierarchy_file_name(map_file, isinstance(graph, SimplifiedGraph))
+    hierarchy = contraction_hierarchy.read_contraction_hierarchy(hierarchy_file, map_file)
+    if hierarchy is None or len(hierarchy) != len(graph):
+        return None
+    return hierarchy
+
+def load_landmarks(map_file, graph):
+    '''Returns the landmarks preprocess.py picked for the map (or its simplified graph if the graph is one),
+    None if there are none or they are stale'''
+    landmarks_file = landmarks.landmarks_file_name(map_file, isinstance(graph, SimplifiedGraph))
+    map_landmarks = landmarks.read_landmarks(landmarks_file, map_file)
+    if map_landmarks is None or map_landmarks.matrix.shape[1] != len(graph):
+        return None
+    return map_landmarks
+
+def load_address_index(map_file) -> AddressIndex:
+    '''Returns the AddressIndex of the addr:* tags of the map, read from the file load_map keeps next to the map.
+    The index is built from the map file (and its file written) if it is missing or stale.'''
+    address_file = address_index.address_index_file_name(map_file)
+    map_addresses = address_index.read_address_index(address_file, map_file)
+    if map_addresses is not None:
+        return map_addresses
+    
+    if map_file.endswith(OSM_EXTENSIONS):
+        map_addresses = AddressIndex()
+        load_osm_file(map_file, address_index=map_addresses)
+    else:
+        map_addresses = address_index_from_map_dict(load_json_to_dict(map_file))
+    write_address_index(map_file, map_addresses)
+    return map_addresses
+
+def write_address_index(map_file, map_addresses) -> None:
+    '''Writes the address index next to the map, a map in a read only directory is just not indexed on disk'''
+    address_file = address_index.address_index_file_name(map_file)
+    try:
+        address_index.write_address_index(address_file, map_file, map_addresses)
+    except OSError:
+        print(f"Could not write the address index {address_file}")
+
+def load_osm_file(map_file, routable_only=True, address_index=None, processes=None) -> tuple:
+    '''Streams an OSM xml or PBF (.pbf) file straight into a node_dict, way_dict and BoundingBox without a json intermediate.
+    If routable_only, only ways with a highway value and the nodes on them are kept.
+    The addresses of the map are added to address_index if one is given.
+    PBF blocks are decoded by that many processes, one per cpu if None.'''
+    if map_file.endswith(".pbf"):
+        elements = pbf_loader.iter_pbf_elements(map_file, processes)
+    else:
+        elements = osm_loader.iter_osm_elements(map_file)
+    return build_map_from_elements(elements, routable_only, address_index)
+
+def build_map_from_elements(elements, routable_only=True, address_index=None) -> tuple:
+    '''Builds a node_dict, way_dict and BoundingBox from a stream of osm_loader element tuples.
+    The addresses of nodes and ways are added to address_index if one is given, ways at the average of their nodes.'''
+    node_dict = dict()
+    way_dict = dict()
+    bbox = None
+    
+    # Until the ways are read we do not know which nodes are routable, so only keep their coordinates
+    coordinate_index = dict()
+    lats = array('d')
+    lons = array('d')
+    
+    def node_coordinate(node_id):
+        '''returns the (lat, lon) of a node read so far, None if it was not'''
+        if node_id in coordinate_index:
+            return lats[coordinate_index[node_id]], lons[coordinate_index[node_id]]
+        if node_id in node_dict:
+            return node_dict[node_id].coordinate.lat, node_dict[node_id].coordinate.lon
+        return None
+    
+    for element in elements:
+        kind = element[0]
+        if kind == "node":
+            _, osm_id, lat, lon, tags = element
+            if address_index is not None:
+                address_index.add_tags(tags, lat, lon)
+            if routable_only:
+                coordinate_index[osm_id] = len(lats)
+                lats.append(lat)
+                lons.append(lon)
+            else:
+                node_dict[osm_id] = OSMNode(osm_id, lat, lon)
+                
+        elif kind == "way":
+            _, osm_id, node_refs, tags = element
+            if address_index is not None and address_from_tags(tags) is not None:
+                center = way_center(node_refs, node_coordinate)
+                if center is not None:
+                    address_index.add_tags(tags, *center)
+            
+            highway_value = get_highway_value(tags.get("highway"))
+            if routable_only and highway_value is None:
+                continue
+            
+            new_way = Way(osm_id)
+            new_way.nodes = node_refs
+            new_way.highway_value = highway_value
+            new_way.maxspeed = parse_maxspeed(tags.get("maxspeed"))
+            way_dict[osm_id] = new_way
+            
+            # Create the nodes of the way now that we know they are needed
+            if routable_only:
+                for node_id in node_refs:
+                    if node_id in coordinate_index and node_id not in node_dict:
+                        i = coordinate_index[node_id]
+                        node_dict[node_id] = OSMNode(node_id, lats[i], lons[i])
+                        
+        elif kind == "bounds":
+            bbox = BoundingBox(*element[1:])
+    
+    if node_dict == dict():
+        raise Exception("Error: node_dict is empty")
+    if way_dict == dict():
+        raise Exception("Error: way_dict is empty")
+    
+    # If the file has no bounds, use the extent of the nodes
+    if bbox is None:
+        bbox = BoundingBox(min(n.coordinate.lat for n in node_dict.values()),
+                           min(n.coordinate.lon for n in node_dict.values()),
+                           max(n.coordinate.lat for n in node_dict.values()),
+                           max(n.coordinate.lon for n in node_dict.values()))
+    
+    add_all_ways_to_nodes(way_dict, node_dict)
+    return node_dict, way_dict, bbox
+
 def get_id_from_nodes(node_dict: dict) -> tuple:
     '''Gets the int ids from user'''
     try:
@@ -387,40 +1252,16 @@ def get_bounding_box(map_dict: dict) -> BoundingBox:
     # returns a BoundingBox
     return BoundingBox(minlat, minlon, maxlat, maxlon)
     
-def haversine(p1: Point, p2: Point)->float:
-    '''Calculates the haversine formula between 2 points and returns the distance in kilometers'''
-    # https://en.wikipedia.org/wiki/Haversine_formula
-    # https://community.esri.com/t5/coordinate-reference-systems-blog/distance-on-a-sphere-the-haversine-formula/ba-p/902128
-    
-    lat1 = p1.lat
-    lon1 = p1.lon
-    lat2 = p2.lat
-    lon2 = p2.lon
-    
-    # Radius of earth in km
-    radius = 6371
-    
-    # radian conversion
-    lat1_r = math.radians(lat1)
-    lat2_r = math.radians(lat2)
-    
-    # deltas
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lon = math.radians(lon2 - lon1)
-    
-    a = math.sin(delta_lat / 2.0) ** 2 + math.cos(lat1_r) * math.cos(lat2_r) * math.sin(delta_lon / 2.0) ** 2
-    
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    
-    km = c * radius
-    return km
-    
-def coordinates_to_nodes(point: Point, node_dict: dict, way_dict: dict, bbox: BoundingBox) -> [OSMNode]:
-    '''converts lat and lon coordinates to the nearest nodes (5 by default)'''
+def coordinates_to_nodes(point: Point, node_dict: dict, way_dict: dict, bbox: BoundingBox, node_index=None,
+                         in_component=None) -> [OSMNode]:
+    '''converts lat and lon coordinates to the nearest nodes (5 by default).
+    If a NodeIndex of the map is given, only the routable nodes near the point are looked at.
+    If in_component is given, only the nodes it returns True for are (see Map.component), e.g. those in the
+    largest component or in the component of the other end of the route.'''
     
     # Check if within bounds
     if not bbox.check_inside(point):
-        raise Exception(f"Coordinates({point.lat}, {point.lon}) are not within the given map's bounding box {bbox}")
+        raise NodeNotFound(f"Coordinates({point.lat}, {point.lon}) are not within the given map's bounding box {bbox}")
     
     # Create an empty list of tuples the 5 closest nodes and their distance to the point 
     closest_nodes = [None for i in range(AMOUNT_OF_CLOSEST_NODES)]
@@ -430,11 +1271,18 @@ def coordinates_to_nodes(point: Point, node_dict: dict, way_dict: dict, bbox: Bo
     max_pos = 0
     max_val = math.inf
     
+    # The index gives the routable nodes within range in node_dict order, else every node is a candidate
+    if node_index is not None:
+        candidates = node_index.within(point, MAX_DISTANCE_BETWEEN_NODES)
+    else:
+        candidates = ((node, haversine(point, node.coordinate)) for node in node_dict.values())
+    if in_component is not None:
+        candidates = ((node, distance) for node, distance in candidates if in_component(node))
+    
     # look through all nodes and find node(s) closest that match the highway tags at the very top
-    for node in node_dict.values():
+    for node, distance in candidates:
 
         # If node not within specified meters, skip the node
-        distance = haversine(point, node.coordinate)
         if distance > MAX_DISTANCE_BETWEEN_NODES:
             continue
         
@@ -504,75 +1352,110 @@ def coordinates_to_nodes(point: Point, node_dict: dict, way_dict: dict, bbox: Bo
     sorted_closest_nodes = [x[1] for x in sorted_closest_pairs]
     return sorted_closest_nodes
     
-def get_id_from_geocoding_addresses(node_dict: dict, way_dict: dict, bbox: BoundingBox):
-    '''Gets the node ids of the beginning and end points given addresses'''
+def get_candidates_from_geocoding_addresses(node_dict: dict, way_dict: dict, bbox: BoundingBox, node_index=None,
+                                            address_index=None, allow_remote=False, geocoder=None):
+    '''Gets the candidate nodes of the beginning and end points given addresses, 
+    as lists of (OSMNode, distance from the address) closest first.
+    Addresses are looked up in the address_index of the map, the remote geocoder is only used if allow_remote'''
+    if node_index is None:
+        node_index = NodeIndex(node_dict, way_dict)
+    
     # Ask for addresses
     beg_add = input("Enter the start address: ")
     end_add = input("Enter the end address  : ")
     
     # Convert them to points
-    beg_coord = Point(*search_geocoder.address_to_coordinates(beg_add))
-    end_coord = Point(*search_geocoder.address_to_coordinates(end_add))
+    beg_coord = Point(*search_geocoder.resolve_address(beg_add, address_index, allow_remote, geocoder))
+    end_coord = Point(*search_geocoder.resolve_address(end_add, address_index, allow_remote, geocoder))
     
     # Convert cordinates to nodes
-    beg_node_id_ls = [node.id for node in coordinates_to_nodes(beg_coord, node_dict, way_dict, bbox)]
-    end_node_id_ls = [node.id for node in coordinates_to_nodes(end_coord, node_dict, way_dict, bbox)]
+    beg_nodes = coordinates_to_nodes(beg_coord, node_dict, way_dict, bbox, node_index)
+    end_nodes = coordinates_to_nodes(end_coord, node_dict, way_dict, bbox, node_index)
+    
+    beg_candidates = [(node, haversine(beg_coord, node.coordinate)) for node in beg_nodes]
+    end_candidates = [(node, haversine(end_coord, node.coordinate)) for node in end_nodes]
+    return beg_candidates, end_candidates
+
+def get_id_from_geocoding_addresses(node_dict: dict, way_dict: dict, bbox: BoundingBox, node_index=None,
+                                    address_index=None, allow_remote=False):
+    '''Gets the node ids of the beginning and end points given addresses'''
+    beg_candidates, end_candidates = get_candidates_from_geocoding_addresses(node_dict, way_dict, bbox, node_index,
+                                                                             address_index, allow_remote)
+    
+    beg_node_id_ls = [node.id for node, _ in beg_candidates]
+    end_node_id_ls = [node.id for node, _ in end_candidates]
 
     return beg_node_id_ls, end_node_id_ls
 
 def heuristic(node, goal_node):
     return haversine(node.coordinate, goal_node.coordinate)
 
+def path_length(path: list) -> float:
+    '''returns the length (in km) of a path given as a list of OSMNodes'''
+    return sum(haversine(a.coordinate, b.coordinate) for a, b in zip(path, path[1:]))
+
 
 
 
 
 def main():
-    if len(sys.argv) != 2:
+    # --remote-geocoder lets addresses missing from the map be looked up with Nominatim
+    # --stats prints what the search did
+    # --fastest finds the fastest route instead of the shortest
+    flags = sys.argv[2:]
+    if len(sys.argv) < 2 or any(flag not in MAIN_FLAGS for flag in flags):
         raise Exception("No map found!")
     map_file = sys.argv[1]
+    allow_remote = "--remote-geocoder" in flags
     
     # Ask for the format of user input: nodes or addresses
     format_type = ask_for_format()
     
-    # Load data into a dict
-    print("Loading in the data (This may take a while depending on the size of the map)")
-    map_dict = load_json_to_dict(map_file)
+    # Load the map, the first run also writes a cache that later runs open instantly
+    print("Loading in the data (This may take a while the first time depending on the size of the map)")
+    node_dict, way_dict, bbox, graph = load_map(map_file)
     
-    # Make a node and way dictionary
-    node_dict = create_node_dict(map_dict)
-    way_dict = create_way_dict(map_dict)
-    
-    # Adds all ways to each node's way set in node_dict
-    add_all_ways_to_nodes(way_dict, node_dict)
-    
-    # Make the bounding box
-    bbox = get_bounding_box(map_dict)
+    # Answer the route with the contraction hierarchy if the map was preprocessed
+    hierarchy = load_hierarchy(map_file, graph)
+    # Otherwise use the landmark heuristic if there are landmarks
+    map_landmarks = load_landmarks(map_file, graph)
     
     # Ask for beginning and end destinations
     beg, end = None, None
-    beg_ids, end_ids = None, None
     if format_type == 'NODE':
         beg_id, end_id = get_id_from_nodes(node_dict)
+        
+        # get nodes for the beginning and end
+        print("Getting nodes")
+        beg = get_node_from_id(None, node_dict, beg_id)
+        end = get_node_from_id(None, node_dict, end_id)
     elif format_type == 'ADDRESS':
-        beg_ids, end_ids = get_id_from_geocoding_addresses(node_dict, way_dict, bbox)
-        beg_id = beg_ids[0]
-        end_id = end_ids[0]
-    
-    # get nodes for the beginning and end
-    print("Getting nodes")
-    beg = get_node_from_id(map_dict, node_dict, beg_id)
-    end = get_node_from_id(map_dict, node_dict, end_id)
+        # Every candidate near each address is tried in the same search, 
+        #   starting or ending further from the address costs the extra distance
+        # Addresses geocoded remotely are cached next to the map
+        geocoder = search_geocoder.Geocoder(search_geocoder.geocoding_cache_file_name(map_file)) if allow_remote else None
+        beg, end = get_candidates_from_geocoding_addresses(node_dict, way_dict, bbox,
+                                                           address_index=load_address_index(map_file),
+                                                           allow_remote=allow_remote, geocoder=geocoder)
     
-    if beg == None or end == None:
+    if not beg or not end:
         raise Exception("No beginning or end found")
     
     print("Solving")
-    map_problem = Map(node_dict, way_dict, bbox)
-    path = map_problem.search(beg,end)
+    map_problem = Map(node_dict, way_dict, bbox, graph, hierarchy, map_landmarks)
+    map_problem.collect_stats = "--stats" in flags
+    # --fastest minimizes the travel time instead of the distance (the hierarchy only answers the distance)
+    if "--fastest" in flags:
+        map_problem.cost_model = "time"
+        hierarchy = None
+    path = map_problem.search(beg, end, mode="ch" if hierarchy is not None else "astar",
+                              heuristic="landmarks" if map_landmarks is not None else "haversine")
+    if map_problem.stats is not None:
+        print(map_problem.stats)
     coord_ls = [(n.coordinate.lat, n.coordinate.lon) for n in path]
 
-    folium_test.make_map(coord_ls)
+    # Only the start and end are marked and the line is simplified, so long routes stay light
+    route_render.make_map([coord_ls])
         
 
 if __name__ == "__main__":
@@ -1,16 +1,187 @@
 # search_geocoder.py
-from geopy.geocoders import Nominatim
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import urllib.parse
+import urllib.request
+from address_index import normalize_address
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+USER_AGENT = "jsm_search_geocoder"
+
+# Nominatim's usage policy allows at most one request per second
+REQUESTS_PER_SECOND = 1.0
+
+# Requests in flight at once in a bulk lookup
+MAX_CONCURRENT_REQUESTS = 8
+
+# Seconds before a request to the geocoder is given up
+REQUEST_TIMEOUT = 10
+
+GEOCODING_CACHE_EXTENSION = ".geocoding"
+
+# Cached result of an address the geocoder could not find
+NOT_FOUND = ()
 
 
 class AddressNotFound(Exception):
     pass
 
 def address_to_coordinates(address: str) -> tuple:
-    '''Converts a string address to coordinates. If the address does not work, raise exception'''
-    
-    geolocator = Nominatim(user_agent="jsm_search_geocoder")
-    location = geolocator.geocode(address)
-    if not location:
-        raise AddressNotFound
-    return location.latitude, location.longitude
-    
\ No newline at end of file
+    '''Converts a string address to coordinates with Nominatim. If the address does not work, raise exception'''
+    global _default_geocoder
+    if _default_geocoder is None:
+        _default_geocoder = Geocoder()
+    return _default_geocoder.geocode(address)
+
+def resolve_address(address: str, address_index=None, allow_remote: bool = False, geocoder=None) -> tuple:
+    '''Converts a string address to coordinates with the offline address_index of the map.
+    Only asks the remote geocoder if the address is not in the index and allow_remote is set,
+    through geocoder (a Geocoder with its cache) if one is given.
+    If the address is not found, raise AddressNotFound'''
+    if address_index is not None:
+        point = address_index.lookup(address)
+        if point is not None:
+            return point.lat, point.lon
+    if not allow_remote:
+        raise AddressNotFound(f"Error: address not found: {address}")
+    if geocoder is not None:
+        return geocoder.geocode(address)
+    return address_to_coordinates(address)
+
+
+class GeocodingCache:
+    '''Persistent cache of geocoded addresses in an sqlite file, keyed by the normalized address.
+    Addresses the geocoder could not find are cached too, as NOT_FOUND.'''
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.connection = sqlite3.connect(file_name)
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS geocoded (address TEXT PRIMARY KEY, lat REAL, lon REAL)")
+
+    def get(self, address: str) -> tuple:
+        '''returns the cached (lat, lon) of the address, NOT_FOUND if it does not exist, None if it is not cached'''
+        row = self.connection.execute("SELECT lat, lon FROM geocoded WHERE address = ?",
+                                      (normalize_address(address),)).fetchone()
+        if row is None:
+            return None
+        # Addresses that were not found have no coordinates
+        return NOT_FOUND if row[0] is None else row
+
+    def put(self, address: str, coordinates: tuple) -> None:
+        '''caches the (lat, lon) of the address, or NOT_FOUND'''
+        lat, lon = coordinates if coordinates else (None, None)
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO geocoded VALUES (?, ?, ?)",
+                                    (normalize_address(address), lat, lon))
+
+    def close(self) -> None:
+        self.connection.close()
+
+class RateLimiter:
+    '''Spaces out requests so at most requests_per_second of them go through each second, 
+    whether they wait in asyncio tasks (wait) or in blocking calls (wait_blocking)'''
+    def __init__(self, requests_per_second: float):
+        if requests_per_second <= 0:
+            raise Exception("Error: requests_per_second must be positive")
+        self.interval = 1 / requests_per_second
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        '''Takes the next free slot, returns the seconds to wait for it'''
+        # Taking the slot before sleeping gives callers waiting at the same time different slots
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        return start - now
+
+    async def wait(self) -> None:
+        await asyncio.sleep(self.reserve())
+
+    def wait_blocking(self) -> None:
+        time.sleep(self.reserve())
+
+class Geocoder:
+    '''Geocodes addresses with a Nominatim compatible service at url, caching the results in cache_file if given.
+    Requests are rate limited to requests_per_second, across geocode and the concurrent lookups of geocode_many.'''
+    def __init__(self, cache_file: str = None, url: str = NOMINATIM_URL, requests_per_second: float = REQUESTS_PER_SECOND,
+                 max_concurrent_requests: int = MAX_CONCURRENT_REQUESTS):
+        self.cache = None if cache_file is None else GeocodingCache(cache_file)
+        self.url = url
+        self.limiter = RateLimiter(requests_per_second)
+        self.max_concurrent_requests = max_concurrent_requests
+        self.request_count = 0
+
+    def request(self, address: str) -> tuple:
+        '''Asks the service for the address, returns (lat, lon) or NOT_FOUND'''
+        self.request_count += 1
+        query = urllib.parse.urlencode({"q": address, "format": "json", "limit": 1})
+        request = urllib.request.Request(f"{self.url}?{query}", headers={"User-Agent": USER_AGENT})
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            results = json.load(response)
+        if not results:
+            return NOT_FOUND
+        return float(results[0]["lat"]), float(results[0]["lon"])
+
+    def geocode(self, address: str) -> tuple:
+        '''Converts a string address to coordinates, asking the service only if it is not cached.
+        If the address does not exist, raise AddressNotFound'''
+        coordinates = None if self.cache is None else self.cache.get(address)
+        if coordinates is None:
+            self.limiter.wait_blocking()
+            coordinates = self.request(address)
+            if self.cache is not None:
+                self.cache.put(address, coordinates)
+        if coordinates == NOT_FOUND:
+            raise AddressNotFound(f"Error: address not found: {address}")
+        return tuple(coordinates)
+
+    async def geocode_many_async(self, addresses: list) -> dict:
+        '''Geocodes many addresses concurrently, returns a dict of address -> (lat, lon), None if it does not exist.
+        Each distinct address not in the cache is requested once. If the request of an address fails (HTTP error,
+        timeout...) its value is the exception instead, it is not cached and the other addresses are still looked up.'''
+        results = dict()
+        missing = []
+        for address in dict.fromkeys(addresses):
+            coordinates = None if self.cache is None else self.cache.get(address)
+            if coordinates is None:
+                missing.append(address)
+            else:
+                results[address] = tuple(coordinates) or None
+
+        semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+
+        async def lookup(address: str) -> None:
+            async with semaphore:
+                await self.limiter.wait()
+                # The request blocks, run it on a thread so the others can go out meanwhile
+                try:
+                    coordinates = await asyncio.to_thread(self.request, address)
+                except Exception as e:
+                    results[address] = e
+                    return
+            if self.cache is not None:
+                self.cache.put(address, coordinates)
+            results[address] = coordinates or None
+
+        await asyncio.gather(*(lookup(address) for address in missing))
+        return results
+
+    def geocode_many(self, addresses: list) -> dict:
+        '''Blocking version of geocode_many_async'''
+        return asyncio.run(self.geocode_many_async(addresses))
+
+    def close(self) -> None:
+        if self.cache is not None:
+            self.cache.close()
+
+# Geocoder of address_to_coordinates, made when it is first used
+_default_geocoder = None
+
+def geocoding_cache_file_name(map_file: str) -> str:
+    '''returns the name of the geocoding cache file kept next to the map file'''
+    return map_file + GEOCODING_CACHE_EXTENSION
@@ -0,0 +1,61 @@
+# search_stats.py
+import time
+
+
+class SearchStats:
+    '''What one search did, collected by Map.search when Map.collect_stats is set.
+
+    popped: entries taken off the frontier, including stale ones skipped after a decrease-key
+    pushed: entries added to the frontier
+    decrease_keys: nodes already in the frontier that were reached again for less
+    duplicates: nodes reached again that were not improved (already explored or no cheaper)
+    stale_pops: popped entries that had been replaced by a decrease-key
+    pruned: nodes the bidirectional mode popped but did not expand, since no shorter path goes through them
+    peak_frontier: most live entries in the frontier(s) at once
+    explored: nodes expanded (for the ch mode, nodes settled in the hierarchy)
+    heuristic_evaluations: nodes the heuristic was computed for, each once per search direction
+    heuristic_lookups: heuristic values read for the nodes reached
+    phases: seconds spent in each phase of the search, in order
+    '''
+    def __init__(self, mode: str, heuristic: str):
+        self.mode = mode
+        self.heuristic = heuristic
+        self.popped = 0
+        self.pushed = 0
+        self.decrease_keys = 0
+        self.duplicates = 0
+        self.stale_pops = 0
+        self.pruned = 0
+        self.peak_frontier = 0
+        self.explored = 0
+        self.heuristic_evaluations = 0
+        self.heuristic_lookups = 0
+        self.cached = False
+        self.found = False
+        self.path_nodes = 0
+        self.phases = dict()
+        self._lap_time = time.perf_counter()
+
+    def lap(self, phase: str) -> None:
+        '''adds the time since the last lap (or the start of the search) to the given phase'''
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._lap_time
+        self._lap_time = now
+
+    def seconds(self) -> float:
+        return sum(self.phases.values())
+
+    def to_dict(self) -> dict:
+        stats = {key: value for key, value in self.__dict__.items() if not key.startswith("_")}
+        stats["phases"] = dict(self.phases)
+        stats["seconds"] = self.seconds()
+        return stats
+
+    def __str__(self):
+        lines = [f"Search stats ({self.mode}, {self.heuristic} heuristic)" + (", answered from cache" if self.cached else "")]
+        for key in ["found", "path_nodes", "popped", "pushed", "decrease_keys", "duplicates", "stale_pops",
+                    "pruned", "peak_frontier", "explored", "heuristic_evaluations", "heuristic_lookups"]:
+            lines.append(f"    {key:24}{getattr(self, key)}")
+        for phase, seconds in self.phases.items():
+            lines.append(f"    {phase + ' time':24}{seconds * 1000:.3f} ms")
+        return "\n".join(lines)
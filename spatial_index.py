@@ -0,0 +1,63 @@
+# spatial_index.py
+import math
+import numpy as np
+from geo import Point, KM_PER_DEGREE, haversine_to_many
+
+
+class GridIndex:
+    '''Uniform lat/lon grid over a list of points for radius queries.
+    Items are referred to by their position in the list the index was built from.'''
+    def __init__(self, points: list, cell_size: float):
+        # cell_size (in km) is the height of a cell, cells are as wide in degrees of longitude
+        #   as they are high in degrees of latitude scaled for the latitude of the points
+        if cell_size <= 0:
+            raise Exception("Error: cell_size must be positive")
+
+        self.points = points
+        self.lats = np.array([p.lat for p in points], dtype=np.float64)
+        self.lons = np.array([p.lon for p in points], dtype=np.float64)
+        self.lat_step = cell_size / KM_PER_DEGREE
+        max_abs_lat = max((abs(p.lat) for p in points), default=0)
+        self.lon_step = self.lat_step / max(math.cos(math.radians(max_abs_lat)), 1e-6)
+
+        # (row, col) -> positions of the points in the cell, in ascending order
+        self.cells = dict()
+        for i, point in enumerate(points):
+            self.cells.setdefault(self.cell(point), []).append(i)
+
+    def __len__(self):
+        return len(self.points)
+
+    def cell(self, point: Point) -> tuple:
+        '''returns the (row, col) of the cell the point is in'''
+        return math.floor(point.lat / self.lat_step), math.floor(point.lon / self.lon_step)
+
+    def candidates(self, point: Point, radius: float) -> list:
+        '''returns the positions of the points in the cells overlapping the bounding box of the circle
+        of radius (in km) around the point, in ascending order'''
+        delta_lat = radius / KM_PER_DEGREE
+        # Longitude degrees shrink towards the poles, use the latitude of the circle closest to a pole
+        widest_lat = min(abs(point.lat) + delta_lat, 90.0)
+        delta_lon = delta_lat / max(math.cos(math.radians(widest_lat)), 1e-6)
+
+        min_row, min_col = self.cell(Point(point.lat - delta_lat, point.lon - delta_lon))
+        max_row, max_col = self.cell(Point(point.lat + delta_lat, point.lon + delta_lon))
+
+        found = []
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                found.extend(self.cells.get((row, col), ()))
+        found.sort()
+        return found
+
+    def within(self, point: Point, radius: float) -> list:
+        '''returns (position, distance) of every point at most radius (in km) away from the point,
+        in the order the points were given'''
+        found = np.array(self.candidates(point, radius), dtype=np.int64)
+        distances = haversine_to_many(point, self.lats[found], self.lons[found])
+        inside = distances <= radius
+        return list(zip(found[inside].tolist(), distances[inside].tolist()))
+
+    def nearest(self, point: Point, k: int, radius: float) -> list:
+        '''returns (position, distance) of the k closest points at most radius (in km) away, closest first'''
+        return sorted(self.within(point, radius), key=lambda x: x[1])[:k]
@@ -0,0 +1,86 @@
+# test_address_index.py
+from address_index import *
+from search import load_osm_file, load_json_to_dict, load_map, load_address_index, Map
+import search_geocoder
+import os
+import shutil
+import tempfile
+import unittest
+
+TEST_OSM_FILE = "maps/nymap2.osm"
+TEST_JSON_FILE = "json_maps/nymap2_data.json"
+
+
+class NormalizeAddressTest(unittest.TestCase):
+    def test_normalizes_case_punctuation_and_abbreviations(self):
+        self.assertEqual(normalize_address("73, Jay Street"), "73 jay st")
+        self.assertEqual(normalize_address("175 Fifth  Avenue"), "175 5th ave")
+        
+    def test_address_needs_housenumber_and_street(self):
+        self.assertEqual(address_from_tags({"addr:housenumber": "73", "addr:street": "Jay Street"}), "73 Jay Street")
+        self.assertEqual(address_from_tags({"addr:street": "Jay Street"}), None)
+
+class AddressIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = AddressIndex()
+        load_osm_file(TEST_OSM_FILE, address_index=self.index)
+        
+    def test_lookup(self):
+        point = self.index.lookup("73 Jay Street")
+        self.assertTrue(point)
+        self.assertEqual(self.index.lookup("73 jay st."), point)
+        self.assertEqual(self.index.lookup("73 Jay St, Brooklyn, NY 11201"), point)
+        self.assertEqual(self.index.lookup("100000 Jay Street"), None)
+        
+    def test_complete_prefix(self):
+        found = self.index.complete("7", limit=100)
+        self.assertTrue(found)
+        self.assertTrue(all(address.startswith("7") for address, _ in found))
+        self.assertIn("73 jay st", [address for address, _ in found])
+        self.assertEqual(len(self.index.complete("7", limit=1)), 1)
+        
+    def test_json_map_has_same_addresses(self):
+        json_index = address_index_from_map_dict(load_json_to_dict(TEST_JSON_FILE))
+        self.assertEqual(json_index.keys(), self.index.keys())
+        for key in self.index.keys():
+            self.assertAlmostEqual(json_index.lookup(key).lat, self.index.lookup(key).lat)
+            
+    def test_offline_resolve(self):
+        point = self.index.lookup("73 Jay Street")
+        self.assertEqual(search_geocoder.resolve_address("73 Jay Street", self.index), (point.lat, point.lon))
+        with self.assertRaises(search_geocoder.AddressNotFound):
+            search_geocoder.resolve_address("100000 Jay Street", self.index)
+
+class AddressIndexFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.map_file = os.path.join(self.directory, "map.osm")
+        shutil.copy(TEST_OSM_FILE, self.map_file)
+        
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        
+    def test_load_map_writes_address_index(self):
+        load_map(self.map_file)
+        file_name = address_index_file_name(self.map_file)
+        self.assertTrue(os.path.exists(file_name))
+        index = read_address_index(file_name, self.map_file)
+        self.assertEqual(index.addresses, load_address_index(self.map_file).addresses)
+        self.assertTrue(index.lookup("73 Jay Street"))
+        
+    def test_missing_index_is_rebuilt(self):
+        index = load_address_index(self.map_file)
+        self.assertTrue(len(index) > 0)
+        self.assertTrue(os.path.exists(address_index_file_name(self.map_file)))
+        
+    def test_map_resolves_addresses(self):
+        node_dict, way_dict, bbox, graph = load_map(self.map_file)
+        map_problem = Map(node_dict, way_dict, bbox, graph)
+        map_problem.address_index = load_address_index(self.map_file)
+        self.assertTrue(map_problem.graph_index("73 Jay Street") >= 0)
+        with self.assertRaises(search_geocoder.AddressNotFound):
+            map_problem.graph_index("100000 Jay Street")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+# test_batch_route.py
+from batch_route import *
+from search import *
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+TEST_JSON_FILE = "json_maps/nymap3_data.json"
+
+
+class BatchRouteTest(unittest.TestCase):
+    def setUp(self):
+        # Work on a copy so the cache is not written into json_maps, and no local preprocessing is picked up
+        self.tmp_dir = tempfile.mkdtemp()
+        self.map_file = os.path.join(self.tmp_dir, os.path.basename(TEST_JSON_FILE))
+        shutil.copy(TEST_JSON_FILE, self.map_file)
+        self.map, self.mode, self.heuristic = load_routing_map(self.map_file)
+        self.start = 9805235577
+        self.goal = 42497720
+        
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        
+    def run_lines(self, lines, processes=1) -> list:
+        output = io.StringIO()
+        count = run_batch(self.map, lines, output, self.mode, self.heuristic, processes)
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(count, len(results))
+        return results
+        
+    def test_routes_node_ids(self):
+        result, = self.run_lines([json.dumps({"id": "a", "start": self.start, "goal": self.goal})])
+        path = self.map.search(self.map.node_dict[self.start], self.map.node_dict[self.goal])
+        self.assertEqual(result["id"], "a")
+        self.assertEqual(result["path"], [n.id for n in path])
+        self.assertAlmostEqual(result["length"], path_length(path))
+        self.assertEqual(result["stats"]["mode"], self.mode)
+        self.assertTrue(result["stats"]["expanded"] > 0)
+        
+    def test_routes_coordinates(self):
+        start = self.map.node_dict[self.start].coordinate
+        query = {"start": [start.lat, start.lon], "goal": self.goal}
+        result, = self.run_lines([json.dumps(query)])
+        # The id defaults to the line number
+        self.assertEqual(result["id"], 1)
+        self.assertEqual(result["path"][0], self.start)
+        
+    def test_reports_bad_queries(self):
+        lines = ["not json", "", json.dumps({"start": self.start}), json.dumps({"start": -1, "goal": self.goal})]
+        results = self.run_lines(lines)
+        self.assertEqual([r["id"] for r in results], [1, 3, 4])
+        self.assertTrue(all("error" in r for r in results))
+        
+    def test_worker_pool_gives_same_results(self):
+        ids = list(self.map.graph.ids)[:40]
+        lines = [json.dumps({"id": i, "start": s, "goal": g}) for i, (s, g) in enumerate(zip(ids, reversed(ids)))]
+        expected = self.run_lines(lines)
+        results = self.run_lines(lines, processes=2)
+        for r in expected + results:
+            r["stats"].pop("seconds")
+        self.assertEqual(sorted(results, key=lambda r: r["id"]), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+# test_benchmark.py
+from benchmark import *
+import unittest
+
+
+class GridMapTest(unittest.TestCase):
+    def test_grid_is_a_valid_map(self):
+        map_dict = grid_map_dict(5)
+        node_dict = search.create_node_dict(map_dict)
+        way_dict = search.create_way_dict(map_dict)
+        search.add_all_ways_to_nodes(way_dict, node_dict)
+        graph = compile_graph(node_dict, way_dict)
+        self.assertEqual(len(node_dict), 25)
+        self.assertEqual(len(way_dict), 10)
+        # 2 * 5 * 4 grid edges, in both directions
+        self.assertEqual(graph.edge_count(), 80)
+        bbox = search.get_bounding_box(map_dict)
+        self.assertTrue(all(bbox.check_inside(n.coordinate) for n in node_dict.values()))
+
+class BenchmarkTest(unittest.TestCase):
+    def test_benchmark_reports_every_stage(self):
+        results = run_benchmarks([], [6], points=3, searches=2)
+        stages = results["maps"]["grid6"]
+        for stage in ["load_json_to_dict", "create_node_dict", "create_way_dict", "add_all_ways_to_nodes",
+                      "coordinates_to_nodes", "search", "search_bidirectional"]:
+            self.assertTrue(stages[stage]["seconds"] >= 0)
+            self.assertTrue(stages[stage]["peak_kb"] >= 0)
+        self.assertEqual(stages["search"]["found"], 2)
+        self.assertTrue(stages["search"]["nodes_expanded"] > 0)
+        self.assertEqual(stages["search_bidirectional"]["found"], 2)
+        json.dumps(results)
+        
+    def test_compare(self):
+        results = {"maps": {"a": {"search": {"seconds": 2.0}, "map": {"nodes": 1}}}}
+        baseline = {"maps": {"a": {"search": {"seconds": 1.0}}}}
+        self.assertEqual(compare(results, baseline), [("a", "search", 2.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# test_contraction_hierarchy.py
+from contraction_hierarchy import *
+from search import *
+import preprocess
+import unittest
+import os
+import random
+import shutil
+import tempfile
+
+TEST_JSON_FILE = "json_maps/nymap3_data.json"
+
+
+class ContractionHierarchyTest(unittest.TestCase):
+    def setUp(self):
+        self.nodedict, self.waydict, self.bbox, self.graph = load_map(TEST_JSON_FILE, use_cache=False)
+        self.hierarchy = build_contraction_hierarchy(self.graph)
+        self.map = Map(self.nodedict, self.waydict, self.bbox, self.graph, self.hierarchy)
+        
+    def test_every_node_has_a_rank(self):
+        self.assertEqual(len(self.hierarchy), len(self.graph))
+        self.assertEqual(sorted(self.hierarchy.ranks), list(range(len(self.graph))))
+        
+    def test_upward_edges_go_up(self):
+        for u in range(len(self.hierarchy)):
+            for v, _, _ in self.hierarchy.upward(u):
+                self.assertTrue(self.hierarchy.ranks[u] < self.hierarchy.ranks[v])
+    
+    def test_ch_search_finds_solution(self):
+        ls = self.map.search(self.nodedict[9805235577], self.nodedict[7707712198], mode="ch")
+        expected = self.map.search(self.nodedict[9805235577], self.nodedict[7707712198])
+        self.assertEqual([n.id for n in ls], [n.id for n in expected])
+        
+    def test_ch_paths_are_shortest_and_unpacked(self):
+        routable = [n for n in self.nodedict.values() if any(self.waydict[w].highway_value for w in n.ways)]
+        rnd = random.Random(0)
+        for _ in range(100):
+            start, goal = rnd.choice(routable), rnd.choice(routable)
+            expected = self.map.search(start, goal)
+            ls = self.map.search(start, goal, mode="ch")
+            if expected is None:
+                self.assertTrue(ls is None)
+                continue
+            self.assertEqual(ls[0], start)
+            self.assertEqual(ls[-1], goal)
+            length = lambda p: sum(haversine(a.coordinate, b.coordinate) for a, b in zip(p, p[1:]))
+            self.assertAlmostEqual(length(ls), length(expected))
+            # Every step of the path is an edge of the original graph
+            for a, b in zip(ls, ls[1:]):
+                targets = [t for t, _ in self.graph.neighbors(self.graph.index[a.id])]
+                self.assertIn(self.graph.index[b.id], targets)
+        
+    def test_ch_search_without_hierarchy_raises_error(self):
+        with self.assertRaises(Exception):
+            Map(self.nodedict, self.waydict, self.bbox, self.graph).search(
+                self.nodedict[9805235577], self.nodedict[7707712198], mode="ch")
+            
+    def test_hierarchy_round_trips_through_file(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            map_file = os.path.join(tmp_dir, os.path.basename(TEST_JSON_FILE))
+            shutil.copy(TEST_JSON_FILE, map_file)
+            hierarchy_file = hierarchy_file_name(map_file)
+            write_contraction_hierarchy(hierarchy_file, map_file, self.hierarchy)
+            
+            hierarchy = read_contraction_hierarchy(hierarchy_file, map_file)
+            self.assertEqual(list(hierarchy.ranks), list(self.hierarchy.ranks))
+            self.assertEqual(list(hierarchy.weights), list(self.hierarchy.weights))
+            self.assertEqual(hierarchy.query(0, 5)[:2], self.hierarchy.query(0, 5)[:2])
+            
+            # A changed map makes the hierarchy stale
+            stat = os.stat(map_file)
+            os.utime(map_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            self.assertTrue(read_contraction_hierarchy(hierarchy_file, map_file) is None)
+        finally:
+            shutil.rmtree(tmp_dir)
+            
+    def test_simplified_graph_has_its_own_files(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            map_file = os.path.join(tmp_dir, os.path.basename(TEST_JSON_FILE))
+            shutil.copy(TEST_JSON_FILE, map_file)
+            files = preprocess.preprocess(map_file) + preprocess.preprocess(map_file, simplify=True)
+            self.assertEqual(len(set(files)), 4)
+            for simplify in [False, True]:
+                graph = load_map(map_file, simplify=simplify)[3]
+                self.assertTrue(load_hierarchy(map_file, graph) is not None)
+                self.assertTrue(load_landmarks(map_file, graph) is not None)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# test_cost_model.py
+from cost_model import *
+from search import *
+from routing_graph import dijkstra
+from landmarks import select_landmarks
+import unittest
+import random
+
+TEST_JSON_FILE = "json_maps/nymap3_data.json"
+
+
+class ParseMaxspeedTest(unittest.TestCase):
+    def test_parses_units(self):
+        self.assertEqual(parse_maxspeed("50"), 50)
+        self.assertEqual(parse_maxspeed("30 km/h"), 30)
+        self.assertAlmostEqual(parse_maxspeed("25 mph"), 25 * KMH_PER_MPH)
+        self.assertAlmostEqual(parse_maxspeed("10 knots"), 10 * KMH_PER_KNOT)
+        self.assertEqual(parse_maxspeed("50;30"), 50)
+
+    def test_non_numeric_speeds_are_none(self):
+        for value in [None, "none", "walk", "signals", "RU:urban", "", "0"]:
+            self.assertEqual(parse_maxspeed(value), None)
+
+class CostModelTest(unittest.TestCase):
+    def setUp(self):
+        self.nodedict, self.waydict, self.bbox, self.graph = load_map(TEST_JSON_FILE, use_cache=False)
+        self.map = Map(self.nodedict, self.waydict, self.bbox, self.graph,
+                       landmarks=select_landmarks(self.graph, 4))
+        self.routable = [n for n in self.nodedict.values() if any(self.waydict[w].highway_value for w in n.ways)]
+
+    def cost(self, path, model: str) -> float:
+        weights = get_cost_model(model).edge_weights(self.graph)
+        total = 0.0
+        for a, b in zip(path, path[1:]):
+            i, j = self.graph.index[a.id], self.graph.index[b.id]
+            total += next(w for t, w in self.graph.weighted_neighbors(i, weights) if t == j)
+        return total
+
+    def test_reads_maxspeed_tags(self):
+        self.assertTrue(any(way.maxspeed is not None for way in self.waydict.values()))
+        self.assertTrue(any(speed > 0 for speed in self.graph.maxspeeds))
+
+    def test_time_weights_use_maxspeed_or_highway_speed(self):
+        weights = get_cost_model("time").edge_weights(self.graph)
+        self.assertTrue(get_cost_model("time").edge_weights(self.graph) is weights)
+        for e in range(self.graph.edge_count()):
+            speed = self.graph.maxspeeds[e] or DEFAULT_SPEEDS[HIGHWAY_VALUES[self.graph.highway_classes[e]]]
+            self.assertAlmostEqual(weights[e], self.graph.lengths[e] / speed * SECONDS_PER_HOUR)
+        self.assertTrue(get_cost_model("distance").edge_weights(self.graph) is self.graph.lengths)
+
+    def test_fastest_route_is_optimal(self):
+        weights = get_cost_model("time").edge_weights(self.graph)
+        time_graph = RoutingGraph(self.graph.ids, self.graph.lats, self.graph.lons, self.graph.offsets,
+                                  self.graph.targets, weights)
+        self.map.cost_model = "time"
+        rnd = random.Random(0)
+        for _ in range(30):
+            start, goal = rnd.choice(self.routable), rnd.choice(self.routable)
+            distances = dijkstra(time_graph, [self.graph.index[start.id]])[0]
+            expected = distances[self.graph.index[goal.id]]
+            for mode in ["astar", "bidirectional"]:
+                for heuristic in HEURISTICS:
+                    path = self.map.search(start, goal, mode=mode, heuristic=heuristic)
+                    if expected == math.inf:
+                        self.assertTrue(path is None)
+                    else:
+                        self.assertAlmostEqual(self.cost(path, "time"), expected)
+
+    def test_fastest_and_shortest_routes_trade_off(self):
+        rnd = random.Random(1)
+        for _ in range(30):
+            start, goal = rnd.choice(self.routable), rnd.choice(self.routable)
+            self.map.cost_model = "distance"
+            shortest = self.map.search(start, goal)
+            self.map.cost_model = "time"
+            fastest = self.map.search(start, goal)
+            if shortest is None:
+                continue
+            self.assertTrue(self.cost(fastest, "time") <= self.cost(shortest, "time") + 1e-9)
+            self.assertTrue(path_length(shortest) <= path_length(fastest) + 1e-9)
+
+    def test_time_heuristic_is_admissible(self):
+        model = get_cost_model("time")
+        weights = model.edge_weights(self.graph)
+        scale = model.heuristic_scale(self.graph)
+        for e in range(self.graph.edge_count()):
+            self.assertTrue(self.graph.lengths[e] * scale <= weights[e] + 1e-12)
+
+    def test_heuristic_scale_is_computed_once_per_graph(self):
+        model = get_cost_model("time")
+        scale = model.heuristic_scale(self.graph)
+        self.assertEqual(self.graph.heuristic_scales["time"], scale)
+        self.graph.heuristic_scales["time"] = 2.0
+        self.assertEqual(model.heuristic_scale(self.graph), 2.0)
+
+    def test_cost_model_is_abstract(self):
+        with self.assertRaises(TypeError):
+            CostModel()
+
+    def test_contraction_hierarchy_only_answers_distance(self):
+        self.map.cost_model = "time"
+        with self.assertRaises(Exception):
+            self.map.search(self.routable[0], self.routable[1], mode="ch")
+
+    def test_unknown_cost_model_raises_error(self):
+        self.map.cost_model = "scenic"
+        with self.assertRaises(Exception):
+            self.map.search(self.routable[0], self.routable[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
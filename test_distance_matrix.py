@@ -0,0 +1,74 @@
+# test_distance_matrix.py
+from distance_matrix import *
+from search import *
+import unittest
+import random
+
+TEST_JSON_FILE = "json_maps/nymap3_data.json"
+
+
+class DistanceMatrixTest(unittest.TestCase):
+    def setUp(self):
+        self.nodedict, self.waydict, self.bbox, self.graph = load_map(TEST_JSON_FILE, use_cache=False)
+        self.map = Map(self.nodedict, self.waydict, self.bbox, self.graph)
+        routable = [n.id for n in self.nodedict.values() if any(self.waydict[w].highway_value for w in n.ways)]
+        rnd = random.Random(0)
+        self.origins = rnd.sample(routable, 4)
+        self.destinations = rnd.sample(routable, 5)
+        
+    def test_matrix_matches_searches(self):
+        matrix, paths = self.map.distance_matrix(self.origins, self.destinations)
+        self.assertTrue(paths is None)
+        self.assertEqual(len(matrix), 4)
+        for origin, row in zip(self.origins, matrix):
+            self.assertEqual(len(row), 5)
+            for destination, distance in zip(self.destinations, row):
+                ls = self.map.search(self.nodedict[origin], self.nodedict[destination])
+                if ls is None:
+                    self.assertEqual(distance, math.inf)
+                else:
+                    length = sum(haversine(a.coordinate, b.coordinate) for a, b in zip(ls, ls[1:]))
+                    self.assertAlmostEqual(distance, length)
+                    
+    def test_matrix_follows_the_cost_model(self):
+        self.map.cost_model = "time"
+        for processes in [1, 2]:
+            matrix, paths = self.map.distance_matrix(self.origins, self.destinations, with_paths=True,
+                                                     processes=processes)
+            for origin, row, row_paths in zip(self.origins, matrix, paths):
+                for destination, cost, path in zip(self.destinations, row, row_paths):
+                    ls = self.map.search(self.nodedict[origin], self.nodedict[destination])
+                    if ls is None:
+                        self.assertEqual(cost, math.inf)
+                        continue
+                    self.assertAlmostEqual(cost, self.map.path_cost)
+                    self.assertEqual(path[-1], destination)
+                    
+    def test_paths_connect_origins_and_destinations(self):
+        matrix, paths = self.map.distance_matrix(self.origins, self.destinations, with_paths=True)
+        for origin, row, row_paths in zip(self.origins, matrix, paths):
+            for destination, distance, path in zip(self.destinations, row, row_paths):
+                if distance == math.inf:
+                    self.assertTrue(path is None)
+                    continue
+                self.assertEqual(path[0], origin)
+                self.assertEqual(path[-1], destination)
+                length = sum(haversine(self.nodedict[a].coordinate, self.nodedict[b].coordinate) for a, b in zip(path, path[1:]))
+                self.assertAlmostEqual(distance, length)
+                
+    def test_process_pool_gives_same_matrix(self):
+        expected = self.map.distance_matrix(self.origins, self.destinations, with_paths=True)
+        self.assertEqual(self.map.distance_matrix(self.origins, self.destinations, with_paths=True, processes=2), expected)
+        
+    def test_coordinates_are_snapped(self):
+        node = self.nodedict[9805235577]
+        matrix, _ = self.map.distance_matrix([(node.coordinate.lat, node.coordinate.lon)], [9805235577])
+        self.assertEqual(matrix, [[0.0]])
+        
+    def test_raises_error_on_unknown_id(self):
+        with self.assertRaises(Exception):
+            self.map.distance_matrix([-1], self.destinations)
+
+
+if __name__ == '__main__':
+    unittest.main()
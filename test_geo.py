@@ -0,0 +1,39 @@
+# test_geo.py
+from geo import *
+import unittest
+import random
+
+
+class HaversineTest(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(0)
+        self.points = [Point(rnd.uniform(-80, 80), rnd.uniform(-180, 180)) for i in range(200)]
+        self.origin = Point(40.693, -73.987)
+        
+    def test_to_many_agrees_with_scalar(self):
+        lats = [p.lat for p in self.points]
+        lons = [p.lon for p in self.points]
+        distances = haversine_to_many(self.origin, lats, lons)
+        self.assertEqual(len(distances), len(self.points))
+        for p, d in zip(self.points, distances):
+            self.assertAlmostEqual(d, haversine(self.origin, p), delta=1e-9)
+            
+    def test_pairwise_agrees_with_scalar(self):
+        first = self.points[:100]
+        second = self.points[100:]
+        distances = haversine_pairwise([p.lat for p in first], [p.lon for p in first],
+                                       [p.lat for p in second], [p.lon for p in second])
+        for p1, p2, d in zip(first, second, distances):
+            self.assertAlmostEqual(d, haversine(p1, p2), delta=1e-9)
+            
+    def test_known_distance(self):
+        p1 = Point(51.510357, -0.116773)
+        p2 = Point(38.889931, -77.009003)
+        self.assertAlmostEqual(5897.658, round(float(haversine_to_many(p1, [p2.lat], [p2.lon])[0]), 3))
+        
+    def test_same_point_is_zero(self):
+        self.assertEqual(haversine_to_many(self.origin, [self.origin.lat], [self.origin.lon])[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+# test_geocoding_cache.py
+from search_geocoder import *
+import http.server
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.parse
+
+# Addresses the stand-in geocoder knows
+KNOWN_ADDRESSES = {
+    "73 jay street": (40.7026, -73.9866),
+    "100 front street": (40.7025, -73.9870),
+    "175 5th avenue": (40.7411, -73.9897),
+}
+
+# Address the stand-in geocoder answers with a server error
+FAILING_ADDRESS = "500 error street"
+
+
+class StandInGeocoder(http.server.BaseHTTPRequestHandler):
+    '''Answers /search?q=... like Nominatim from KNOWN_ADDRESSES'''
+    requests = []
+    
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        address = query["q"][0]
+        StandInGeocoder.requests.append((address, time.monotonic()))
+        if address.lower() == FAILING_ADDRESS:
+            self.send_error(500)
+            return
+        coordinates = KNOWN_ADDRESSES.get(address.lower())
+        results = [] if coordinates is None else [{"lat": str(coordinates[0]), "lon": str(coordinates[1])}]
+        body = json.dumps(results).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        
+    def log_message(self, *args):
+        pass
+
+class GeocoderTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandInGeocoder)
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/search"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        
+    def setUp(self):
+        StandInGeocoder.requests = []
+        self.directory = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.directory, "map.geocoding")
+        
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        
+    def geocoder(self, requests_per_second=1000.0):
+        return Geocoder(self.cache_file, self.url, requests_per_second)
+        
+    def test_geocode_caches_results(self):
+        geocoder = self.geocoder()
+        self.assertEqual(geocoder.geocode("73 Jay Street"), KNOWN_ADDRESSES["73 jay street"])
+        self.assertEqual(geocoder.geocode("73 jay street."), KNOWN_ADDRESSES["73 jay street"])
+        self.assertEqual(geocoder.request_count, 1)
+        geocoder.close()
+        
+    def test_caches_not_found(self):
+        geocoder = self.geocoder()
+        for _ in range(2):
+            with self.assertRaises(AddressNotFound):
+                geocoder.geocode("10000000000000 5th Avenue")
+        self.assertEqual(geocoder.request_count, 1)
+        geocoder.close()
+        
+    def test_cache_persists(self):
+        geocoder = self.geocoder()
+        geocoder.geocode("73 Jay Street")
+        geocoder.close()
+        
+        geocoder = self.geocoder()
+        self.assertEqual(geocoder.geocode("73 Jay Street"), KNOWN_ADDRESSES["73 jay street"])
+        self.assertEqual(geocoder.request_count, 0)
+        geocoder.close()
+        
+    def test_geocode_many(self):
+        geocoder = self.geocoder()
+        geocoder.geocode("73 Jay Street")
+        addresses = ["73 Jay Street", "100 Front Street", "175 5th Avenue", "100 Front Street", "1 Nowhere Road"]
+        results = geocoder.geocode_many(addresses)
+        self.assertEqual(results, {"73 Jay Street": KNOWN_ADDRESSES["73 jay street"],
+                                   "100 Front Street": KNOWN_ADDRESSES["100 front street"],
+                                   "175 5th Avenue": KNOWN_ADDRESSES["175 5th avenue"],
+                                   "1 Nowhere Road": None})
+        # Cached and repeated addresses are not requested again
+        self.assertEqual(sorted(a for a, _ in StandInGeocoder.requests),
+                         ["1 Nowhere Road", "100 Front Street", "175 5th Avenue", "73 Jay Street"])
+        self.assertEqual(geocoder.geocode_many(addresses), results)
+        self.assertEqual(geocoder.request_count, 4)
+        geocoder.close()
+        
+    def test_geocode_many_respects_rate_limit(self):
+        geocoder = Geocoder(None, self.url, requests_per_second=20.0)
+        addresses = [f"{n} Jay Street" for n in range(7)]
+        geocoder.geocode_many(addresses)
+        times = sorted(t for _, t in StandInGeocoder.requests)
+        self.assertEqual(len(times), 7)
+        # The first request also waits for the worker thread to start, so measure from the second:
+        #   the other 6 requests at 20 per second take at least 5 intervals of 0.05s
+        self.assertGreaterEqual(times[-1] - times[1], 0.24)
+        
+    def test_geocode_many_keeps_results_when_a_request_fails(self):
+        geocoder = self.geocoder()
+        results = geocoder.geocode_many(["73 Jay Street", FAILING_ADDRESS, "100 Front Street"])
+        self.assertEqual(results["73 Jay Street"], KNOWN_ADDRESSES["73 jay street"])
+        self.assertEqual(results["100 Front Street"], KNOWN_ADDRESSES["100 front street"])
+        self.assertTrue(isinstance(results[FAILING_ADDRESS], urllib.error.HTTPError))
+        # The failure is not cached, the address is asked again
+        geocoder.geocode_many([FAILING_ADDRESS])
+        self.assertEqual(geocoder.request_count, 4)
+        geocoder.close()
+        
+    def test_blocking_and_bulk_lookups_share_the_rate_limit(self):
+        geocoder = Geocoder(None, self.url, requests_per_second=10.0)
+        geocoder.geocode("73 Jay Street")
+        geocoder.geocode_many(["100 Front Street"])
+        geocoder.geocode("175 5th Avenue")
+        times = [t for _, t in StandInGeocoder.requests]
+        self.assertGreaterEqual(times[1] - times[0], 0.09)
+        self.assertGreaterEqual(times[2] - times[1], 0.09)
+        
+    def test_resolve_address_uses_geocoder_only_if_allowed(self):
+        geocoder = self.geocoder()
+        with self.assertRaises(AddressNotFound):
+            resolve_address("73 Jay Street", geocoder=geocoder)
+        self.assertEqual(resolve_address("73 Jay Street", allow_remote=True, geocoder=geocoder),
+                         KNOWN_ADDRESSES["73 jay street"])
+        geocoder.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
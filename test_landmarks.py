@@ -0,0 +1,83 @@
+# test_landmarks.py
+from landmarks import *
+from search import *
+import unittest
+import os
+import random
+import shutil
+import tempfile
+
+TEST_JSON_FILE = "json_maps/nymap3_data.json"
+
+
+class LandmarksTest(unittest.TestCase):
+    def setUp(self):
+        self.nodedict, self.waydict, self.bbox, self.graph = load_map(TEST_JSON_FILE, use_cache=False)
+        self.landmarks = select_landmarks(self.graph, 4)
+        self.map = Map(self.nodedict, self.waydict, self.bbox, self.graph, landmarks=self.landmarks)
+        
+    def test_picks_distinct_landmarks(self):
+        self.assertEqual(len(self.landmarks), 4)
+        self.assertEqual(len(set(self.landmarks.nodes)), 4)
+        self.assertEqual(self.landmarks.matrix.shape, (4, len(self.graph)))
+        
+    def test_lower_bounds_are_admissible(self):
+        rnd = random.Random(0)
+        for target in rnd.sample(range(len(self.graph)), 10):
+            distances = dijkstra(self.graph, [target])[0]
+            bounds = self.landmarks.lower_bounds(target)
+            for d, bound in zip(distances, bounds):
+                self.assertTrue(bound >= 0)
+                self.assertTrue(bound <= d + 1e-12)
+    
+    def test_lower_bound_of_one_node_matches_lower_bounds(self):
+        rnd = random.Random(2)
+        for target in rnd.sample(range(len(self.graph)), 5):
+            bounds = self.landmarks.lower_bounds(target)
+            for node in rnd.sample(range(len(self.graph)), 20):
+                self.assertAlmostEqual(self.landmarks.lower_bound(node, target), float(bounds[node]), places=4)
+            
+    def test_landmark_search_finds_shortest_path(self):
+        routable = [n for n in self.nodedict.values() if any(self.waydict[w].highway_value for w in n.ways)]
+        rnd = random.Random(1)
+        length = lambda p: sum(haversine(a.coordinate, b.coordinate) for a, b in zip(p, p[1:]))
+        for _ in range(50):
+            start, goal = rnd.choice(routable), rnd.choice(routable)
+            expected = self.map.search(start, goal)
+            for mode in ["astar", "bidirectional"]:
+                ls = self.map.search(start, goal, mode=mode, heuristic="landmarks")
+                if expected is None:
+                    self.assertTrue(ls is None)
+                else:
+                    self.assertAlmostEqual(length(ls), length(expected))
+                    
+    def test_landmark_heuristic_expands_fewer_nodes(self):
+        start = self.nodedict[9805235577]
+        goal = self.nodedict[7707712198]
+        self.map.search(start, goal)
+        haversine_count = self.map.expanded_count
+        self.map.search(start, goal, heuristic="landmarks")
+        self.assertTrue(self.map.expanded_count <= haversine_count)
+                    
+    def test_landmark_search_without_landmarks_raises_error(self):
+        with self.assertRaises(Exception):
+            Map(self.nodedict, self.waydict, self.bbox, self.graph).search(
+                self.nodedict[9805235577], self.nodedict[7707712198], heuristic="landmarks")
+            
+    def test_landmarks_round_trip_through_file(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            map_file = os.path.join(tmp_dir, os.path.basename(TEST_JSON_FILE))
+            shutil.copy(TEST_JSON_FILE, map_file)
+            landmarks_file = landmarks_file_name(map_file)
+            write_landmarks(landmarks_file, map_file, self.landmarks)
+            
+            map_landmarks = read_landmarks(landmarks_file, map_file)
+            self.assertEqual(list(map_landmarks.nodes), list(self.landmarks.nodes))
+            self.assertTrue((map_landmarks.lower_bounds(3) == self.landmarks.lower_bounds(3)).all())
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
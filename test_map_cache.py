@@ -0,0 +1,106 @@
+# test_map_cache.py
+from map_cache import *
+from search import *
+from routing_graph import compile_graph, connected_components
+import unittest
+import os
+import pickle
+import shutil
+import tempfile
+
+TEST_JSON_FILE = "json_maps/nymap3_data.json"
+
+
+class MapCacheTest(unittest.TestCase):
+    def setUp(self):
+        # Work on a copy so the cache is not written into json_maps
+        self.tmp_dir = tempfile.mkdtemp()
+        self.map_file = os.path.join(self.tmp_dir, os.path.basename(TEST_JSON_FILE))
+        shutil.copy(TEST_JSON_FILE, self.map_file)
+        self.cache_file = cache_file_name(self.map_file)
+        self.nodedict, self.waydict, self.bbox, self.graph = load_map(self.map_file)
+        
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        
+    def test_first_load_writes_cache(self):
+        self.assertTrue(os.path.exists(self.cache_file))
+        self.assertTrue(self.cache_file.endswith(CACHE_EXTENSION))
+        
+    def test_cache_round_trips_graph(self):
+        cache = read_map_cache(self.cache_file, self.map_file)
+        self.assertTrue(type(cache) == MapCache)
+        for name in ["ids", "lats", "lons", "offsets", "targets", "lengths", "highway_classes", "maxspeeds"]:
+            self.assertEqual(list(getattr(cache.graph, name)), list(getattr(self.graph, name)))
+        self.assertEqual(cache.bbox, (self.bbox.minlat, self.bbox.minlon, self.bbox.maxlat, self.bbox.maxlon))
+    
+    def test_cached_load_matches_uncached_load(self):
+        node_dict, way_dict, bbox, graph = load_map(self.map_file)
+        self.assertTrue(type(graph.ids) == memoryview)
+        self.assertEqual(node_dict, self.nodedict)
+        self.assertEqual(way_dict.keys(), self.waydict.keys())
+        for way_id, way in way_dict.items():
+            self.assertEqual(way.nodes, self.waydict[way_id].nodes)
+            self.assertEqual(way.highway_value, self.waydict[way_id].highway_value)
+            if self.waydict[way_id].maxspeed is None:
+                self.assertEqual(way.maxspeed, None)
+            else:
+                self.assertAlmostEqual(way.maxspeed, self.waydict[way_id].maxspeed, places=4)
+        
+        path = Map(node_dict, way_dict, bbox, graph).search(node_dict[9805235577], node_dict[7707712198])
+        expected = Map(self.nodedict, self.waydict, self.bbox).search(self.nodedict[9805235577], self.nodedict[7707712198])
+        self.assertEqual([n.id for n in path], [n.id for n in expected])
+        
+    def test_stale_cache_is_not_used(self):
+        stat = os.stat(self.map_file)
+        os.utime(self.map_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertTrue(read_map_cache(self.cache_file, self.map_file) is None)
+        
+        # Loading again rebuilds it
+        load_map(self.map_file)
+        self.assertTrue(read_map_cache(self.cache_file, self.map_file) is not None)
+        
+    def test_damaged_cache_is_not_used(self):
+        with open(self.cache_file, "r+b") as file:
+            file.seek(-1, os.SEEK_END)
+            last = file.read(1)
+            file.seek(-1, os.SEEK_END)
+            file.write(bytes([last[0] ^ 0xFF]))
+        self.assertTrue(read_map_cache(self.cache_file, self.map_file, verify=True) is None)
+        # The checksum is only checked when asked for, opening the cache does not read all of it
+        self.assertTrue(read_map_cache(self.cache_file, self.map_file) is not None)
+        
+    def test_truncated_cache_is_not_used(self):
+        with open(self.cache_file, "r+b") as file:
+            file.truncate(os.path.getsize(self.cache_file) - 8)
+        self.assertTrue(read_map_cache(self.cache_file, self.map_file) is None)
+        
+    def test_cache_keeps_the_map_extension(self):
+        self.assertNotEqual(cache_file_name("maps/foo.osm"), cache_file_name("maps/foo.json"))
+        
+    def test_cache_stores_components(self):
+        cache = read_map_cache(self.cache_file, self.map_file)
+        self.assertEqual(type(cache.graph.components), memoryview)
+        self.assertEqual(list(cache.graph.components), list(connected_components(compile_graph(self.nodedict, self.waydict))))
+        
+    def test_cached_nodes_are_looked_up_from_the_arrays(self):
+        node_dict, way_dict, _, _ = load_map(self.map_file)
+        self.assertEqual(type(node_dict), CachedNodeDict)
+        self.assertEqual(len(node_dict), len(self.nodedict))
+        self.assertTrue(9805235577 in node_dict)
+        self.assertFalse(-1 in node_dict)
+        with self.assertRaises(KeyError):
+            node_dict[-1]
+        self.assertEqual(node_dict[9805235577], self.nodedict[9805235577])
+        # Maps opened from the cache are pickled into pool workers
+        self.assertEqual(pickle.loads(pickle.dumps(node_dict))[9805235577], self.nodedict[9805235577])
+        way_id = next(iter(self.waydict))
+        self.assertEqual(pickle.loads(pickle.dumps(way_dict))[way_id].nodes, self.waydict[way_id].nodes)
+        
+    def test_missing_cache(self):
+        os.remove(self.cache_file)
+        self.assertTrue(read_map_cache(self.cache_file, self.map_file) is None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,17 @@
+# test_memory_report.py
+from memory_report import *
+import unittest
+
+TEST_JSON_FILE = "json_maps/nymap2_data.json"
+
+
+class MemoryReportTest(unittest.TestCase):
+    def test_compact_layout_is_smaller(self):
+        report = memory_report(search.load_json_to_dict(TEST_JSON_FILE))
+        self.assertEqual(report["compact"]["nodes"], report["legacy"]["nodes"])
+        for key in ["bytes_per_node", "bytes_per_way"]:
+            self.assertTrue(0 < report["compact"][key] < report["legacy"][key])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+# test_osm_loader.py
+from osm_loader import *
+from search import *
+import unittest
+
+TEST_OSM_FILE = "maps/nymap3.osm"
+TEST_JSON_FILE = "json_maps/nymap3_data.json"
+
+
+class IterOsmElementsTest(unittest.TestCase):
+    def test_yields_bounds_nodes_and_ways(self):
+        kinds = set()
+        for element in iter_osm_elements(TEST_OSM_FILE):
+            kinds.add(element[0])
+            if element[0] == "way":
+                self.assertTrue(type(element[2]) == list)
+                self.assertTrue(type(element[3]) == dict)
+        self.assertEqual(kinds, {"bounds", "node", "way"})
+
+class LoadOsmFileTest(unittest.TestCase):
+    def setUp(self):
+        mapdict = load_json_to_dict(TEST_JSON_FILE)
+        self.nodedict = create_node_dict(mapdict)
+        self.waydict = create_way_dict(mapdict)
+        self.bbox = get_bounding_box(mapdict)
+        add_all_ways_to_nodes(self.waydict, self.nodedict)
+
+    def test_matches_json_loading(self):
+        node_dict, way_dict, bbox = load_osm_file(TEST_OSM_FILE, routable_only=False)
+        self.assertEqual(node_dict, self.nodedict)
+        self.assertEqual(way_dict.keys(), self.waydict.keys())
+        for way_id, way in way_dict.items():
+            self.assertEqual(way.nodes, self.waydict[way_id].nodes)
+            self.assertEqual(way.highway_value, self.waydict[way_id].highway_value)
+        self.assertEqual(repr(bbox), repr(self.bbox))
+
+    def test_routable_only_keeps_highway_ways_and_their_nodes(self):
+        node_dict, way_dict, bbox = load_osm_file(TEST_OSM_FILE)
+        highway_ids = {w.id for w in self.waydict.values() if w.highway_value is not None}
+        self.assertEqual(set(way_dict.keys()), highway_ids)
+        self.assertTrue(len(node_dict) < len(self.nodedict))
+        for node_id, node in node_dict.items():
+            self.assertEqual(node.coordinate, self.nodedict[node_id].coordinate)
+            self.assertTrue(node.ways)
+
+    def test_search_matches_json_loading(self):
+        node_dict, way_dict, bbox = load_osm_file(TEST_OSM_FILE)
+        path = Map(node_dict, way_dict, bbox).search(node_dict[9805235577], node_dict[7707712198])
+        expected = Map(self.nodedict, self.waydict, self.bbox).search(self.nodedict[9805235577], self.nodedict[7707712198])
+        self.assertEqual([n.id for n in path], [n.id for n in expected])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# test_pbf_loader.py
+from pbf_loader import *
+from osm_loader import iter_osm_elements
+from search import *
+import unittest
+import os
+import shutil
+import tempfile
+
+TEST_OSM_FILES = ["maps/nymap2.osm", "maps/nymap3.osm"]
+
+# Small blocks so the fixtures span several of them
+TEST_BLOCK_SIZE = 500
+
+
+class PbfLoaderTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pbf_files = []
+        for osm_file in TEST_OSM_FILES:
+            pbf_file = os.path.join(self.directory, os.path.basename(osm_file) + ".pbf")
+            write_pbf(pbf_file, iter_osm_elements(osm_file), TEST_BLOCK_SIZE)
+            self.pbf_files.append(pbf_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_yields_the_same_elements_as_the_xml(self):
+        for osm_file, pbf_file in zip(TEST_OSM_FILES, self.pbf_files):
+            expected = list(iter_osm_elements(osm_file))
+            self.assertEqual(list(iter_pbf_elements(pbf_file, processes=1)), expected)
+            self.assertEqual(list(iter_pbf_elements(pbf_file, processes=3)), expected)
+
+    def test_loads_the_same_graph_as_the_xml(self):
+        for osm_file, pbf_file in zip(TEST_OSM_FILES, self.pbf_files):
+            node_dict, way_dict, bbox, graph = load_map(osm_file, use_cache=False)
+            pbf_node_dict, pbf_way_dict, pbf_bbox, pbf_graph = load_map(pbf_file, use_cache=False)
+            self.assertEqual(pbf_node_dict, node_dict)
+            self.assertEqual(pbf_way_dict.keys(), way_dict.keys())
+            self.assertEqual(repr(pbf_bbox), repr(bbox))
+            for name in ["ids", "lats", "lons", "offsets", "targets", "lengths", "highway_classes", "maxspeeds"]:
+                self.assertEqual(list(getattr(pbf_graph, name)), list(getattr(graph, name)))
+
+    def test_loads_the_addresses_of_the_map(self):
+        osm_addresses = AddressIndex()
+        load_osm_file(TEST_OSM_FILES[1], address_index=osm_addresses)
+        pbf_addresses = AddressIndex()
+        load_osm_file(self.pbf_files[1], address_index=pbf_addresses, processes=1)
+        self.assertEqual(pbf_addresses.keys(), osm_addresses.keys())
+
+    def test_round_trips_negative_coordinates_and_tags(self):
+        elements = [("bounds", -33.9, 151.1, -33.8, 151.3),
+                    ("node", 1, -33.8688197, 151.2092955, {"name": "Sydney", "highway": "traffic_signals"}),
+                    ("node", 5000000000, -33.85, 151.2, {}),
+                    ("node", 3, -33.86, 151.25, {"name:ja": "シドニー"}),
+                    ("way", 7, [5000000000, 1, 3], {"highway": "primary"}),
+                    ("way", 8, [3, 1], {})]
+        pbf_file = os.path.join(self.directory, "sydney.osm.pbf")
+        write_pbf(pbf_file, elements, block_size=2)
+        self.assertEqual(list(iter_pbf_elements(pbf_file, processes=1)), elements)
+
+    def test_refuses_unsupported_features(self):
+        header = encode_header_block(["OsmSchema-V0.6", "HistoricalInformation"])
+        with self.assertRaises(Exception):
+            decode_header_block(header)
+
+    def test_truncated_file_raises_error(self):
+        pbf_file = os.path.join(self.directory, "truncated.osm.pbf")
+        with open(self.pbf_files[0], "rb") as file:
+            data = file.read()
+        with open(pbf_file, "wb") as file:
+            file.write(data[:len(data) // 2])
+        with self.assertRaises(Exception):
+            list(iter_pbf_elements(pbf_file, processes=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# test_route_cache.py
+from route_cache import *
+from search import *
+import math
+import os
+import sqlite3
+import shutil
+import tempfile
+import unittest
+
+TEST_JSON_FILE = "json_maps/nymap3_data.json"
+
+
+class RouteCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.map_file = os.path.join(self.directory, "map.json")
+        shutil.copy(TEST_JSON_FILE, self.map_file)
+        
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        
+    def test_lru_evicts_least_recently_used(self):
+        cache = RouteCache("hash", capacity=2)
+        cache.put(1, 2, "distance", [1, 2], 1.0)
+        cache.put(2, 3, "distance", [2, 3], 1.0)
+        self.assertEqual(cache.get(1, 2, "distance"), (1.0, [1, 2]))
+        cache.put(3, 4, "distance", [3, 4], 1.0)
+        self.assertEqual(cache.get(2, 3, "distance"), None)
+        self.assertEqual(cache.get(1, 2, "distance"), (1.0, [1, 2]))
+        self.assertEqual(cache.stats(), {"hits": 2, "disk_hits": 0, "misses": 1, "size": 2})
+        
+    def test_key_includes_cost_model(self):
+        cache = RouteCache("hash")
+        cache.put(1, 2, "distance", [1, 2], 1.0)
+        self.assertEqual(cache.get(1, 2, "time"), None)
+        self.assertEqual(cache.get(2, 1, "distance"), None)
+        
+    def test_disk_tier_persists(self):
+        cache = open_route_cache(self.map_file, persistent=True)
+        cache.put(1, 2, "distance", [1, 5, 2], 2.5)
+        cache.put(1, 3, "distance", [], math.inf)
+        cache.close()
+        
+        cache = open_route_cache(self.map_file, persistent=True)
+        self.assertEqual(cache.get(1, 2, "distance"), (2.5, [1, 5, 2]))
+        self.assertEqual(cache.get(1, 3, "distance"), (math.inf, []))
+        self.assertEqual(cache.disk_hits, 2)
+        cache.close()
+        
+    def test_changed_map_invalidates_routes(self):
+        cache = open_route_cache(self.map_file, persistent=True)
+        cache.put(1, 2, "distance", [1, 2], 1.0)
+        cache.close()
+        
+        with open(self.map_file, "a") as file:
+            file.write(" ")
+        cache = open_route_cache(self.map_file, persistent=True)
+        self.assertEqual(cache.get(1, 2, "distance"), None)
+        cache.close()
+        
+    def test_map_search_uses_cache(self):
+        node_dict, way_dict, bbox, graph = load_map(self.map_file, use_cache=False)
+        map_problem = Map(node_dict, way_dict, bbox, graph)
+        map_problem.route_cache = open_route_cache(self.map_file)
+        start, goal = node_dict[9805235577], node_dict[42497720]
+        
+        path = map_problem.search(start, goal)
+        self.assertFalse(map_problem.cache_hit)
+        self.assertEqual(map_problem.search(start, goal), path)
+        self.assertTrue(map_problem.cache_hit)
+        self.assertEqual(map_problem.expanded_count, 0)
+        self.assertEqual(map_problem.route_cache.stats()["hits"], 1)
+        
+    def test_cached_route_sets_path_cost(self):
+        node_dict, way_dict, bbox, graph = load_map(self.map_file, use_cache=False)
+        map_problem = Map(node_dict, way_dict, bbox, graph)
+        map_problem.route_cache = open_route_cache(self.map_file)
+        start, goal = node_dict[9805235577], node_dict[42497720]
+        
+        map_problem.search(start, goal)
+        cost = map_problem.path_cost
+        # Node 42464631 is in another component, the search in between leaves an infinite path cost
+        self.assertEqual(map_problem.search(start, node_dict[42464631]), None)
+        self.assertEqual(map_problem.path_cost, math.inf)
+        map_problem.search(start, goal)
+        self.assertTrue(map_problem.cache_hit)
+        self.assertEqual(map_problem.path_cost, cost)
+        
+    def test_disk_tier_of_older_version_is_dropped(self):
+        file_name = route_cache_file_name(self.map_file)
+        connection = sqlite3.connect(file_name)
+        connection.execute("CREATE TABLE routes (map_hash TEXT, start INTEGER, goal INTEGER, cost_model TEXT, "
+                           "path TEXT, PRIMARY KEY (map_hash, start, goal, cost_model))")
+        connection.commit()
+        connection.close()
+        
+        cache = RouteCache(map_content_hash(self.map_file), file_name=file_name)
+        self.assertEqual(cache.get(1, 2, "distance"), None)
+        cache.put(1, 2, "distance", [1, 2], 1.0)
+        self.assertEqual(cache.get(1, 2, "distance"), (1.0, [1, 2]))
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# test_route_render.py
+from route_render import *
+from geo import haversine, Point
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class SimplifyTest(unittest.TestCase):
+    def test_drops_points_on_a_straight_line(self):
+        route = [(40.70 + i * 0.001, -73.98) for i in range(10)]
+        self.assertEqual(simplify(route), [route[0], route[-1]])
+        
+    def test_keeps_corners(self):
+        route = [(40.70, -73.98), (40.70, -73.97), (40.71, -73.97)]
+        self.assertEqual(simplify(route), route)
+        
+    def test_simplified_route_stays_within_tolerance(self):
+        # A zigzag of 1 m next to a line, then a turn
+        route = [(40.70 + i * 0.0005, -73.98 + (i % 2) * 0.00001) for i in range(20)] + [(40.71, -73.99)]
+        simplified = simplify(route, 0.005)
+        self.assertEqual(simplified, [route[0], route[-2], route[-1]])
+        self.assertEqual(simplify(route, 0), route)
+        
+    def test_short_routes_are_kept(self):
+        self.assertEqual(simplify([(1.0, 2.0)]), [(1.0, 2.0)])
+
+class PolylineTest(unittest.TestCase):
+    def test_known_encoding(self):
+        route = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+        self.assertEqual(encode_polyline(route), "_p~iF~ps|U_ulLnnqC_mqNvxq`@")
+        
+    def test_round_trip(self):
+        route = [(40.70135, -73.98684), (40.70383, -73.98455), (40.7, -73.99)]
+        self.assertEqual(decode_polyline(encode_polyline(route)), route)
+
+class RouteRendererTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.renderer = RouteRenderer()
+        self.renderer.add([Point(40.70, -73.98), Point(40.701, -73.98), Point(40.702, -73.98)], "a")
+        self.renderer.add([(40.70, -73.97), (40.71, -73.97)], "b")
+        
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        
+    def test_geojson(self):
+        file_name = os.path.join(self.directory, "routes.geojson")
+        self.renderer.save(file_name, "geojson")
+        with open(file_name) as file:
+            geojson = json.load(file)
+        self.assertEqual(len(geojson["features"]), 2)
+        self.assertEqual(geojson["features"][0]["properties"]["name"], "a")
+        self.assertEqual(geojson["features"][0]["geometry"]["coordinates"], [[-73.98, 40.70], [-73.98, 40.702]])
+        
+    def test_polyline(self):
+        file_name = os.path.join(self.directory, "routes.txt")
+        self.renderer.save(file_name, "polyline")
+        with open(file_name) as file:
+            lines = file.read().splitlines()
+        self.assertEqual([decode_polyline(line) for line in lines],
+                         [[(40.70, -73.98), (40.702, -73.98)], [(40.70, -73.97), (40.71, -73.97)]])
+        
+    def test_html_marks_only_start_and_end(self):
+        file_name = os.path.join(self.directory, "routes.html")
+        self.renderer.save(file_name)
+        with open(file_name) as file:
+            html = file.read()
+        self.assertEqual(html.count("L.marker("), 4)
+        self.assertEqual(html.count("L.polyline("), 2)
+        
+    def test_unknown_format(self):
+        with self.assertRaises(Exception):
+            self.renderer.save(os.path.join(self.directory, "routes"), "svg")
+
+
+if __name__ == '__main__':
+    unittest.main()
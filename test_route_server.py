@@ -0,0 +1,126 @@
+# test_route_server.py
+from route_server import *
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+TEST_JSON_FILE = "json_maps/nymap3_data.json"
+
+
+class RouteServerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Work on a copy so the cache is not written into json_maps, and no local preprocessing is picked up
+        cls.tmp_dir = tempfile.mkdtemp()
+        map_file = os.path.join(cls.tmp_dir, os.path.basename(TEST_JSON_FILE))
+        shutil.copy(TEST_JSON_FILE, map_file)
+        cls.map, mode, heuristic = batch_route.load_routing_map(map_file)
+        cls.server = RouteServer(cls.map, mode, heuristic, processes=2)
+        cls.loop = asyncio.new_event_loop()
+        cls.listener = cls.loop.run_until_complete(cls.server.start("127.0.0.1", 0))
+        cls.url = f"http://127.0.0.1:{cls.listener.sockets[0].getsockname()[1]}"
+        cls.thread = threading.Thread(target=cls.loop.run_forever, daemon=True)
+        cls.thread.start()
+        
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.thread.join()
+        cls.listener.close()
+        cls.loop.run_until_complete(cls.listener.wait_closed())
+        cls.loop.close()
+        cls.server.close()
+        shutil.rmtree(cls.tmp_dir)
+        
+    def request(self, path, payload=None) -> tuple:
+        data = None if payload is None else json.dumps(payload).encode()
+        try:
+            with urllib.request.urlopen(self.url + path, data) as response:
+                return response.status, json.load(response)
+        except urllib.error.HTTPError as e:
+            return e.code, json.load(e)
+        
+    def test_route(self):
+        status, result = self.request("/route", {"start": 9805235577, "goal": 42497720})
+        self.assertEqual(status, 200)
+        path = self.map.search(self.map.node_dict[9805235577], self.map.node_dict[42497720])
+        self.assertEqual(result["path"], [n.id for n in path])
+        self.assertAlmostEqual(result["length"], search.path_length(path))
+        
+    def test_route_errors(self):
+        self.assertEqual(self.request("/route", {"start": -1, "goal": 42497720})[0], 400)
+        self.assertEqual(self.request("/route", {"start": 9805235577})[0], 400)
+        self.assertEqual(self.request("/route")[0], 405)
+        self.assertEqual(self.request("/unknown")[0], 404)
+        self.assertEqual(self.request("/route", ["start", "goal"])[0], 400)
+        self.assertEqual(self.request("/route", {"start": {"lat": 1}, "goal": 42497720})[0], 400)
+        self.assertEqual(self.request("/route", {"start": [0.0, 0.0], "goal": 42497720})[0], 400)
+        
+    def test_malformed_content_length(self):
+        port = int(self.url.rsplit(":", 1)[1])
+        with socket.create_connection(("127.0.0.1", port)) as connection:
+            connection.sendall(b"POST /route HTTP/1.1\r\nContent-Length: abc\r\n\r\n")
+            response = connection.makefile("rb").read()
+        self.assertTrue(response.startswith(b"HTTP/1.1 400"))
+        self.assertIn(b"Connection: close", response)
+        
+    def test_nearest(self):
+        node = self.map.node_dict[9805235577]
+        status, result = self.request(f"/nearest?lat={node.coordinate.lat}&lon={node.coordinate.lon}&k=3")
+        self.assertEqual(status, 200)
+        self.assertTrue(1 <= len(result["nodes"]) <= 3)
+        self.assertEqual(result["nodes"][0]["id"], 9805235577)
+        self.assertEqual(result["nodes"][0]["distance"], 0.0)
+        
+    def test_nearest_errors(self):
+        node = self.map.node_dict[9805235577]
+        for k in [0, -1, "x"]:
+            self.assertEqual(self.request(f"/nearest?lat={node.coordinate.lat}&lon={node.coordinate.lon}&k={k}")[0], 400)
+        self.assertEqual(self.request(f"/nearest?lat={node.coordinate.lat}")[0], 400)
+        
+    def test_matrix(self):
+        origins = [9805235577, 42497720]
+        status, result = self.request("/matrix", {"origins": origins, "destinations": origins, "paths": True})
+        self.assertEqual(status, 200)
+        matrix, paths = self.map.distance_matrix(origins, origins, with_paths=True)
+        self.assertEqual(result["matrix"], matrix)
+        self.assertEqual(result["paths"], paths)
+        
+    def test_stats_has_latency_histograms(self):
+        self.request("/route", {"start": 9805235577, "goal": 42497720})
+        status, stats = self.request("/stats")
+        self.assertEqual(status, 200)
+        self.assertTrue(stats["/route"]["count"] >= 1)
+        self.assertEqual(sum(stats["/route"]["buckets"].values()), stats["/route"]["count"])
+
+class ClientErrorTest(unittest.TestCase):
+    def test_only_request_errors_are_client_errors(self):
+        self.assertTrue(is_client_error(search.NodeNotFound("Error: OSMNode id not found")))
+        self.assertTrue(is_client_error(BadRequest("Error: k must be at least 1")))
+        self.assertTrue(is_client_error(search_geocoder.AddressNotFound("Error: address not found")))
+        self.assertFalse(is_client_error(KeyError(3)))
+        self.assertFalse(is_client_error(TypeError("unsupported operand")))
+        # Failures of the server are raised as plain Exceptions
+        self.assertFalse(is_client_error(Exception("Error: tile (1, 2) is missing or stale, build the tiles again")))
+        self.assertFalse(is_client_error(Exception("Error: the map has no contraction hierarchy")))
+
+class LatencyHistogramTest(unittest.TestCase):
+    def test_buckets(self):
+        histogram = LatencyHistogram()
+        for ms in [0.5, 1, 3, 10000]:
+            histogram.record(ms)
+        d = histogram.to_dict()
+        self.assertEqual(d["count"], 4)
+        self.assertEqual(d["buckets"]["<=1"], 2)
+        self.assertEqual(d["buckets"]["<=5"], 1)
+        self.assertEqual(d["buckets"][">5000"], 1)
+        self.assertEqual(d["max_ms"], 10000)
+
+
+if __name__ == '__main__':
+    unittest.main()
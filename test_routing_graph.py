@@ -0,0 +1,138 @@
+# test_routing_graph.py
+from routing_graph import *
+from geo import haversine
+from search import create_node_dict, create_way_dict, add_all_ways_to_nodes, load_json_to_dict
+from test_search import MOCK_JSON_DATA, TEST_JSON_FILE
+import unittest
+
+
+class CompileGraphTestUsingMockData(unittest.TestCase):
+    def setUp(self):
+        self.nodedict = create_node_dict(MOCK_JSON_DATA)
+        self.waydict = create_way_dict(MOCK_JSON_DATA)
+        self.graph = compile_graph(self.nodedict, self.waydict)
+
+    def test_graph_has_every_node(self):
+        self.assertEqual(len(self.graph), 3)
+        self.assertEqual(len(self.graph.offsets), 4)
+        for osm_id in self.nodedict:
+            i = self.graph.index[osm_id]
+            self.assertEqual(self.graph.ids[i], osm_id)
+            self.assertEqual(self.graph.coordinate(i), self.nodedict[osm_id].coordinate)
+
+    def test_only_highway_ways_are_edges(self):
+        # Way 100 (tertiary) gives one edge in each direction, way 101 (cycleway) gives none
+        self.assertEqual(self.graph.edge_count(), 2)
+        i = self.graph.index[12345]
+        j = self.graph.index[11111]
+        self.assertEqual([t for t, _ in self.graph.neighbors(i)], [j])
+        self.assertEqual([t for t, _ in self.graph.neighbors(j)], [i])
+        self.assertEqual(list(self.graph.neighbors(self.graph.index[54321])), [])
+
+    def test_edge_lengths_are_haversine(self):
+        i = self.graph.index[12345]
+        (_, length), = self.graph.neighbors(i)
+        expected = haversine(self.nodedict[12345].coordinate, self.nodedict[11111].coordinate)
+        self.assertAlmostEqual(length, expected)
+
+class CompileGraphTestUsingJsonFile(unittest.TestCase):
+    def setUp(self):
+        mapdict = load_json_to_dict(TEST_JSON_FILE)
+        self.nodedict = create_node_dict(mapdict)
+        self.waydict = create_way_dict(mapdict)
+        add_all_ways_to_nodes(self.waydict, self.nodedict)
+        self.graph = compile_graph(self.nodedict, self.waydict)
+
+    def test_edges_are_symmetric(self):
+        for i in range(len(self.graph)):
+            for j, length in self.graph.neighbors(i):
+                self.assertIn((i, length), list(self.graph.neighbors(j)))
+
+    def test_finds_neighbors_found_by_hand(self):
+        i = self.graph.index[9805235577]
+        n = set(self.graph.ids[t] for t, _ in self.graph.neighbors(i))
+        self.assertEqual(n, {42497720, 10722370766})
+
+
+class SimplifyGraphTestUsingJsonFile(unittest.TestCase):
+    def setUp(self):
+        mapdict = load_json_to_dict(TEST_JSON_FILE)
+        self.nodedict = create_node_dict(mapdict)
+        self.waydict = create_way_dict(mapdict)
+        add_all_ways_to_nodes(self.waydict, self.nodedict)
+        self.graph = compile_graph(self.nodedict, self.waydict)
+        self.simplified = simplify_graph(self.graph)
+
+    def test_graph_gets_smaller(self):
+        routable = sum(1 for i in range(len(self.graph)) if self.graph.offsets[i + 1] > self.graph.offsets[i])
+        self.assertTrue(len(self.simplified) * 2 < routable)
+        self.assertTrue(self.simplified.edge_count() < self.graph.edge_count())
+        for i in range(len(self.simplified)):
+            self.assertTrue(self.simplified.offsets[i + 1] > self.simplified.offsets[i])
+
+    def test_every_routable_node_is_kept_or_inside_one_edge(self):
+        for i in range(len(self.graph)):
+            osm_id = self.graph.ids[i]
+            if self.graph.offsets[i + 1] == self.graph.offsets[i]:
+                self.assertNotIn(osm_id, self.simplified.index)
+                self.assertNotIn(osm_id, self.simplified.interior)
+            else:
+                self.assertTrue((osm_id in self.simplified.index) != (osm_id in self.simplified.interior))
+
+    def test_contracted_edges_follow_their_chain(self):
+        pairs = set()
+        for i in range(len(self.simplified)):
+            for e in range(self.simplified.offsets[i], self.simplified.offsets[i + 1]):
+                j = self.simplified.targets[e]
+                # At most one edge between two nodes, and none back to itself
+                self.assertNotIn((i, j), pairs)
+                self.assertNotEqual(i, j)
+                pairs.add((i, j))
+                self.assertEqual(self.simplified.source(e), i)
+
+                chain = [self.simplified.ids[i]] + self.simplified.via(e) + [self.simplified.ids[j]]
+                lengths = []
+                for a, b in zip(chain, chain[1:]):
+                    u, v = self.graph.index[a], self.graph.index[b]
+                    lengths.append(next(length for t, length in self.graph.neighbors(u) if t == v))
+                self.assertAlmostEqual(self.simplified.lengths[e], sum(lengths))
+                first = self.simplified.via_offsets[e]
+                for k in range(len(chain) - 2):
+                    self.assertAlmostEqual(self.simplified.via_lengths[first + k], sum(lengths[:k + 1]))
+
+                # Both directions of an edge have the same length and the reversed chain
+                back = self.simplified.edge(j, i)
+                self.assertEqual(self.simplified.lengths[back], self.simplified.lengths[e])
+                self.assertEqual(self.simplified.via(back), self.simplified.via(e)[::-1])
+
+    def test_edge_raises_error_without_edge(self):
+        with self.assertRaises(Exception):
+            self.simplified.edge(0, 0)
+
+
+class ConnectedComponentsTestUsingJsonFile(unittest.TestCase):
+    def setUp(self):
+        mapdict = load_json_to_dict(TEST_JSON_FILE)
+        self.nodedict = create_node_dict(mapdict)
+        self.waydict = create_way_dict(mapdict)
+        add_all_ways_to_nodes(self.waydict, self.nodedict)
+        self.graph = compile_graph(self.nodedict, self.waydict)
+        self.components = connected_components(self.graph)
+
+    def test_same_label_iff_reachable(self):
+        for source in range(0, len(self.graph), 97):
+            distances = dijkstra(self.graph, [source])[0]
+            for i in range(len(self.graph)):
+                self.assertEqual(self.components[i] == self.components[source], distances[i] != math.inf)
+
+    def test_labels_are_numbered_by_decreasing_size(self):
+        sizes = [0] * (max(self.components) + 1)
+        for label in self.components:
+            sizes[label] += 1
+        self.assertTrue(all(size > 0 for size in sizes))
+        self.assertEqual(sizes, sorted(sizes, reverse=True))
+        self.assertTrue(sizes[0] > sizes[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
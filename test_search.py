@@ -97,6 +97,20 @@ class NodeTest(unittest.TestCase):
         
         self.assertEqual(len(self.node.ways), 1)
         
+    def test_nodes_can_have_several_ways(self):
+        self.node.add_way(100)
+        self.node.add_way(101)
+        self.node.add_way(100)
+        self.assertEqual(self.node.ways, {100, 101})
+        other = OSMNode(12345, 120.5, 45.575)
+        other.add_way(101)
+        other.add_way(100)
+        self.assertTrue(other == self.node)
+        
+    def test_nodes_are_compact(self):
+        self.assertFalse(hasattr(self.node, "__dict__"))
+        self.assertFalse(hasattr(self.way, "__dict__"))
+        
     def test_node__eq__(self):
         new_node = OSMNode(self.node.id, self.node.coordinate.lat, self.node.coordinate.lon)
         self.assertTrue(new_node == self.node)
@@ -240,13 +254,22 @@ class SearchTestUsingMockData(unittest.TestCase):
         self.assertEqual(type(ls[0]), OSMNode)
         self.assertEqual(ls[0].id, 12345)
     
+    def test_c2n_with_node_index(self):
+        add_all_ways_to_nodes(self.waydict, self.nodedict)
+        node_index = NodeIndex(self.nodedict, self.waydict)
+        # 54321 is only on a cycleway so it is not indexed
+        self.assertEqual(len(node_index), 2)
+        p = Point(45.5001, -100.5)
+        ls = coordinates_to_nodes(p, self.nodedict, self.waydict, self.bbox, node_index)
+        self.assertEqual([n.id for n in ls], [12345])
+    
     def test_c2n_does_not_add_far_nodes(self):
         add_all_ways_to_nodes(self.waydict, self.nodedict)
         p = Point(45.6, -100.5)
         ls = coordinates_to_nodes(p, self.nodedict, self.waydict, self.bbox)
         self.assertTrue(all(x == None for x in ls))
         
-class AnodeAndFrontierTestUsingTestJsonFile(unittest.TestCase):
+class FrontierTestUsingTestJsonFile(unittest.TestCase):
     def setUp(self):
         self.mapdict = load_json_to_dict(TEST_JSON_FILE)
         self.waydict = create_way_dict(self.mapdict)
@@ -256,93 +279,80 @@ class AnodeAndFrontierTestUsingTestJsonFile(unittest.TestCase):
         
         self.map = Map(self.nodedict, self.waydict, self.bbox)
         
-        node_id, osm_node = random.choice(list(self.nodedict.items()))
-        node = AstarNode(osm_node, 0, 100, None)
-        self.nodedict.pop(node_id)
-        self.f = Frontier(node)
-    
-    def test_astar_nodes_can_be_created_from_osm_nodes(self):
-        node_id, osm_node = random.choice(list(self.nodedict.items()))
-        anode = AstarNode(osm_node, 2, 1.1, None)
-        self.assertTrue(anode.OSM_node == osm_node)
-        self.assertTrue(anode.gcost == 2)
-        self.assertTrue(anode.hcost == 1.1)
-        self.assertTrue(anode.pathcost == 3.1)
-        self.assertTrue(anode.parent is None)
-    
-    def test_astar_node_contains_parent(self):
-        node_id, osm_node = random.choice(list(self.nodedict.items()))
-        self.nodedict.pop(node_id)
-        parent_id, parent_node = random.choice(list(self.nodedict.items()))
-        
-        parent = AstarNode(parent_node, 4, 5, None)
-        anode = AstarNode(osm_node, 2, 1.1, parent)
-        
-        self.assertTrue(anode.parent == parent)
-        self.assertTrue(type(anode.parent)==AstarNode)
-        self.assertTrue(parent.parent == None)
+        # Heuristic of every graph node, random so the frontier order differs from the gcost order
+        rnd = random.Random(0)
+        self.hcosts = [rnd.uniform(0, 100) for _ in range(len(self.map.graph))]
+        self.f = Frontier(self.hcosts.__getitem__)
+        self.start = rnd.randrange(len(self.map.graph))
+        self.f.add(self.start, 0, None)
     
     def test_setup_frontier(self):
-        node_id, osm_node = random.choice(list(self.nodedict.items()))
-        node = AstarNode(osm_node, 0, 100, None)
-        self.nodedict.pop(node_id)
-        f = Frontier(node)
-        
-        self.assertTrue(len(f.deque) == 1)
-        self.assertTrue(node in f.deque)
-        
+        f = Frontier(self.hcosts.__getitem__)
+        self.assertTrue(f.is_empty())
+        f.add(3, 0, None)
+        self.assertEqual(len(f), 1)
+        self.assertEqual(f.gcosts[3], 0)
+        self.assertTrue(f.parents[3] is None)
         
     def test_remove_from_frontier(self):
-        self.f.remove()
-        self.assertTrue(len(self.f.deque) == 0)
-        # error when removing from empty deque
+        self.assertEqual(self.f.remove(), (self.hcosts[self.start], self.start))
+        self.f.close(self.start)
+        self.assertEqual(len(self.f), 0)
+        # error when removing from empty frontier
         with self.assertRaises(IndexError):
             self.f.remove()
             
     def test_frontier_is_empty(self):
         self.assertFalse(self.f.is_empty())
-        self.assertTrue(len(self.f.deque) == 1)
-        self.f.remove()
+        self.f.close(self.f.remove()[1])
         self.assertTrue(self.f.is_empty())
-        self.assertTrue(len(self.f.deque) == 0)
         
-    def test_add_to_end_of_frontier(self):
-        ls = list(self.nodedict.values())
-        anode1 = AstarNode(random.choice(ls), 1, 100, None)
-        anode2 = AstarNode(random.choice(ls), 30, 75, anode1)
+    def test_remove_in_pathcost_order(self):
+        f = Frontier(self.hcosts.__getitem__)
+        for i in range(20):
+            f.add(i, 5 * i, None)
+        pathcosts = []
+        while not f.is_empty():
+            pathcost, i = f.remove()
+            f.close(i)
+            self.assertEqual(pathcost, 5 * i + self.hcosts[i])
+            pathcosts.append(pathcost)
+        self.assertEqual(pathcosts, sorted(pathcosts))
+        self.assertEqual(f.peak_size, 20)
+        
+    def test_add_decreases_key(self):
+        i = (self.start + 1) % len(self.map.graph)
+        self.assertTrue(self.f.add(i, 30, self.start))
+        self.assertTrue(self.f.add(i, 1, None))
+        self.assertEqual(len(self.f), 2)
+        self.assertEqual(self.f.replace_count, 1)
+        self.assertEqual(self.f.gcosts[i], 1)
+        self.assertTrue(self.f.parents[i] is None)
+        removed = sorted([self.f.remove(), self.f.remove()])
+        self.assertIn((1 + self.hcosts[i], i), removed)
+        for _, j in removed:
+            self.f.close(j)
+        # The replaced entry is skipped
+        with self.assertRaises(IndexError):
+            self.f.remove()
+        self.assertEqual(self.f.stale_count, 1)
         
-        f = Frontier(anode1)
-        f.add(anode2)
+    def test_add_skips_explored_and_costlier(self):
+        self.assertFalse(self.f.add(self.start, 5, None))
+        self.f.close(self.f.remove()[1])
+        self.assertFalse(self.f.add(self.start, 0, None))
+        self.assertEqual(self.f.duplicate_count, 2)
+        self.assertTrue(self.f.is_empty())
         
-        self.assertTrue(len(f.deque) == 2)
-        self.assertTrue(f.deque[0] == anode1)
-        self.assertTrue(f.deque[1] == anode2)
-    
-    def test_add_to_front_of_frontier(self):
-        ls = list(self.nodedict.values())
-        anode1 = AstarNode(random.choice(ls), 1, 100, None)
-        anode2 = AstarNode(random.choice(ls), 30, 75, anode1)
-        
-        f = Frontier(anode1)
-        f.add(anode2)
-        
-        anode0 = AstarNode(random.choice(ls), 0, 80, anode1)
-        f.add(anode0)
-        self.assertTrue(len(f.deque) == 3)
-        self.assertTrue(f.deque[0] == anode0)
-        self.assertTrue(f.deque[1] == anode1)
-        self.assertTrue(f.deque[2] == anode2)
-        
-    def test_add_to_middle_of_frontier(self):
-        ls = list(self.nodedict.values())
-        anode1 = AstarNode(random.choice(ls), 1, 100, None)
-        anode3 = AstarNode(random.choice(ls), 30, 75, anode1)
-        f = Frontier(anode1)
-        f.add(anode3)
-        anode0 = AstarNode(random.choice(ls), 0, 80, anode1)
-        f.add(anode0)
-        
-        anode2 = AstarNode(random.choice(ls), 40, 62, anode3)
+    def test_min_pathcost_skips_removed_node(self):
+        i = (self.start + 1) % len(self.map.graph)
+        self.f.add(i, 1000, self.start)
+        self.assertEqual(self.f.min_pathcost(), min(self.hcosts[self.start], 1000 + self.hcosts[i]))
+        pathcost, j = self.f.remove()
+        self.assertEqual(self.f.min_pathcost(j), max(self.hcosts[self.start], 1000 + self.hcosts[i]))
+        self.f.close(j)
+        self.f.close(self.f.remove()[1])
+        self.assertEqual(self.f.min_pathcost(), math.inf)
         
 class MapTestUsingJsonFile(unittest.TestCase):
     def setUp(self):
@@ -359,47 +369,39 @@ class MapTestUsingJsonFile(unittest.TestCase):
         # closest street node to Mark Jupiter
         self.goal_osm_node = self.nodedict[7707712198]
         
-        self.start_anode = AstarNode(self.start_osm_node, 0, heuristic(self.start_osm_node, self.goal_osm_node), None)
-        self.frontier = Frontier(self.start_anode)
-    
     def test_finds_all_neighbors(self):
         # All neighbors to 9805235577, found by hand
-        self.map.osm_goal = self.goal_osm_node
+        graph = self.map.graph
         start_neighbors = set([42497720, 10722370766])
-        n = self.map.neighbors(self.start_anode)
-        n = set([x.OSM_node.id for x in n])
+        n = set(graph.ids[j] for j, _ in graph.neighbors(graph.index[self.start_osm_node.id]))
         self.assertEqual(n, start_neighbors)
 
         end_neighbors = set([10725896470, 2358967531])
-        n = self.map.neighbors(AstarNode(self.goal_osm_node, 0, 0, None))
-        n = set([x.OSM_node.id for x in n])
+        n = set(graph.ids[j] for j, _ in graph.neighbors(graph.index[self.goal_osm_node.id]))
         self.assertEqual(n, end_neighbors)
         
     # TODO write tests that only find neighbors when the node is at the beg or end
     # hard to implement bc its hard to find an end node a part of only 1 way
 
     def test_expanding_with_neighbors_keeps_order(self):
-        self.map.osm_goal = self.goal_osm_node
-        start_neighbors = self.map.neighbors(self.start_anode)
-        
-        self.map.expand(self.frontier, start_neighbors, set())
-        
-        costs = [x.pathcost for x in self.frontier.deque]
+        graph = self.map.graph
+        h = self.map.heuristic_to([(self.goal_osm_node, 0)])
+        frontier = Frontier(h)
+        start = graph.index[self.start_osm_node.id]
+        frontier.add(start, 0, None)
+        frontier.close(frontier.remove()[1])
+        for v, length in graph.neighbors(start):
+            self.assertTrue(frontier.add(v, length, start))
+        
+        costs = []
+        while not frontier.is_empty():
+            pathcost, i = frontier.remove()
+            frontier.close(i)
+            costs.append(pathcost)
+        self.assertEqual(len(costs), 2)
         # Ascending pathcost order
         for i in range(len(costs)-1):
             self.assertTrue(costs[i] <= costs[i + 1])
-            
-    def test_expand_with_no_neighbors(self):
-        neighbors = []
-        self.map.expand(self.frontier, neighbors, set())
-        self.assertEqual(len(self.frontier.deque), 1)
-    
-    def test_expand_with_one_neighbor(self):
-        node_id, osm_node = random.choice(list(self.nodedict.items()))
-        anode = AstarNode(osm_node, 200, 1.1, None)
-        neighbors = [anode]
-        self.map.expand(self.frontier, neighbors, set())
-        self.assertEqual(len(self.frontier.deque), 2)
         
     def test_search_finds_solution(self):
         ls = self.map.search(self.start_osm_node, self.goal_osm_node)
@@ -408,6 +410,222 @@ class MapTestUsingJsonFile(unittest.TestCase):
         self.assertTrue(ls[0].id == 9805235577)
         self.assertTrue(ls[-1].id == 7707712198)
         
+    def test_bidirectional_search_matches_astar(self):
+        expected = self.map.search(self.start_osm_node, self.goal_osm_node)
+        self.assertTrue(self.map.expanded_count > 0)
+        ls = self.map.search(self.start_osm_node, self.goal_osm_node, mode="bidirectional")
+        self.assertTrue(self.map.expanded_count > 0)
+        self.assertEqual([n.id for n in ls], [n.id for n in expected])
+        
+        ls = self.map.search(self.goal_osm_node, self.goal_osm_node, mode="bidirectional")
+        self.assertEqual(ls, [self.goal_osm_node])
+
+    def test_bidirectional_search_prunes_without_losing_the_shortest_path(self):
+        rnd = random.Random(0)
+        routable = [n for n in self.nodedict.values() if any(self.waydict[w].highway_value for w in n.ways)]
+        pruned = 0
+        for cost_model in COST_MODELS:
+            self.map.cost_model = cost_model
+            for _ in range(30):
+                start, goal = rnd.choice(routable), rnd.choice(routable)
+                expected = self.map.search(start, goal)
+                expected_cost = self.map.path_cost
+                path, stats = self.map.search_with_stats(start, goal, mode="bidirectional")
+                self.assertEqual(path is None, expected is None)
+                if path is not None:
+                    self.assertAlmostEqual(self.map.path_cost, expected_cost)
+                pruned += stats.pruned
+        self.assertTrue(pruned > 0)
+
+    def test_search_finds_shortest_path(self):
+        ls = self.map.search(self.start_osm_node, self.goal_osm_node)
+        length = sum(haversine(a.coordinate, b.coordinate) for a, b in zip(ls, ls[1:]))
+        
+        # Plain Dijkstra over the graph gives the shortest length
+        graph = self.map.graph
+        dist = {graph.index[self.start_osm_node.id]: 0}
+        heap = [(0, graph.index[self.start_osm_node.id])]
+        while heap:
+            d, u = heapq.heappop(heap)
+            for v, l in graph.neighbors(u):
+                if d + l < dist.get(v, math.inf):
+                    dist[v] = d + l
+                    heapq.heappush(heap, (d + l, v))
+        self.assertAlmostEqual(length, dist[graph.index[self.goal_osm_node.id]])
+        
+    def test_multi_source_search_finds_best_pair(self):
+        routable = [n for n in self.nodedict.values() if any(self.waydict[w].highway_value for w in n.ways)]
+        rnd = random.Random(0)
+        length = lambda p: sum(haversine(a.coordinate, b.coordinate) for a, b in zip(p, p[1:]))
+        self.map.hierarchy = contraction_hierarchy.build_contraction_hierarchy(self.map.graph)
+        for _ in range(20):
+            starts = [(n, rnd.uniform(0, 0.1)) for n in rnd.sample(routable, 3)]
+            goals = [(n, rnd.uniform(0, 0.1)) for n in rnd.sample(routable, 3)]
+            
+            # Best over every pair searched on its own
+            best = math.inf
+            for start, start_offset in starts:
+                for goal, goal_offset in goals:
+                    ls = self.map.search(start, goal)
+                    if ls is not None:
+                        best = min(best, start_offset + length(ls) + goal_offset)
+            
+            for mode in ["astar", "ch"]:
+                ls = self.map.search(starts, goals, mode=mode)
+                if best == math.inf:
+                    self.assertTrue(ls is None)
+                    continue
+                start_offsets = {n.id: offset for n, offset in starts}
+                goal_offsets = {n.id: offset for n, offset in goals}
+                cost = start_offsets[ls[0].id] + length(ls) + goal_offsets[ls[-1].id]
+                self.assertAlmostEqual(cost, best)
+                
+    def test_offset_goal_does_not_hide_a_cheaper_goal_behind_it(self):
+        # 42472722 is a dead end, its only neighbor is 42472724 which leads on to 10170379777 (found by hand).
+        #   The near goal is reached first with nothing else in the frontier, but ending there costs its offset,
+        #   more than going on to the goal behind it
+        start, near, behind = self.nodedict[42472722], self.nodedict[42472724], self.nodedict[10170379777]
+        ls = self.map.search(start, [(near, 1.0), (behind, 0.0)])
+        self.assertEqual(ls, [start, near, behind])
+        self.assertAlmostEqual(self.map.path_cost, path_length(ls))
+        
+    def test_multi_source_search_without_offsets(self):
+        ls = self.map.search([self.start_osm_node], [self.goal_osm_node])
+        expected = self.map.search(self.start_osm_node, self.goal_osm_node)
+        self.assertEqual(ls, expected)
+        
+    def test_bidirectional_search_raises_error_on_candidates(self):
+        with self.assertRaises(Exception):
+            self.map.search([self.start_osm_node], [self.goal_osm_node], mode="bidirectional")
+        
+    def test_search_raises_error_on_unknown_mode(self):
+        with self.assertRaises(Exception):
+            self.map.search(self.start_osm_node, self.goal_osm_node, mode="dfs")
+    
+    def other_component_node(self, osm_node):
+        '''returns a routable node of the bounding box in a different component than the given node'''
+        component = self.map.component(osm_node.id)
+        return next(n for n in self.nodedict.values() if self.map.component(n.id) != component
+                    and any(self.waydict[w].highway_value for w in n.ways) and self.bbox.check_inside(n.coordinate))
+    
+    def test_search_between_components_is_rejected_at_once(self):
+        other = self.other_component_node(self.start_osm_node)
+        for mode in ["astar", "bidirectional", "ch"]:
+            if mode == "ch":
+                self.map.hierarchy = contraction_hierarchy.build_contraction_hierarchy(self.map.graph)
+            self.assertTrue(self.map.search(self.start_osm_node, other, mode=mode) is None)
+            self.assertEqual(self.map.expanded_count, 0)
+        
+    def test_search_drops_candidates_in_other_components(self):
+        other = self.other_component_node(self.goal_osm_node)
+        ls = self.map.search([self.start_osm_node], [(other, 0.0), (self.goal_osm_node, 1.0)])
+        self.assertEqual(ls, self.map.search(self.start_osm_node, self.goal_osm_node))
+        
+    def test_coordinates_snap_into_the_given_component(self):
+        other = self.other_component_node(self.start_osm_node)
+        point = other.coordinate
+        self.assertTrue(self.map.osm_node((point.lat, point.lon)) is other)
+        component = self.map.component(self.start_osm_node.id)
+        snapped = self.map.osm_node((point.lat, point.lon), component)
+        self.assertEqual(self.map.component(snapped.id), component)
+        ls = coordinates_to_nodes(point, self.nodedict, self.waydict, self.bbox,
+                                  in_component=lambda n: self.map.component(n.id) == component)
+        self.assertTrue(all(self.map.component(n.id) == component for n in ls))
+        
+    def test_route_ends_do_not_anchor_on_a_bad_start_snap(self):
+        # The start point is on a small island, the goal point in the largest component
+        island = self.other_component_node(self.goal_osm_node)
+        goal = self.goal_osm_node.coordinate
+        for start, end in [((island.lat, island.lon), (goal.lat, goal.lon)), ((goal.lat, goal.lon), (island.lat, island.lon))]:
+            start_node, goal_node = self.map.route_ends(start, end)
+            self.assertEqual(self.map.component(start_node.id), self.map.component(goal_node.id))
+            self.assertTrue(self.goal_osm_node in (start_node, goal_node))
+        # A node id is kept, the other end snaps into its component if it can
+        self.assertEqual(self.map.route_ends(island.id, (goal.lat, goal.lon)), (island, self.goal_osm_node))
+        start = self.start_osm_node.coordinate
+        self.assertEqual(self.map.route_ends((start.lat, start.lon), self.goal_osm_node.id),
+                         (self.start_osm_node, self.goal_osm_node))
+        
+
+class SimplifiedMapTestUsingJsonFile(unittest.TestCase):
+    def setUp(self):
+        self.nodedict, self.waydict, self.bbox, self.graph = load_map(TEST_JSON_FILE, use_cache=False)
+        self.full_map = Map(self.nodedict, self.waydict, self.bbox, self.graph)
+        self.map = Map(self.nodedict, self.waydict, self.bbox, simplify_graph(self.graph))
+        self.routable = [n for n in self.nodedict.values() if any(self.waydict[w].highway_value for w in n.ways)]
+
+    def assert_full_path(self, path, start, goal):
+        self.assertTrue(path[0] is start)
+        self.assertTrue(path[-1] is goal)
+        for a, b in zip(path, path[1:]):
+            self.assertIn(self.graph.index[b.id], [t for t, _ in self.graph.neighbors(self.graph.index[a.id])])
+
+    def test_search_returns_full_node_paths(self):
+        rnd = random.Random(0)
+        for _ in range(50):
+            start, goal = rnd.choice(self.routable), rnd.choice(self.routable)
+            for cost_model in ["distance", "time"]:
+                self.full_map.cost_model = self.map.cost_model = cost_model
+                expected = self.full_map.search(start, goal)
+                for mode in ["astar", "bidirectional"]:
+                    path = self.map.search(start, goal, mode=mode)
+                    if expected is None:
+                        self.assertTrue(path is None)
+                        continue
+                    self.assert_full_path(path, start, goal)
+                    self.assertAlmostEqual(self.map.path_cost, self.full_map.path_cost)
+
+    def test_search_inside_one_chain(self):
+        e, k = next(iter(self.map.graph.interior.values()))
+        first, last = self.map.graph.via_offsets[e], self.map.graph.via_offsets[e + 1]
+        chain = [self.nodedict[i] for i in self.map.graph.via_nodes[first:last]]
+        path = self.map.search(chain[0], chain[-1])
+        self.assertEqual(path, chain)
+        self.assertEqual(self.map.search(chain[-1], chain[-1]), [chain[-1]])
+
+    def test_search_from_candidates_matches_full_graph(self):
+        rnd = random.Random(1)
+        for _ in range(20):
+            starts = [(node, rnd.uniform(0, 0.05)) for node in rnd.sample(self.routable, 3)]
+            goals = [(node, rnd.uniform(0, 0.05)) for node in rnd.sample(self.routable, 3)]
+            expected = self.full_map.search(starts, goals)
+            path = self.map.search(starts, goals)
+            if expected is None:
+                self.assertTrue(path is None)
+                continue
+            self.assertAlmostEqual(self.map.path_cost, self.full_map.path_cost)
+
+    def test_contracted_nodes_keep_their_component(self):
+        for node in self.routable:
+            self.assertEqual(self.map.component(node.id) == self.map.component(self.routable[0].id),
+                             self.full_map.component(node.id) == self.full_map.component(self.routable[0].id))
+        self.assertTrue(self.map.component(-1) is None)
+
+    def test_distance_matrix_matches_full_graph(self):
+        contracted = list(self.map.graph.interior)
+        rnd = random.Random(2)
+        origins = rnd.sample(contracted, 3) + [n.id for n in rnd.sample(self.routable, 2)]
+        destinations = rnd.sample(contracted, 3) + [n.id for n in rnd.sample(self.routable, 2)] + origins[:1]
+        for cost_model in ["distance", "time"]:
+            self.full_map.cost_model = self.map.cost_model = cost_model
+            expected = self.full_map.distance_matrix(origins, destinations)[0]
+            matrix, paths = self.map.distance_matrix(origins, destinations, with_paths=True)
+            for i, origin in enumerate(origins):
+                for j, destination in enumerate(destinations):
+                    if expected[i][j] == math.inf:
+                        self.assertEqual(matrix[i][j], math.inf)
+                        self.assertTrue(paths[i][j] is None)
+                        continue
+                    self.assertAlmostEqual(matrix[i][j], expected[i][j])
+                    self.assert_full_path([self.nodedict[k] for k in paths[i][j]], self.nodedict[origin],
+                                          self.nodedict[destination])
+
+    def test_graph_index_of_contracted_node_raises_error(self):
+        contracted = next(iter(self.map.graph.interior))
+        self.assertTrue(self.map.osm_node(contracted) is self.nodedict[contracted])
+        with self.assertRaises(Exception):
+            self.map.graph_index(contracted)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
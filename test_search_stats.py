@@ -0,0 +1,69 @@
+# test_search_stats.py
+from search_stats import *
+from search import *
+import unittest
+
+TEST_JSON_FILE = "json_maps/nymap3_data.json"
+
+
+class SearchStatsTest(unittest.TestCase):
+    def setUp(self):
+        self.nodedict, self.waydict, self.bbox, self.graph = load_map(TEST_JSON_FILE, use_cache=False)
+        self.map = Map(self.nodedict, self.waydict, self.bbox, self.graph)
+        self.start = self.nodedict[9805235577]
+        self.goal = self.nodedict[7707712198]
+        
+    def test_no_stats_by_default(self):
+        self.map.search(self.start, self.goal)
+        self.assertTrue(self.map.stats is None)
+        
+    def test_astar_stats(self):
+        path, stats = self.map.search_with_stats(self.start, self.goal)
+        self.assertFalse(self.map.collect_stats)
+        self.assertEqual(path, self.map.search(self.start, self.goal))
+        self.assertTrue(stats.found)
+        self.assertEqual(stats.path_nodes, len(path))
+        self.assertEqual(stats.explored, self.map.expanded_count)
+        self.assertTrue(stats.popped >= stats.explored)
+        self.assertTrue(stats.pushed >= stats.popped - stats.stale_pops)
+        # Every node reached was either pushed or a duplicate
+        self.assertEqual(stats.heuristic_lookups + 1, stats.pushed + stats.duplicates)
+        self.assertTrue(1 <= stats.peak_frontier <= stats.pushed)
+        # The heuristic is only computed for the nodes pushed, once each
+        self.assertTrue(stats.explored <= stats.heuristic_evaluations <= stats.pushed)
+        self.assertEqual(list(stats.phases), ["heuristics", "search", "path"])
+        self.assertTrue(stats.seconds() > 0)
+        
+    def test_bidirectional_stats(self):
+        path, stats = self.map.search_with_stats(self.start, self.goal, mode="bidirectional")
+        self.assertTrue(stats.found)
+        self.assertEqual(stats.mode, "bidirectional")
+        self.assertEqual(stats.explored, self.map.expanded_count)
+        # Every node popped was stale, pruned or expanded
+        self.assertEqual(stats.popped, stats.explored + stats.stale_pops + stats.pruned)
+        self.assertTrue(0 < stats.heuristic_evaluations <= 2 * (stats.pushed + 1))
+        
+    def test_stats_are_printable(self):
+        _, stats = self.map.search_with_stats(self.start, self.goal)
+        self.assertIn("popped", str(stats))
+        # Every name is followed by a space before its value
+        self.assertIn(f"heuristic_evaluations {stats.heuristic_evaluations}", " ".join(str(stats).split()))
+        self.assertEqual(stats.to_dict()["explored"], stats.explored)
+        
+    def test_frontier_counts_decrease_keys_and_stale_pops(self):
+        index = self.map.graph.index
+        frontier = Frontier(lambda i: 0)
+        frontier.add(index[self.start.id], 5, None)
+        frontier.add(index[self.goal.id], 3, None)
+        frontier.add(index[self.start.id], 1, None)
+        self.assertEqual(frontier.replace_count, 1)
+        self.assertEqual(frontier.peak_size, 2)
+        frontier.close(frontier.remove()[1])
+        frontier.close(frontier.remove()[1])
+        self.assertEqual(frontier.stale_count, 0)
+        self.assertRaises(IndexError, frontier.remove)
+        self.assertEqual(frontier.stale_count, 1)
+        self.assertEqual(frontier.popped, 3)
+
+if __name__ == '__main__':
+    unittest.main()
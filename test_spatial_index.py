@@ -0,0 +1,43 @@
+# test_spatial_index.py
+from spatial_index import *
+from geo import haversine
+import unittest
+import random
+
+
+class GridIndexTest(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(0)
+        self.points = [Point(rnd.uniform(40.69, 40.70), rnd.uniform(-73.99, -73.98)) for i in range(500)]
+        self.index = GridIndex(self.points, 0.13)
+        
+    def test_index_has_every_point(self):
+        self.assertEqual(len(self.index), 500)
+        self.assertEqual(sorted(i for cell in self.index.cells.values() for i in cell), list(range(500)))
+        
+    def test_within_matches_brute_force(self):
+        rnd = random.Random(1)
+        for _ in range(50):
+            p = Point(rnd.uniform(40.69, 40.70), rnd.uniform(-73.99, -73.98))
+            for radius in [0.05, 0.13, 0.4]:
+                expected = [i for i, q in enumerate(self.points) if haversine(p, q) <= radius]
+                self.assertEqual([i for i, _ in self.index.within(p, radius)], expected)
+                
+    def test_nearest_is_sorted_and_bounded(self):
+        p = Point(40.695, -73.985)
+        nearest = self.index.nearest(p, 5, 0.13)
+        self.assertEqual(len(nearest), 5)
+        distances = [d for _, d in nearest]
+        self.assertEqual(distances, sorted(distances))
+        self.assertTrue(all(d <= 0.13 for d in distances))
+        
+    def test_far_point_finds_nothing(self):
+        self.assertEqual(self.index.within(Point(45, -100), 0.13), [])
+        
+    def test_raises_error_on_bad_cell_size(self):
+        with self.assertRaises(Exception):
+            GridIndex(self.points, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
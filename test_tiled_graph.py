@@ -0,0 +1,144 @@
+# test_tiled_graph.py
+from tiled_graph import *
+from search import *
+import osm_loader
+import unittest
+import os
+import random
+import shutil
+import tempfile
+
+TEST_OSM_FILE = "maps/nymap2.osm"
+
+# Small tiles so routes cross many of them
+TEST_TILE_SIZE = 0.002
+
+
+class TiledGraphTest(unittest.TestCase):
+    def setUp(self):
+        # Tiles are written next to the map, so build them for a copy of it
+        self.directory = tempfile.mkdtemp()
+        self.map_file = os.path.join(self.directory, os.path.basename(TEST_OSM_FILE))
+        shutil.copy(TEST_OSM_FILE, self.map_file)
+        self.tile_count = build_tiles(self.map_file, TEST_TILE_SIZE, processes=1)
+        self.tile_directory = tile_directory_name(self.map_file)
+        self.nodedict, self.waydict, self.bbox, self.graph = load_map(self.map_file, use_cache=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_partitions_every_node_into_one_tile(self):
+        tiled = TiledGraph(self.tile_directory, self.map_file)
+        self.assertTrue(self.tile_count > 1)
+        self.assertEqual(sorted(tiled.ids), sorted(self.graph.ids))
+        sizes = 0
+        for file_name in os.listdir(self.tile_directory):
+            if file_name.endswith(".tile"):
+                row, col = map(int, file_name[:-len(".tile")].split("_"))
+                sizes += len(tiled.tile((row, col)))
+        self.assertEqual(sizes, len(self.graph))
+        # Only the tiles are left of the build
+        self.assertEqual(len(os.listdir(self.tile_directory)), self.tile_count + 1)
+
+    def test_keeps_edges_that_cross_tiles(self):
+        tiled = TiledGraph(self.tile_directory, self.map_file)
+        crossing = 0
+        for i, osm_id in enumerate(tiled.ids):
+            expected = sorted((self.graph.ids[j], length) for j, length in self.graph.neighbors(self.graph.index[osm_id]))
+            self.assertEqual(sorted((tiled.ids[j], length) for j, length in tiled.neighbors(i)), expected)
+            crossing += sum(tiled.key(j) != tiled.key(i) for j, _ in tiled.neighbors(i))
+        self.assertTrue(crossing > 0)
+
+    def test_tiled_map_has_the_nodes_and_ways_of_the_map(self):
+        node_dict, way_dict, bbox, graph = load_tiled_map(self.map_file)
+        self.assertEqual(repr(bbox), repr(self.bbox))
+        for osm_id, node in self.nodedict.items():
+            self.assertEqual(node_dict[osm_id], node)
+        for osm_id, way in self.waydict.items():
+            self.assertEqual(way_dict[osm_id].highway_value, way.highway_value)
+            # Maxspeeds are stored as float32
+            if way.maxspeed is None:
+                self.assertEqual(way_dict[osm_id].maxspeed, None)
+            else:
+                self.assertAlmostEqual(way_dict[osm_id].maxspeed, way.maxspeed, places=4)
+        self.assertEqual(list(graph.components), [connected_components(self.graph)[self.graph.index[i]] for i in graph.ids])
+
+    def test_search_matches_full_map(self):
+        rnd = random.Random(0)
+        # A cap of one byte keeps a single tile loaded, forcing evictions during the searches
+        node_dict, way_dict, bbox, graph = load_tiled_map(self.map_file, memory_cap=1)
+        tiled_map = Map(node_dict, way_dict, bbox, graph)
+        full_map = Map(self.nodedict, self.waydict, self.bbox, self.graph)
+        for cost_model in COST_MODELS:
+            tiled_map.cost_model = full_map.cost_model = cost_model
+            for _ in range(30):
+                start, goal = rnd.choice(self.graph.ids), rnd.choice(self.graph.ids)
+                expected = full_map.search(self.nodedict[start], self.nodedict[goal])
+                path = tiled_map.search(node_dict[start], node_dict[goal])
+                self.assertAlmostEqual(tiled_map.path_cost, full_map.path_cost)
+                self.assertEqual(path, expected)
+        self.assertEqual(len(graph.tiles), 1)
+        self.assertTrue(graph.eviction_count > 0)
+
+    def test_search_collects_stats(self):
+        node_dict, way_dict, bbox, graph = load_tiled_map(self.map_file)
+        tiled_map = Map(node_dict, way_dict, bbox, graph)
+        start, goal = tiled_map.route_ends(self.graph.ids[0], self.graph.ids[-1])
+        path, stats = tiled_map.search_with_stats(start, goal)
+        self.assertEqual(stats.found, path is not None)
+        self.assertTrue(stats.explored <= stats.heuristic_evaluations <= stats.pushed)
+
+    def test_snaps_coordinates_like_full_map(self):
+        rnd = random.Random(1)
+        node_dict, way_dict, bbox, graph = load_tiled_map(self.map_file)
+        tiled_map = Map(node_dict, way_dict, bbox, graph)
+        # The tiles are scanned in OSM id order, which decides between nodes on the same way
+        sorted_nodes = dict(sorted(self.nodedict.items()))
+        snapped = 0
+        for _ in range(30):
+            point = Point(rnd.uniform(bbox.minlat, bbox.maxlat), rnd.uniform(bbox.minlon, bbox.maxlon))
+            expected = coordinates_to_nodes(point, sorted_nodes, self.waydict, self.bbox)
+            if not expected:
+                continue
+            self.assertEqual(tiled_map.snap_candidates(tuple(point)), expected)
+            snapped += 1
+        self.assertTrue(snapped > 0)
+
+    def test_loads_only_tiles_the_search_reaches(self):
+        node_dict, way_dict, bbox, graph = load_tiled_map(self.map_file)
+        tiled_map = Map(node_dict, way_dict, bbox, graph)
+        start = graph.ids[0]
+        neighbor = next((graph.ids[j] for j, _ in graph.neighbors(0) if graph.key(j) == graph.key(0)), start)
+        graph.tiles.clear()
+        graph.load_count = 0
+        tiled_map.search(node_dict[start], node_dict[neighbor])
+        self.assertTrue(graph.load_count < self.tile_count)
+
+    def test_stale_tiles_raise_error(self):
+        tiled = TiledGraph(self.tile_directory, self.map_file)
+        os.utime(self.map_file, ns=(0, 0))
+        with self.assertRaises(Exception):
+            tiled.tile(tiled.tile_of(self.graph.ids[0]))
+        with self.assertRaises(Exception):
+            TiledGraph(self.tile_directory, self.map_file)
+
+    def test_unknown_node_raises_error(self):
+        tiled = TiledGraph(self.tile_directory, self.map_file)
+        with self.assertRaises(Exception):
+            tiled.tile_of(-1)
+
+    def test_nodes_after_ways_raise_error(self):
+        elements = list(osm_loader.iter_osm_elements(self.map_file))
+        ways = [element for element in elements if element[0] == "way"]
+        nodes = [element for element in elements if element[0] == "node"]
+        with self.assertRaises(Exception):
+            write_tiles(self.tile_directory, self.map_file, ways[:1] + nodes + ways, TEST_TILE_SIZE)
+
+    def test_distance_matrix_raises_error(self):
+        tiled_map = Map(*load_tiled_map(self.map_file))
+        with self.assertRaises(Exception):
+            tiled_map.distance_matrix([self.graph.ids[0]], [self.graph.ids[1]])
+
+
+if __name__ == '__main__':
+    unittest.main()
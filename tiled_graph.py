@@ -0,0 +1,516 @@
+# tiled_graph.py
+import bisect
+import math
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+import numpy as np
+import map_cache
+import osm_loader
+import pbf_loader
+from cost_model import parse_maxspeed
+from geo import Point, KM_PER_DEGREE, haversine_pairwise, haversine_to_many
+from routing_graph import HIGHWAY_CLASS, RoutingGraph
+
+TILE_MAGIC = b"OSMTILE1"
+TILE_INDEX_MAGIC = b"OSMTINDX"
+TILE_VERSION = 2
+TILE_DIRECTORY_EXTENSION = ".tiles"
+TILE_INDEX_FILE = "index"
+
+# Side of a tile in degrees of latitude and longitude (about 1.1 km of latitude)
+DEFAULT_TILE_SIZE = 0.01
+
+# Bytes of tiles kept loaded before the least recently used ones are evicted
+DEFAULT_MEMORY_CAP = 64 << 20
+
+# Bytes of records buffered while building tiles before they are appended to the bucket files of their tiles
+BUILD_BUFFER_BYTES = 16 << 20
+
+# Node buckets of other tiles kept loaded while building a tile, for the far ends of its edges
+BUILD_NEIGHBOR_BUCKETS = 16
+
+# Records of the bucket files a tile is built from: (OSM id, lat, lon) of a node and
+#   (OSM id, target OSM id, way id, highway class, maxspeed) of an edge. An edge to NO_TARGET only
+#   records that the node is on the way.
+NODE_RECORD = struct.Struct("<qdd")
+EDGE_RECORD = struct.Struct("<qqqBf")
+NO_TARGET = -1
+
+# Typecodes of the arrays of a tile and of the tile index
+TILE_ARRAYS = ['q', 'd', 'd', 'q', 'q', 'd', 'B', 'f', 'q', 'q']
+TILE_INDEX_ARRAYS = ['d', 'q', 'i', 'i', 'i', 'i', 'i', 'B', 'f', 'q', 'B', 'f']
+
+
+class Tile(RoutingGraph):
+    '''The nodes of one tile and their outgoing edges, read only views into the mmapped tile file.
+
+    A RoutingGraph over the nodes of the tile (sorted by OSM id), except that its targets are indices of the
+    whole TiledGraph, so edges that cross into another tile are kept too. The ways of node i are
+    node_ways[node_way_offsets[i]:node_way_offsets[i + 1]] (OSM ids).
+    '''
+    def __init__(self, key: tuple, ids, lats, lons, offsets, targets, lengths, highway_classes, maxspeeds,
+                 node_way_offsets, node_ways, nbytes: int):
+        super().__init__(ids, lats, lons, offsets, targets, lengths, highway_classes, maxspeeds)
+        self.key = key
+        self.node_way_offsets = node_way_offsets
+        self.node_ways = node_ways
+        self.nbytes = nbytes
+
+    def position(self, osm_id: int) -> int:
+        '''returns the position of a node in the tile'''
+        if osm_id not in self.index:
+            raise Exception(f"Error: node {osm_id} is not in tile {self.key}")
+        return self.index[osm_id]
+
+class SortedIndex(Mapping):
+    def __init__(self, ids):
+        '''OSM id -> position in a sorted array of ids, found by bisection instead of a dict of every id'''
+        self.ids = ids
+
+    def __getitem__(self, osm_id) -> int:
+        i = bisect.bisect_left(self.ids, osm_id)
+        if i == len(self.ids) or self.ids[i] != osm_id:
+            raise KeyError(osm_id)
+        return i
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+class TiledGraph:
+    '''A routing graph stored as tiles on disk (see write_tiles), loading tiles as they are needed.
+    Loaded tiles are kept in LRU order and the least recently used are evicted once they take more than
+    memory_cap bytes, so only the tiles around the routes being searched stay in memory.
+
+    It takes the place of the RoutingGraph of a search.Map (see search.load_tiled_map): nodes are numbered in
+    OSM id order, and index, ids, coordinate and the neighbors work the same. The node ids, the tile of every
+    node and the connected components come from the tile index, so none of them loads every tile.'''
+    def __init__(self, directory: str, map_file: str, memory_cap: int = DEFAULT_MEMORY_CAP):
+        arrays = map_cache.read_array_file(os.path.join(directory, TILE_INDEX_FILE), map_file,
+                                           TILE_INDEX_MAGIC, TILE_VERSION, TILE_INDEX_ARRAYS)
+        if arrays is None:
+            raise Exception(f"Error: no up to date tiles in {directory}, build them first")
+        self.directory = directory
+        self.map_file = map_file
+        self.memory_cap = memory_cap
+        # Sorted OSM ids of every node with the (row, col) of its tile and its connected component (0 is the largest)
+        header, self.ids, self.node_rows, self.node_cols, self.components, tile_rows, tile_cols = arrays[:7]
+        self.tile_size = header[0]
+        # (minlat, minlon, maxlat, maxlon)
+        self.bbox = tuple(header[1:5])
+        self.index = SortedIndex(self.ids)
+        self.keys = set(zip(tile_rows, tile_cols))
+        # Every distinct (highway class, maxspeed) of the edges, all a cost model needs of the whole graph
+        self.highway_classes, self.maxspeeds = arrays[7:9]
+        # Sorted ids of the ways with a highway value, with their highway class and maxspeed (0 if none)
+        self.way_ids, self.way_highway_classes, self.way_maxspeeds = arrays[9:]
+        # Filled in by cost_model, like the ones of a RoutingGraph. Edge weights are kept in each tile instead
+        self.weights = dict()
+        self.heuristic_scales = dict()
+        self.tiles = OrderedDict()
+        self.loaded_bytes = 0
+        self.load_count = 0
+        self.eviction_count = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def key(self, i: int) -> tuple:
+        '''returns the (row, col) of the tile of the node at index i'''
+        return self.node_rows[i], self.node_cols[i]
+
+    def tile_of(self, osm_id: int) -> tuple:
+        '''returns the (row, col) of the tile of a node'''
+        if osm_id not in self.index:
+            raise Exception("Error: OSMNode id not found")
+        return self.key(self.index[osm_id])
+
+    def tile(self, key: tuple) -> Tile:
+        '''returns the tile with the given (row, col), loading it and evicting cold tiles if needed'''
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+            return tile
+
+        tile = read_tile(tile_file_name(self.directory, key), self.map_file, key)
+        if tile is None:
+            raise Exception(f"Error: tile {key} is missing or stale, build the tiles again")
+        self.load_count += 1
+        self.tiles[key] = tile
+        self.loaded_bytes += tile.nbytes
+        # Never evict the tile just loaded
+        while self.loaded_bytes > self.memory_cap and len(self.tiles) > 1:
+            _, evicted = self.tiles.popitem(last=False)
+            self.loaded_bytes -= evicted.nbytes
+            self.eviction_count += 1
+        return tile
+
+    def locate(self, i: int) -> tuple:
+        '''returns (tile, position in the tile) of the node at index i'''
+        tile = self.tile(self.key(i))
+        return tile, tile.index[self.ids[i]]
+
+    def coordinate(self, i: int) -> Point:
+        '''returns the coordinate of the node at index i'''
+        tile, j = self.locate(i)
+        return Point(tile.lats[j], tile.lons[j])
+
+    def neighbors(self, i: int):
+        '''returns (target index, edge length) pairs of the node at index i'''
+        tile, j = self.locate(i)
+        return tile.neighbors(j)
+
+    def weighted_neighbors(self, i: int, cost_model):
+        '''returns (target index, edge cost) pairs of the node at index i. Takes the cost_model.CostModel itself
+        rather than the weights of every edge, each tile's edges are weighed once it is loaded.'''
+        tile, j = self.locate(i)
+        return tile.weighted_neighbors(j, cost_model.edge_weights(tile))
+
+    def within(self, point: Point, radius: float) -> list:
+        '''returns (OSM id, distance) of the nodes at most radius (in km) away from the point, in OSM id order.
+        Only the tiles the radius reaches are loaded.'''
+        lat_radius = radius / KM_PER_DEGREE
+        lon_radius = lat_radius / max(math.cos(math.radians(point.lat)), 1e-9)
+        low = tile_key(point.lat - lat_radius, point.lon - lon_radius, self.tile_size)
+        high = tile_key(point.lat + lat_radius, point.lon + lon_radius, self.tile_size)
+        found = []
+        for row in range(low[0], high[0] + 1):
+            for col in range(low[1], high[1] + 1):
+                if (row, col) not in self.keys:
+                    continue
+                tile = self.tile((row, col))
+                distances = haversine_to_many(point, np.asarray(tile.lats), np.asarray(tile.lons))
+                inside = np.flatnonzero(distances <= radius)
+                found.extend(zip([tile.ids[j] for j in inside], distances[inside].tolist()))
+        return sorted(found)
+
+def tile_key(lat: float, lon: float, tile_size: float) -> tuple:
+    '''returns the (row, col) of the tile a coordinate is in'''
+    return math.floor(lat / tile_size), math.floor(lon / tile_size)
+
+def tile_directory_name(map_file: str) -> str:
+    '''returns the name of the directory the tiles of a map are kept in, next to the map file'''
+    return map_file + TILE_DIRECTORY_EXTENSION
+
+def tile_file_name(directory: str, key: tuple) -> str:
+    return os.path.join(directory, f"{key[0]}_{key[1]}.tile")
+
+def build_tiles(map_file: str, tile_size: float = DEFAULT_TILE_SIZE, processes=None) -> int:
+    '''Builds the tiles of an OSM xml or PBF (.pbf) map file into its tile_directory_name by streaming its elements,
+    see write_tiles. PBF blocks are decoded by that many processes, one per cpu if None.
+    Returns the number of tiles.'''
+    if map_file.endswith(".pbf"):
+        elements = pbf_loader.iter_pbf_elements(map_file, processes)
+    elif map_file.endswith(".osm"):
+        elements = osm_loader.iter_osm_elements(map_file)
+    else:
+        raise Exception("Error: tiles are built from an OSM xml (.osm) or PBF (.pbf) file")
+    return write_tiles(tile_directory_name(map_file), map_file, elements, tile_size)
+
+def write_tiles(directory: str, map_file: str, elements, tile_size: float = DEFAULT_TILE_SIZE) -> int:
+    '''Partitions map_file into tiles of tile_size degrees written to directory, from a stream of its osm_loader
+    element tuples with the nodes before the ways (as OSM files list them). The whole graph is never compiled:
+    nodes and edges are appended to bucket files of their tile as they are read, then each tile is built from
+    its buckets. Only the nodes of ways with a highway value are kept. Returns the number of tiles.'''
+    if tile_size <= 0:
+        raise Exception("Error: tile_size must be positive")
+    os.makedirs(directory, exist_ok=True)
+    # Tiles of an earlier build that no longer exist would be stale anyway, remove them
+    for file_name in os.listdir(directory):
+        if file_name.endswith(".tile"):
+            os.remove(os.path.join(directory, file_name))
+
+    build_directory = tempfile.mkdtemp(dir=directory)
+    try:
+        builder = TileBuilder(build_directory, tile_size)
+        for element in elements:
+            builder.add(element)
+        return builder.write(directory, map_file)
+    finally:
+        shutil.rmtree(build_directory)
+
+class TileBuilder:
+    def __init__(self, build_directory: str, tile_size: float):
+        '''Sorts the elements of a map into bucket files per tile, then builds the tiles from them (see write_tiles).
+        Only the OSM id and tile of every node stay in memory.'''
+        self.directory = build_directory
+        self.tile_size = tile_size
+        # Every node read with the (row, col) of its tile, sorted by OSM id once the ways start
+        self.ids = array('q')
+        self.rows = array('i')
+        self.cols = array('i')
+        # 1 for the nodes on a way with a highway value, None until the ways start
+        self.routable = None
+        # Ways with a highway value, and the distinct (highway class, maxspeed) of their edges
+        self.way_ids = array('q')
+        self.way_highway_classes = array('B')
+        self.way_maxspeeds = array('f')
+        self.edge_kinds = dict()
+        self.bounds = None
+        # (tile, bucket extension) -> records not written yet
+        self.buffers = dict()
+        self.buffered = 0
+
+    def add(self, element: tuple) -> None:
+        '''sorts one osm_loader element into the buckets of its tiles'''
+        kind = element[0]
+        if kind == "node":
+            if self.routable is not None:
+                raise Exception("Error: the map lists nodes after its ways, tiles need every node first")
+            _, osm_id, lat, lon, _ = element
+            key = tile_key(lat, lon, self.tile_size)
+            self.ids.append(osm_id)
+            self.rows.append(key[0])
+            self.cols.append(key[1])
+            self.append(key, ".nodes", NODE_RECORD.pack(osm_id, lat, lon))
+
+        elif kind == "way":
+            if self.routable is None:
+                self.sort_nodes()
+            _, osm_id, node_refs, tags = element
+            highway_class = HIGHWAY_CLASS.get(tags.get("highway"))
+            if highway_class is None:
+                return
+            maxspeed = parse_maxspeed(tags.get("maxspeed")) or 0.0
+            self.way_ids.append(osm_id)
+            self.way_highway_classes.append(highway_class)
+            self.way_maxspeeds.append(maxspeed)
+
+            # Nodes missing from the map are skipped, as compile_graph does
+            positions = [self.position(node_id) for node_id in node_refs]
+            on_edge = set()
+            for a, b, i, j in zip(node_refs, node_refs[1:], positions, positions[1:]):
+                if a == b or i is None or j is None:
+                    continue
+                self.append(self.key(i), ".edges", EDGE_RECORD.pack(a, b, osm_id, highway_class, maxspeed))
+                self.append(self.key(j), ".edges", EDGE_RECORD.pack(b, a, osm_id, highway_class, maxspeed))
+                on_edge.update((a, b))
+                self.edge_kinds[highway_class, maxspeed] = None
+            for node_id, i in zip(node_refs, positions):
+                if i is None:
+                    continue
+                self.routable[i] = 1
+                if node_id not in on_edge:
+                    on_edge.add(node_id)
+                    self.append(self.key(i), ".edges", EDGE_RECORD.pack(node_id, NO_TARGET, osm_id, highway_class, maxspeed))
+
+        elif kind == "bounds":
+            self.bounds = element[1:]
+
+    def sort_nodes(self) -> None:
+        '''sorts the nodes read by OSM id, so they can be found by bisection'''
+        if any(a >= b for a, b in zip(self.ids, self.ids[1:])):
+            order = sorted(range(len(self.ids)), key=self.ids.__getitem__)
+            self.ids = array('q', (self.ids[i] for i in order))
+            self.rows = array('i', (self.rows[i] for i in order))
+            self.cols = array('i', (self.cols[i] for i in order))
+        self.routable = bytearray(len(self.ids))
+
+    def position(self, osm_id: int) -> int:
+        '''returns the position of a node among the nodes read, None if it was not read'''
+        i = bisect.bisect_left(self.ids, osm_id)
+        if i == len(self.ids) or self.ids[i] != osm_id:
+            return None
+        return i
+
+    def key(self, i: int) -> tuple:
+        return self.rows[i], self.cols[i]
+
+    def bucket_file_name(self, key: tuple, extension: str) -> str:
+        return os.path.join(self.directory, f"{key[0]}_{key[1]}{extension}")
+
+    def append(self, key: tuple, extension: str, record: bytes) -> None:
+        '''adds a record to the bucket of a tile, buffered until enough records are waiting'''
+        buffer = self.buffers.get((key, extension))
+        if buffer is None:
+            buffer = self.buffers[key, extension] = bytearray()
+        buffer += record
+        self.buffered += len(record)
+        if self.buffered > BUILD_BUFFER_BYTES:
+            self.flush()
+
+    def flush(self) -> None:
+        '''appends the buffered records to their bucket files'''
+        for (key, extension), buffer in self.buffers.items():
+            with open(self.bucket_file_name(key, extension), "ab") as file:
+                file.write(buffer)
+        self.buffers.clear()
+        self.buffered = 0
+
+    def read_bucket(self, key: tuple, extension: str, record: struct.Struct) -> list:
+        file_name = self.bucket_file_name(key, extension)
+        if not os.path.exists(file_name):
+            return []
+        with open(file_name, "rb") as file:
+            return list(record.iter_unpack(file.read()))
+
+    def write(self, directory: str, map_file: str) -> int:
+        '''builds every tile from its buckets and writes the tile index, returns the number of tiles'''
+        self.flush()
+        if self.routable is None:
+            self.sort_nodes()
+        # Routable nodes are numbered in OSM id order, edges point to these numbers
+        numbers = array('q', [-1]) * len(self.ids)
+        ids = array('q')
+        rows = array('i')
+        cols = array('i')
+        for i, routable in enumerate(self.routable):
+            if routable:
+                numbers[i] = len(ids)
+                ids.append(self.ids[i])
+                rows.append(self.rows[i])
+                cols.append(self.cols[i])
+        if not ids:
+            raise Exception("Error: the map has no nodes on a way with a highway value")
+
+        keys = sorted(set(zip(rows, cols)))
+        # Union-find over the edges for the connected components
+        parents = array('q', range(len(ids)))
+        extent = [math.inf, math.inf, -math.inf, -math.inf]
+        neighbor_buckets = OrderedDict()
+        for key in keys:
+            self.write_tile(directory, map_file, key, numbers, parents, extent, neighbor_buckets)
+
+        way_order = sorted(range(len(self.way_ids)), key=self.way_ids.__getitem__)
+        bbox = self.bounds if self.bounds is not None else extent
+        map_cache.write_array_file(os.path.join(directory, TILE_INDEX_FILE), map_file, TILE_INDEX_MAGIC, TILE_VERSION, [
+            ('d', [self.tile_size, *bbox]), ('q', ids), ('i', rows), ('i', cols), ('i', component_labels(parents)),
+            ('i', [key[0] for key in keys]), ('i', [key[1] for key in keys]),
+            ('B', [kind[0] for kind in self.edge_kinds]), ('f', [kind[1] for kind in self.edge_kinds]),
+            ('q', [self.way_ids[i] for i in way_order]), ('B', [self.way_highway_classes[i] for i in way_order]),
+            ('f', [self.way_maxspeeds[i] for i in way_order])])
+        return len(keys)
+
+    def write_tile(self, directory: str, map_file: str, key: tuple, numbers, parents, extent: list,
+                   neighbor_buckets: OrderedDict) -> None:
+        '''builds one tile from its node and edge buckets'''
+        coordinates = {osm_id: (lat, lon) for osm_id, lat, lon in self.read_bucket(key, ".nodes", NODE_RECORD)
+                       if self.routable[self.position(osm_id)]}
+        nodes = sorted(coordinates)
+        # Edges shared by several ways are kept once with the values of the last way, as compile_graph does
+        adjacency = {osm_id: dict() for osm_id in nodes}
+        ways = {osm_id: dict() for osm_id in nodes}
+        for a, b, way_id, highway_class, maxspeed in self.read_bucket(key, ".edges", EDGE_RECORD):
+            ways[a][way_id] = None
+            if b != NO_TARGET:
+                adjacency[a][b] = (highway_class, maxspeed)
+
+        offsets = array('q', [0])
+        targets = array('q')
+        highway_classes = array('B')
+        maxspeeds = array('f')
+        target_lats = array('d')
+        target_lons = array('d')
+        source_lats = array('d')
+        source_lons = array('d')
+        node_way_offsets = array('q', [0])
+        node_ways = array('q')
+        for a in nodes:
+            lat, lon = coordinates[a]
+            extent[:] = min(extent[0], lat), min(extent[1], lon), max(extent[2], lat), max(extent[3], lon)
+            u = numbers[self.position(a)]
+            for b, (highway_class, maxspeed) in adjacency[a].items():
+                j = self.position(b)
+                v = numbers[j]
+                targets.append(v)
+                highway_classes.append(highway_class)
+                maxspeeds.append(maxspeed)
+                source_lats.append(lat)
+                source_lons.append(lon)
+                b_lat, b_lon = coordinates[b] if b in coordinates else \
+                    self.neighbor_coordinates(self.key(j), neighbor_buckets)[b]
+                target_lats.append(b_lat)
+                target_lons.append(b_lon)
+                if u < v:
+                    union(parents, u, v)
+            offsets.append(len(targets))
+            node_ways.extend(ways[a])
+            node_way_offsets.append(len(node_ways))
+        lengths = haversine_pairwise(source_lats, source_lons, target_lats, target_lons)
+
+        map_cache.write_array_file(tile_file_name(directory, key), map_file, TILE_MAGIC, TILE_VERSION, [
+            ('q', nodes), ('d', [coordinates[a][0] for a in nodes]), ('d', [coordinates[a][1] for a in nodes]),
+            ('q', offsets), ('q', targets), ('d', lengths.tolist()), ('B', highway_classes), ('f', maxspeeds),
+            ('q', node_way_offsets), ('q', node_ways)])
+
+    def neighbor_coordinates(self, key: tuple, neighbor_buckets: OrderedDict) -> dict:
+        '''returns OSM id -> (lat, lon) of the nodes of another tile, keeping the last few read'''
+        coordinates = neighbor_buckets.get(key)
+        if coordinates is None:
+            coordinates = {osm_id: (lat, lon) for osm_id, lat, lon in self.read_bucket(key, ".nodes", NODE_RECORD)}
+            neighbor_buckets[key] = coordinates
+            if len(neighbor_buckets) > BUILD_NEIGHBOR_BUCKETS:
+                neighbor_buckets.popitem(last=False)
+        neighbor_buckets.move_to_end(key)
+        return coordinates
+
+def find(parents, i: int) -> int:
+    '''returns the root of the union-find set of i, compressing the path to it'''
+    root = i
+    while parents[root] != root:
+        root = parents[root]
+    while parents[i] != root:
+        parents[i], i = root, parents[i]
+    return root
+
+def union(parents, i: int, j: int) -> None:
+    i, j = find(parents, i), find(parents, j)
+    if i != j:
+        parents[max(i, j)] = min(i, j)
+
+def component_labels(parents) -> array:
+    '''Labels every node with its union-find set, numbered by decreasing size like routing_graph.connected_components'''
+    roots = array('q', (find(parents, i) for i in range(len(parents))))
+    sizes = dict()
+    for root in roots:
+        sizes[root] = sizes.get(root, 0) + 1
+    # Sets are found in the order of their first node, ties keep that order
+    order = sorted(sizes, key=lambda root: -sizes[root])
+    labels = {root: label for label, root in enumerate(order)}
+    return array('i', (labels[root] for root in roots))
+
+def read_tile(file_name: str, map_file: str, key: tuple) -> Tile:
+    '''Opens a tile with mmap, None if it is missing or stale'''
+    arrays = map_cache.read_array_file(file_name, map_file, TILE_MAGIC, TILE_VERSION, TILE_ARRAYS)
+    if arrays is None:
+        return None
+    return Tile(key, *arrays, nbytes=os.path.getsize(file_name))
+
+
+if __name__ == "__main__":
+    # Routes are searched with search.py, which depends on this module
+    import argparse
+    import search
+    parser = argparse.ArgumentParser(description="Builds the tiles of an OSM xml or PBF map or routes over them")
+    parser.add_argument("map_file")
+    parser.add_argument("route", nargs="*", type=int, help="start and goal OSM ids to route between")
+    parser.add_argument("--tile-size", type=float, default=DEFAULT_TILE_SIZE, help="tile side in degrees")
+    parser.add_argument("--memory-cap", type=float, default=DEFAULT_MEMORY_CAP / (1 << 20), help="MB of tiles kept loaded")
+    parser.add_argument("--cost-model", choices=list(search.COST_MODELS), default="distance",
+                        help="cost the route minimizes, the shortest distance by default")
+    parser.add_argument("--stats", action="store_true", help="print what the search did")
+    args = parser.parse_args()
+
+    if not args.route:
+        print(f"Creating {build_tiles(args.map_file, args.tile_size)} tiles in: {tile_directory_name(args.map_file)}")
+    elif len(args.route) == 2:
+        node_dict, way_dict, bbox, graph = search.load_tiled_map(args.map_file, int(args.memory_cap * (1 << 20)))
+        map_problem = search.Map(node_dict, way_dict, bbox, graph)
+        map_problem.cost_model = args.cost_model
+        map_problem.collect_stats = args.stats
+        start, goal = map_problem.route_ends(*args.route)
+        path = map_problem.search(start, goal)
+        print(f"{search.path_length(path):.3f} km: {[node.id for node in path]}" if path else "Not found!")
+        if map_problem.stats is not None:
+            print(map_problem.stats)
+        print(f"Loaded {graph.load_count} tiles, evicted {graph.eviction_count}", file=sys.stderr)
+    else:
+        print("Give a start and a goal OSM id to route between")